@@ -0,0 +1,258 @@
+"""Local copy of each user's calendar, kept up to date with Calendar sync tokens.
+
+Calendar lookups (days of events for the meeting assistant, free times, conflict
+checks before invites) are answered from the replica in memory. The replica
+fetches only the changes since its last sync, with the `nextSyncToken` Calendar
+returned then, and only once it is older than `EAIA_CALENDAR_REPLICA_MAX_AGE`
+seconds (default 60). So in the common case a lookup makes no request at all,
+and otherwise a single small one. The first sync, or one after Calendar expires
+the token, lists everything from `LOOKBACK` ago on.
+
+Replicas are saved to `~/.cache/eaia/calendar/`, so a restarted worker only syncs
+the changes. `EAIA_CALENDAR_REPLICA_PATH` moves the directory, and setting it to
+`off` keeps replicas in memory only.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from googleapiclient.errors import HttpError
+
+from eaia.gmail import event_bounds, run_with_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = Path.home() / ".cache" / "eaia" / "calendar"
+DEFAULT_MAX_AGE = 60.0
+# How far back the replica holds events, and how far ahead it answers for
+LOOKBACK = timedelta(days=7)
+HORIZON = timedelta(days=365)
+# How long to answer lookups from Calendar directly after it returned no sync token
+UNSYNCABLE_RETRY = 3600.0
+
+
+def _utc(value: datetime) -> str:
+    return value.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class CalendarReplica:
+    """Events of one user's primary calendar, synced incrementally."""
+
+    def __init__(self, user_email: str, path: Path | None = None, max_age: float = DEFAULT_MAX_AGE):
+        self.user_email = user_email
+        self.path = path
+        self.max_age = max_age
+        self.events: dict[str, dict] = {}
+        self.sync_token: str | None = None
+        # Wall-clock time of the last sync, and the start of the synced range
+        self.synced_at = 0.0
+        self.time_min: datetime | None = None
+        # Wall-clock time Calendar last returned no sync token to continue from
+        self.unsyncable_at: float | None = None
+        self.syncs = 0
+        self.full_syncs = 0
+        self.queries = 0
+        self.local_queries = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+            self.events = data["events"]
+            self.sync_token = data["sync_token"]
+            self.synced_at = data["synced_at"]
+            self.time_min = datetime.fromisoformat(data["time_min"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable calendar replica {self.path}: {e}")
+
+    def _save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            data = {
+                "events": self.events,
+                "sync_token": self.sync_token,
+                "synced_at": self.synced_at,
+                "time_min": self.time_min.isoformat(),
+            }
+        # The replica is only a cache: failing to save it mustn't fail the lookup
+        tmp = None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Unique per writer, as workers sharing the directory may save at once
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.path.parent, prefix=self.path.stem, suffix=".tmp", delete=False
+            ) as f:
+                tmp = f.name
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save calendar replica {self.path}: {e}")
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        return {
+            "events": len(self.events),
+            "queries": self.queries,
+            "local_queries": self.local_queries,
+            "syncs": self.syncs,
+            "full_syncs": self.full_syncs,
+        }
+
+    def _fresh(self) -> bool:
+        return self.sync_token is not None and time.time() - self.synced_at < self.max_age
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        """Whether the synced range includes `start` to `end`."""
+        if self.time_min is None:
+            return False
+        horizon = datetime.fromtimestamp(self.synced_at, timezone.utc) + HORIZON
+        return self.time_min <= start and end <= horizon
+
+    def _list(self, service, **params) -> tuple[list[dict], str]:
+        items = []
+        page_token = None
+        while True:
+            result = (
+                service.events()
+                .list(calendarId="primary", singleEvents=True, pageToken=page_token, **params)
+                .execute()
+            )
+            items.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return items, result.get("nextSyncToken")
+
+    def _sync(self, service):
+        with self._sync_lock:
+            if self._fresh() or self._unsyncable():
+                # Synced (or given up on) by a concurrent caller while this one waited
+                return
+            items, sync_token, full = None, None, False
+            if self.sync_token is not None:
+                try:
+                    items, sync_token = self._list(service, syncToken=self.sync_token)
+                except HttpError as e:
+                    if e.resp.status != 410:
+                        raise
+                    logger.info(f"Calendar sync token of {self.user_email} expired, syncing everything")
+            if items is None:
+                full = True
+                time_min = datetime.now(timezone.utc) - LOOKBACK
+                items, sync_token = self._list(service, timeMin=_utc(time_min))
+            if sync_token is None:
+                # Without a token every lookup would list everything again, so
+                # leave lookups to Calendar for a while
+                logger.warning(
+                    f"Calendar returned no sync token for {self.user_email}, "
+                    f"not replicating for {UNSYNCABLE_RETRY:.0f}s"
+                )
+                with self._lock:
+                    self.events = {}
+                    self.sync_token = None
+                    self.time_min = None
+                    self.unsyncable_at = time.time()
+                return
+            with self._lock:
+                if full:
+                    self.events = {}
+                    self.time_min = time_min
+                    self.full_syncs += 1
+                for event in items:
+                    if event.get("status") == "cancelled":
+                        self.events.pop(event["id"], None)
+                    else:
+                        self.events[event["id"]] = event
+                # Drop events that have fallen out of the lookback
+                cutoff = datetime.now(timezone.utc) - LOOKBACK
+                if cutoff - self.time_min > timedelta(days=1):
+                    self.time_min = cutoff
+                    self.events = {
+                        event_id: event
+                        for event_id, event in self.events.items()
+                        if event_bounds(event)[1] > cutoff
+                    }
+                self.sync_token = sync_token
+                self.synced_at = time.time()
+                self.unsyncable_at = None
+                self.syncs += 1
+            if full or items:
+                self._save()
+
+    def _unsyncable(self) -> bool:
+        return (
+            self.unsyncable_at is not None
+            and time.time() - self.unsyncable_at < UNSYNCABLE_RETRY
+        )
+
+    async def refresh(self):
+        """Sync the changes since the last sync, if that was more than `max_age` ago."""
+        if not self._fresh():
+            await run_with_service("calendar", "v3", self.user_email, self._sync)
+
+    async def between(self, start: datetime, end: datetime) -> list[dict] | None:
+        """Events overlapping `start` to `end` by start time, or None if not replicated."""
+        self.queries += 1
+        if self._unsyncable():
+            return None
+        if self.time_min is not None and not self.covers(start, end):
+            return None
+        await self.refresh()
+        if not self.covers(start, end):
+            return None
+        self.local_queries += 1
+        with self._lock:
+            events = [
+                (bounds, event)
+                for event in self.events.values()
+                for bounds in [event_bounds(event)]
+                if bounds[0] < end and bounds[1] > start
+            ]
+        return [event for _, event in sorted(events, key=lambda pair: pair[0][0])]
+
+    def apply(self, event: dict):
+        """Record an event this process created or changed, ahead of the next sync."""
+        with self._lock:
+            if event.get("status") == "cancelled":
+                self.events.pop(event["id"], None)
+            else:
+                self.events[event["id"]] = event
+
+
+_replicas: dict[str, CalendarReplica] = {}
+_replicas_lock = threading.Lock()
+
+
+def get_calendar_replica(user_email: str) -> CalendarReplica:
+    with _replicas_lock:
+        replica = _replicas.get(user_email)
+        if replica is None:
+            directory = os.getenv("EAIA_CALENDAR_REPLICA_PATH") or DEFAULT_PATH
+            path = None
+            if directory != "off":
+                name = hashlib.sha256(user_email.encode()).hexdigest()[:16]
+                path = Path(directory) / f"{name}.json"
+            max_age = float(os.getenv("EAIA_CALENDAR_REPLICA_MAX_AGE") or DEFAULT_MAX_AGE)
+            replica = _replicas[user_email] = CalendarReplica(user_email, path, max_age)
+        return replica
+
+
+def calendar_replica_stats() -> dict:
+    """Per user, the replicated events, queries (and how many were answered locally) and syncs."""
+    with _replicas_lock:
+        return {user_email: replica.stats() for user_email, replica in _replicas.items()}
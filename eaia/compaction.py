@@ -0,0 +1,146 @@
+"""Compact email bodies for prompts.
+
+Long threads are mostly quoted history, signatures, legal footers and tracking
+links. `compact_body` keeps the new message whole (minus its signature), then as
+much of the earlier messages, newest first and with quote markers, footers and
+tracking parameters removed, as fits in a token budget. The raw body is kept for
+display.
+"""
+
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+from eaia.schemas import EmailData
+from eaia.tokens import count_tokens
+
+DEFAULT_BODY_TOKENS = 1500
+
+# Headers that start quoted history, in Gmail, Apple Mail and Outlook
+_QUOTE_HEADER = re.compile(
+    r"^(?:>\s*)*(?:On\s[^\n]{0,200}?(?:\n(?:>\s*)*[^\n]{0,100}?)?\bwrote:"
+    r"|-{2,}\s*Original Message\s*-{2,}"
+    r"|-{2,}\s*Forwarded message\s*-{2,}"
+    r"|From:\s.+\n(?:>\s*)*(?:Sent|Date):\s.+)\s*$",
+    re.MULTILINE | re.IGNORECASE,
+)
+_QUOTE_PREFIX = re.compile(r"^(?:> ?)+", re.MULTILINE)
+# `-- ` on its own line is the standard signature delimiter, often sent as `--`
+_SIGNATURE_DELIMITER = re.compile(r"^--\s*$|^__+\s*$", re.MULTILINE)
+# A delimiter followed by more lines than this separates sections, not a signature
+_MAX_SIGNATURE_LINES = 10
+_MOBILE_SIGNATURE = re.compile(
+    r"^(?:Sent from my \w+.*|Get Outlook for \w+.*|Sent from (?:Mail|Outlook) for .*)$",
+    re.MULTILINE | re.IGNORECASE,
+)
+_FOOTER = re.compile(
+    r"confidential|intended (?:solely )?for the (?:use of the )?(?:addressee|recipient)"
+    r"|unsubscribe|privacy policy|you are receiving this|manage (?:your )?preferences"
+    r"|this (?:e-?mail|message) (?:and any attachments )?(?:is|may contain)",
+    re.IGNORECASE,
+)
+_URL = re.compile(r"https?://[^\s<>\"')\]]+")
+_TRACKING_PARAMS = re.compile(
+    r"^(?:utm_\w+|mc_[ce]id|fbclid|gclid|msclkid|_hsenc|_hsmi|mkt_tok|trk\w*)$",
+    re.IGNORECASE,
+)
+_BLANK_LINES = re.compile(r"\n\s*\n(?:\s*\n)+")
+
+
+def _clean_url(match: re.Match) -> str:
+    """The URL without known tracking parameters, otherwise exactly as written."""
+    url = match.group(0)
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    params = [
+        param
+        for param in parts.query.split("&")
+        if not _TRACKING_PARAMS.match(param.split("=", 1)[0])
+    ]
+    return urlunsplit(parts._replace(query="&".join(params)))
+
+
+def _strip_tail(text: str, footers: bool = False) -> str:
+    """Drop the signature at the end of a message.
+
+    Only the last delimiter counts, and only if at most `_MAX_SIGNATURE_LINES`
+    lines follow it, so separators in the middle of a message are kept.
+
+    Args:
+        footers: Also drop trailing paragraphs that look like legal or unsubscribe
+            footers. Only for earlier messages, where losing a real paragraph is
+            cheap; the new message keeps all of its text.
+    """
+    delimiters = list(_SIGNATURE_DELIMITER.finditer(text))
+    if delimiters:
+        start, end = delimiters[-1].span()
+        if len(text[end:].strip().splitlines()) <= _MAX_SIGNATURE_LINES:
+            text = text[:start]
+    text = _MOBILE_SIGNATURE.sub("", text)
+    paragraphs = text.rstrip().split("\n\n")
+    while footers and len(paragraphs) > 1 and _FOOTER.search(paragraphs[-1]):
+        paragraphs.pop()
+    return "\n\n".join(paragraphs)
+
+
+def split_quoted(text: str) -> list[str]:
+    """Split a body into the new message and the quoted messages, newest first.
+
+    Quote markers are removed from the quoted messages.
+    """
+    messages = []
+    while True:
+        header = _QUOTE_HEADER.search(text)
+        if header is None:
+            messages.append(text)
+            return messages
+        messages.append(text[: header.start()])
+        text = _QUOTE_PREFIX.sub("", text[header.end() :])
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    tokens = count_tokens(text)
+    while tokens > max_tokens and text:
+        text = text[: int(len(text) * max_tokens / tokens * 0.95)]
+        tokens = count_tokens(text)
+    return text
+
+
+def compact_body(text: str, max_tokens: int = DEFAULT_BODY_TOKENS) -> str:
+    """De-quoted, budgeted version of an email body for prompts.
+
+    Args:
+        text: Raw body
+        max_tokens: Token budget. The new message gets all of it if it needs to,
+            earlier messages share what is left.
+    """
+    latest, *earlier = split_quoted(text.replace("\r\n", "\n"))
+    latest = _BLANK_LINES.sub("\n\n", _strip_tail(latest)).strip()
+    earlier = [
+        _BLANK_LINES.sub("\n\n", _strip_tail(_URL.sub(_clean_url, message), footers=True)).strip()
+        for message in earlier
+    ]
+    compacted = _truncate(latest, max_tokens)
+    if compacted != latest:
+        return compacted + "\n\n[message truncated]"
+    budget = max_tokens - count_tokens(compacted)
+    history = []
+    for message in earlier:
+        if not message:
+            continue
+        tokens = count_tokens(message) + 8
+        if tokens > budget:
+            history.append("[earlier messages omitted]")
+            break
+        history.append(f"[earlier message]\n{message}")
+        budget -= tokens
+    return "\n\n".join([compacted, *history])
+
+
+def compact_email(email: EmailData, max_tokens: int = DEFAULT_BODY_TOKENS) -> EmailData:
+    """Compact `page_content` in place, keeping the original as `raw_content`."""
+    compacted = compact_body(email["page_content"], max_tokens)
+    if compacted != email["page_content"]:
+        email["raw_content"] = email["page_content"]
+        email["page_content"] = compacted
+    return email
@@ -1,10 +1,8 @@
-from typing import TypedDict
-from eaia.gmail import fetch_group_emails
+from typing import TypedDict, NotRequired
+from eaia.scheduler import get_shard_mailboxes, ingest_mailboxes
 from langgraph_sdk import get_client
-import httpx
-import uuid
-import hashlib
 from langgraph.graph import StateGraph, START, END
+from langgraph.store.base import BaseStore
 from eaia.main.config import get_config
 
 client = get_client()
@@ -12,39 +10,32 @@ client = get_client()
 
 class JobKickoff(TypedDict):
     minutes_since: int
-
-
-async def main(state: JobKickoff, config):
-    minutes_since: int = state["minutes_since"]
-    email = get_config(config)["email"]
-
-    async for email in fetch_group_emails(email, minutes_since=minutes_since):
-        thread_id = str(
-            uuid.UUID(hex=hashlib.md5(email["thread_id"].encode("UTF-8")).hexdigest())
-        )
-        try:
-            thread_info = await client.threads.get(thread_id)
-        except httpx.HTTPStatusError as e:
-            if "user_respond" in email:
-                continue
-            if e.response.status_code == 404:
-                thread_info = await client.threads.create(thread_id=thread_id)
-            else:
-                raise e
-        if "user_respond" in email:
-            await client.threads.update_state(thread_id, None, as_node="__end__")
-            continue
-        recent_email = thread_info["metadata"].get("email_id")
-        if recent_email == email["id"]:
-            break
-        await client.threads.update(thread_id, metadata={"email_id": email["id"]})
-
-        await client.runs.create(
-            thread_id,
-            "main",
-            input={"email": email},
-            multitask_strategy="rollback",
-        )
+    batch_size: NotRequired[int]
+    # Only fetch mail added since the last run's Gmail historyId checkpoint
+    incremental: NotRequired[bool]
+    # Maximum number of LangGraph SDK calls in flight while dispatching emails
+    concurrency: NotRequired[int]
+    # Poll the registered mailboxes in this shard, out of `num_shards`
+    shard: NotRequired[int]
+    num_shards: NotRequired[int]
+    # Maximum number of mailboxes polled at once
+    mailbox_concurrency: NotRequired[int]
+    # Per mailbox quota of emails dispatched per hour, with bursts of up to `quota_burst`
+    quota_per_hour: NotRequired[float]
+    quota_burst: NotRequired[int]
+    # Triage new emails in batches, and only start runs for those that need handling
+    batch_triage: NotRequired[bool]
+    triage_batch_size: NotRequired[int]
+
+
+async def main(state: JobKickoff, config, store: BaseStore):
+    mailboxes = await get_shard_mailboxes(
+        store,
+        get_config(config),
+        shard=state.get("shard", 0),
+        num_shards=state.get("num_shards", 1),
+    )
+    await ingest_mailboxes(client, store, state, mailboxes, config)
 
 
 graph = StateGraph(JobKickoff)
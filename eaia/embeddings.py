@@ -0,0 +1,180 @@
+"""Embedding function for the LangGraph store, with a cache of embedded texts.
+
+`langgraph.json` points the store's index at `aembed_texts`, so every text the
+store embeds, for indexing items and for search queries, goes through the cache.
+Triage examples and few-shot queries are embedded from the same normalized text
+(see `eaia.main.fewshot.few_shot_text`), and prompts rewritten by reflection often
+come back unchanged, so many texts are embedded more than once.
+
+Vectors are kept in memory and in a local SQLite file, keyed by a hash of the
+embedding model and the text, and the least recently used ones are evicted past
+`EAIA_EMBEDDING_CACHE_SIZE` entries. `EAIA_EMBEDDING_CACHE_PATH` moves the file,
+and setting it to `off` keeps the cache in memory only.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+from langchain.embeddings import init_embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "openai:text-embedding-3-small"
+DEFAULT_MAX_ENTRIES = 50_000
+DEFAULT_PATH = Path.home() / ".cache" / "eaia" / "embeddings.sqlite"
+# Vectors also kept in memory, out of the ones on disk
+_MEMORY_ENTRIES = 5_000
+
+
+class EmbeddingCache:
+    """LRU cache of vectors by content hash, persisted to SQLite if `path` is set."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, path: Path | None = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.calls = 0
+        self._batches = 0
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    def stats(self) -> dict:
+        texts = self.hits + self.misses
+        return {
+            "texts": texts,
+            "hits": self.hits,
+            "hit_rate": self.hits / texts if texts else 0.0,
+            "embedding_calls": self.calls,
+            # Calls that would have been made without the cache: one per batch of texts
+            "embedding_calls_saved": self._batches - self.calls,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB, used_at REAL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_used_at ON embeddings (used_at)"
+            )
+        return self._db
+
+    def _remember(self, key: str, vector: list[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > min(_MEMORY_ENTRIES, self.max_entries):
+            self._memory.popitem(last=False)
+
+    def _read(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            missing = [key for key in keys if key not in found]
+            if self.path is None or not missing:
+                return found
+            db = self._connect()
+            placeholders = ",".join("?" * len(missing))
+            rows = db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                missing,
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+                self._remember(key, found[key])
+            if rows:
+                db.execute(
+                    f"UPDATE embeddings SET used_at = ? WHERE key IN ({placeholders})",
+                    [time.time(), *missing],
+                )
+                db.commit()
+        return found
+
+    def _write(self, vectors: dict[str, list[float]]):
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+            if self.path is None:
+                return
+            db = self._connect()
+            now = time.time()
+            db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(key, array("f", v).tobytes(), now) for key, v in vectors.items()],
+            )
+            (count,) = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                db.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY used_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            db.commit()
+
+    async def aembed(self, texts: list[str], embeddings) -> list[list[float]]:
+        keys = [
+            hashlib.sha256(f"{EMBEDDING_MODEL}\n{text}".encode("UTF-8")).hexdigest()
+            for text in texts
+        ]
+        vectors = await asyncio.to_thread(self._read, list(dict.fromkeys(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        self._batches += 1
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            self.calls += 1
+            embedded = await embeddings.aembed_documents(list(missing.values()))
+            new = dict(zip(missing, embedded))
+            await asyncio.to_thread(self._write, new)
+            vectors.update(new)
+        return [vectors[key] for key in keys]
+
+
+_embeddings = None
+_cache = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        path = os.getenv("EAIA_EMBEDDING_CACHE_PATH") or DEFAULT_PATH
+        _cache = EmbeddingCache(
+            int(os.getenv("EAIA_EMBEDDING_CACHE_SIZE") or DEFAULT_MAX_ENTRIES),
+            None if path == "off" else Path(path),
+        )
+    return _cache
+
+
+def embedding_cache_stats() -> dict:
+    """How many texts were found in the cache, and how many embedding calls it saved."""
+    return get_embedding_cache().stats()
+
+
+async def aembed_texts(texts: list[str]) -> list[list[float]]:
+    """Embed `texts`, only calling the model for texts not embedded before."""
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = init_embeddings(EMBEDDING_MODEL)
+    cache = get_embedding_cache()
+    vectors = await cache.aembed(texts, _embeddings)
+    stats = cache.stats()
+    logger.debug(
+        f"Embedding cache: {stats['hits']} of {stats['texts']} texts cached, "
+        f"{stats['embedding_calls_saved']} embedding calls saved"
+    )
+    return vectors
@@ -1,5 +1,9 @@
+import asyncio
+import concurrent.futures
 import logging
-from datetime import datetime, timedelta, time
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, time, timezone
 from pathlib import Path
 from typing import Iterable
 import pytz
@@ -9,15 +13,20 @@ import json
 from dateutil import parser
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
 import base64
+import re
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from html.parser import HTMLParser
 import email.utils
 from langchain_auth import Client
 
 from langchain_core.tools import tool
 from langchain_core.pydantic_v1 import BaseModel, Field
 
+from eaia.compaction import DEFAULT_BODY_TOKENS, compact_email
 from eaia.schemas import EmailData
 
 logger = logging.getLogger(__name__)
@@ -25,11 +34,87 @@ _SCOPES = [
     "https://www.googleapis.com/auth/gmail.modify",
     "https://www.googleapis.com/auth/calendar",
 ]
+# Set this to point the Google clients at a local stand-in (e.g. `scripts/fake_google.py`)
+_API_ROOT_ENV = "GOOGLE_API_ROOT"
+_SERVICE_PATHS = {"gmail": "", "calendar": "calendar/v3/"}
+# Gmail rejects batches of more than 100 calls, and starts rate limiting well before that
+_MAX_BATCH_SIZE = 100
+# Headers passed on with each email, for rule-based triage (see `eaia/main/triage_rules.py`)
+_TRIAGE_HEADERS = ["From", "List-Unsubscribe", "List-Id", "Auto-Submitted", "Precedence"]
+# Headers needed to decide whether to triage an email, fetched before any bodies
+_METADATA_HEADERS = ["To", "Subject", "Reply-To", "Date"] + _TRIAGE_HEADERS
+# Cap on the decoded body passed on for triage
+_MAX_BODY_BYTES = 32 * 1024
+# langchain auth-client doesn't tell us when a token expires, or how old it already
+# is, so only reuse one briefly. Tokens Google rejects are dropped sooner, on a 401.
+_CREDENTIALS_TTL = timedelta(minutes=5)
+
+# Process-wide caches, keyed by user email
+_credentials: dict[str, Credentials] = {}
+_credentials_refreshes: dict[str, concurrent.futures.Future] = {}
+_services: dict[tuple, tuple[Credentials, object]] = {}
+_cache_lock = threading.Lock()
 
 
 async def get_credentials(
     user_email: str,
     langsmith_api_key: str | None = None
+) -> Credentials:
+    """Get cached Google API credentials, refreshing them when they expire.
+
+    Concurrent callers that find the credentials missing or expired share a
+    single in-flight refresh.
+
+    Args:
+        user_email: User's Gmail email address (used as user_id for auth)
+        langsmith_api_key: LangSmith API key for auth client
+
+    Returns:
+        Google OAuth2 credentials
+    """
+    with _cache_lock:
+        creds = _credentials.get(user_email)
+        if creds is not None and creds.valid:
+            return creds
+        refresh = _credentials_refreshes.get(user_email)
+        owner = refresh is None
+        if owner:
+            refresh = concurrent.futures.Future()
+            _credentials_refreshes[user_email] = refresh
+    if not owner:
+        # Callers may run on different event loops (or threads), so share a
+        # thread-safe future rather than an asyncio task. Shielded, so a
+        # cancelled waiter doesn't cancel the refresh for everyone else.
+        try:
+            return await asyncio.shield(asyncio.wrap_future(refresh))
+        except asyncio.CancelledError:
+            if not refresh.cancelled() or asyncio.current_task().cancelling():
+                raise
+        # The caller doing the refresh was cancelled, so start another
+        return await get_credentials(user_email, langsmith_api_key)
+
+    try:
+        creds = await _authenticate(user_email, langsmith_api_key)
+        with _cache_lock:
+            _credentials[user_email] = creds
+        if not refresh.done():
+            refresh.set_result(creds)
+        return creds
+    except asyncio.CancelledError:
+        refresh.cancel()
+        raise
+    except BaseException as e:
+        if not refresh.done():
+            refresh.set_exception(e)
+        raise e
+    finally:
+        with _cache_lock:
+            _credentials_refreshes.pop(user_email, None)
+
+
+async def _authenticate(
+    user_email: str,
+    langsmith_api_key: str | None = None
 ) -> Credentials:
     """Get Google API credentials using langchain auth-client.
     
@@ -74,7 +159,9 @@ async def get_credentials(
         # langchain auth-client returns the access token as a string
         creds = Credentials(
             token=token,
-            scopes=_SCOPES
+            scopes=_SCOPES,
+            # google-auth compares expiry against naive UTC
+            expiry=datetime.now(timezone.utc).replace(tzinfo=None) + _CREDENTIALS_TTL,
         )
         
         return creds
@@ -83,19 +170,171 @@ async def get_credentials(
         await client.close()
 
 
-def extract_message_part(msg):
-    """Recursively walk through the email parts to find message body."""
+def invalidate_credentials(user_email: str, creds: Credentials):
+    """Drop `creds` from the cache after Google rejected them, unless already replaced."""
+    with _cache_lock:
+        if _credentials.get(user_email) is creds:
+            del _credentials[user_email]
+
+
+def build_service(api: str, version: str, creds: Credentials):
+    """Build a Google API client, honouring the `GOOGLE_API_ROOT` override."""
+    root = os.getenv(_API_ROOT_ENV)
+    if not root:
+        return build(api, version, credentials=creds)
+    endpoint = root.rstrip("/") + "/" + _SERVICE_PATHS[api]
+    return build(
+        api, version, credentials=creds, client_options={"api_endpoint": endpoint}
+    )
+
+
+def _get_service(api: str, version: str, user_email: str, creds: Credentials):
+    """Get this thread's cached Google API client for `user_email`.
+
+    Clients are rebuilt when the credentials are refreshed. httplib2 connections
+    are not thread-safe, so each thread gets its own client.
+    """
+    key = (user_email, api, version, threading.get_ident())
+    with _cache_lock:
+        cached = _services.get(key)
+    if cached is not None and cached[0] is creds:
+        return cached[1]
+    service = build_service(api, version, creds)
+    with _cache_lock:
+        _services[key] = (creds, service)
+    return service
+
+
+async def run_with_service(api: str, version: str, user_email: str, fn):
+    """Run `fn(service)` with a cached Google API client on a worker thread.
+
+    googleapiclient requests block, so they are kept off the event loop where
+    they would stall every other run on the worker. If Google rejects the cached
+    credentials, they are dropped and `fn` is retried once with fresh ones.
+    """
+    creds = await get_credentials(user_email)
+    try:
+        return await asyncio.to_thread(
+            lambda: fn(_get_service(api, version, user_email, creds))
+        )
+    except HttpError as e:
+        if e.resp.status != 401:
+            raise
+        logger.info(f"Google rejected the credentials of {user_email}, refreshing them")
+        invalidate_credentials(user_email, creds)
+    creds = await get_credentials(user_email)
+    return await asyncio.to_thread(
+        lambda: fn(_get_service(api, version, user_email, creds))
+    )
+
+
+def _gmail_batch_uri() -> str:
+    root = os.getenv(_API_ROOT_ENV) or "https://gmail.googleapis.com/"
+    return root.rstrip("/") + "/batch/gmail/v1"
+
+
+class _HTMLToText(HTMLParser):
+    """Collect the visible text of an HTML body, one line per block element."""
+
+    _BLOCK_TAGS = {"br", "p", "div", "tr", "li", "h1", "h2", "h3", "h4", "table"}
+    _SKIP_TAGS = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP_TAGS:
+            self._skip += 1
+        elif tag in self._BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self._BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.chunks.append(data)
+
+    def text(self) -> str:
+        lines = (" ".join(line.split()) for line in "".join(self.chunks).splitlines())
+        return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def html_to_text(html: str) -> str:
+    parser = _HTMLToText()
+    parser.feed(html)
+    parser.close()
+    return parser.text()
+
+
+def _decode_body(data: str, max_bytes: int) -> str:
+    # Only decode as much base64 as we need: every 4 characters hold 3 bytes
+    data = data[: -(-max_bytes // 3) * 4]
+    data += "=" * (-len(data) % 4)
+    return base64.urlsafe_b64decode(data)[:max_bytes].decode("utf-8", errors="ignore")
+
+
+def _is_attachment(part) -> bool:
+    return bool(part.get("filename")) or "attachmentId" in part.get("body", {})
+
+
+# Address headers that may repeat and are merged, other repeats keep the first value
+_MULTI_VALUE_HEADERS = {"to", "cc", "bcc"}
+
+
+class MessageRecord:
+    """Compact view of a Gmail message, with headers parsed once.
+
+    Header lookups are case-insensitive.
+    """
+
+    __slots__ = ("id", "thread_id", "headers", "payload")
+
+    def __init__(self, message: dict):
+        self.id = message.get("id")
+        self.thread_id = message.get("threadId")
+        self.payload = message.get("payload") or {}
+        headers = {}
+        for header in self.payload.get("headers") or []:
+            name = header["name"].lower()
+            if name not in headers:
+                headers[name] = header["value"]
+            elif name in _MULTI_VALUE_HEADERS:
+                headers[name] += ", " + header["value"]
+        self.headers = headers
+
+    def __getitem__(self, name: str) -> str:
+        return self.headers[name.lower()]
+
+    def get(self, name: str, default: str | None = None) -> str | None:
+        return self.headers.get(name.lower(), default)
+
+
+def extract_message_part(msg, max_bytes: int = _MAX_BODY_BYTES):
+    """Recursively walk through the email parts to find message body.
+
+    Attachments are skipped, at most `max_bytes` of the body are decoded, and
+    HTML bodies are converted to plain text.
+    """
+    if _is_attachment(msg):
+        return None
     if msg["mimeType"] == "text/plain":
         body_data = msg.get("body", {}).get("data")
         if body_data:
-            return base64.urlsafe_b64decode(body_data).decode("utf-8")
+            return _decode_body(body_data, max_bytes)
     elif msg["mimeType"] == "text/html":
         body_data = msg.get("body", {}).get("data")
         if body_data:
-            return base64.urlsafe_b64decode(body_data).decode("utf-8")
+            # Markup is mostly dropped, so allow more of it before converting
+            return html_to_text(_decode_body(body_data, 4 * max_bytes))[:max_bytes]
     if "parts" in msg:
         for part in msg["parts"]:
-            body = extract_message_part(part)
+            body = extract_message_part(part, max_bytes)
             if body:
                 return body
     return "No message body available."
@@ -125,18 +364,15 @@ def create_message(sender, to, subject, message_text, thread_id, original_messag
 
 
 def get_recipients(
-    headers,
+    message: MessageRecord,
     email_address,
     addn_receipients=None,
 ):
     recipients = set(addn_receipients or [])
-    sender = None
-    for header in headers:
-        if header["name"].lower() in ["to", "cc"]:
-            recipients.update(header["value"].replace(" ", "").split(","))
-        if header["name"].lower() == "from":
-            sender = header["value"]
-    if sender:
+    for name in ["to", "cc"]:
+        if value := message.get(name):
+            recipients.update(value.replace(" ", "").split(","))
+    if sender := message.get("from"):
         recipients.add(sender)  # Ensure the original sender is included in the response
     for r in list(recipients):
         if email_address in r:
@@ -149,7 +385,7 @@ def send_message(service, user_id, message):
     return message
 
 
-def send_email(
+async def send_email(
     email_id,
     response_text,
     email_address,
@@ -157,45 +393,64 @@ def send_email(
     gmail_secret: str | None = None,
     addn_receipients=None,
 ):
-    import asyncio
-    creds = asyncio.run(get_credentials(email_address))
+    def _send(service):
+        message = MessageRecord(
+            service.users()
+            .messages()
+            .get(
+                userId="me",
+                id=email_id,
+                format="metadata",
+                metadataHeaders=["Message-ID", "Subject", "From", "To", "Cc"],
+            )
+            .execute()
+        )
+        message_id = message["message-id"]
+        thread_id = message.thread_id
 
-    service = build("gmail", "v1", credentials=creds)
-    message = service.users().messages().get(userId="me", id=email_id).execute()
+        # Get recipients and sender
+        recipients = get_recipients(message, email_address, addn_receipients)
 
-    headers = message["payload"]["headers"]
-    message_id = next(
-        header["value"] for header in headers if header["name"].lower() == "message-id"
-    )
-    thread_id = message["threadId"]
+        # Create the response
+        response_subject = message["subject"]
+        response_message = create_message(
+            "me", recipients, response_subject, response_text, thread_id, message_id
+        )
+        # Send the response
+        send_message(service, "me", response_message)
 
-    # Get recipients and sender
-    recipients = get_recipients(headers, email_address, addn_receipients)
+    await run_with_service("gmail", "v1", email_address, _send)
 
-    # Create the response
-    subject = next(
-        header["value"] for header in headers if header["name"].lower() == "subject"
-    )
-    response_subject = subject
-    response_message = create_message(
-        "me", recipients, response_subject, response_text, thread_id, message_id
-    )
-    # Send the response
-    send_message(service, "me", response_message)
 
+def execute_batched(requests: dict, batch_size: int) -> dict:
+    """Execute Gmail requests in batches of `batch_size` calls per HTTP round trip.
 
-async def fetch_group_emails(
-    to_email,
-    minutes_since: int = 30,
-    gmail_token: str | None = None,
-    gmail_secret: str | None = None,
-) -> Iterable[EmailData]:
-    creds = await get_credentials(to_email)
+    Args:
+        requests: Mapping of request id to an unexecuted `HttpRequest`
+        batch_size: Maximum number of calls to put in a single batch
 
-    service = build("gmail", "v1", credentials=creds)
-    after = int((datetime.now() - timedelta(minutes=minutes_since)).timestamp())
+    Returns:
+        Mapping of request id to response. Failed calls are logged and omitted.
+    """
+    batch_size = max(1, min(batch_size, _MAX_BATCH_SIZE))
+    responses = {}
 
-    query = f"(to:{to_email} OR from:{to_email}) after:{after}"
+    def callback(request_id, response, exception):
+        if exception is not None:
+            logger.info(f"Failed on {request_id}: {exception}")
+        else:
+            responses[request_id] = response
+
+    items = list(requests.items())
+    for i in range(0, len(items), batch_size):
+        batch = BatchHttpRequest(callback=callback, batch_uri=_gmail_batch_uri())
+        for request_id, request in items[i : i + batch_size]:
+            batch.add(request, request_id=request_id)
+        batch.execute()
+    return responses
+
+
+def _list_messages(service, query: str) -> list[dict]:
     messages = []
     nextPageToken = None
     # Fetch messages matching the query
@@ -211,93 +466,291 @@ async def fetch_group_emails(
         nextPageToken = results.get("nextPageToken")
         if not nextPageToken:
             break
+    return messages
 
-    count = 0
-    for message in messages:
-        try:
-            msg = (
-                service.users().messages().get(userId="me", id=message["id"]).execute()
-            )
-            thread_id = msg["threadId"]
-            payload = msg["payload"]
-            headers = payload.get("headers")
-            # Get the thread details
-            thread = service.users().threads().get(userId="me", id=thread_id).execute()
-            messages_in_thread = thread["messages"]
-            # Check the last message in the thread
-            last_message = messages_in_thread[-1]
-            last_headers = last_message["payload"]["headers"]
-            from_header = next(
-                header["value"] for header in last_headers if header["name"] == "From"
-            )
-            last_from_header = next(
-                header["value"]
-                for header in last_message["payload"].get("headers")
-                if header["name"] == "From"
+
+# Labels on added messages that never need triaging
+_HISTORY_SKIP_LABELS = {"DRAFT", "SPAM", "TRASH", "CHAT"}
+
+
+def _list_history(service, history_id: str, query: str) -> list[dict]:
+    """List messages added to the mailbox since `history_id`, newest first.
+
+    Only messages `query` also matches are kept, so an incremental run sees the
+    same messages as a `_list_messages` scan with that query would.
+
+    Raises:
+        HttpError: With status 404 if `history_id` is too old for Gmail to serve.
+    """
+    messages = {}
+    nextPageToken = None
+    while True:
+        results = (
+            service.users()
+            .history()
+            .list(
+                userId="me",
+                startHistoryId=history_id,
+                historyTypes="messageAdded",
+                pageToken=nextPageToken,
             )
-            if to_email in last_from_header:
-                yield {
-                    "id": message["id"],
-                    "thread_id": message["threadId"],
-                    "user_respond": True,
-                }
-            # Check if the last message was from you and if the current message is the last in the thread
-            if to_email not in from_header and message["id"] == last_message["id"]:
-                subject = next(
-                    header["value"] for header in headers if header["name"] == "Subject"
-                )
-                from_email = next(
-                    (header["value"] for header in headers if header["name"] == "From"),
-                    "",
-                ).strip()
-                _to_email = next(
-                    (header["value"] for header in headers if header["name"] == "To"),
-                    "",
-                ).strip()
-                if reply_to := next(
-                    (
-                        header["value"]
-                        for header in headers
-                        if header["name"] == "Reply-To"
-                    ),
-                    "",
-                ).strip():
-                    from_email = reply_to
-                send_time = next(
-                    header["value"] for header in headers if header["name"] == "Date"
-                )
-                # Only process emails that are less than an hour old
-                parsed_time = parse_time(send_time)
-                body = extract_message_part(payload)
-                yield {
-                    "from_email": from_email,
-                    "to_email": _to_email,
-                    "subject": subject,
-                    "page_content": body,
+            .execute()
+        )
+        for record in results.get("history", []):
+            for added in record.get("messagesAdded", []):
+                message = added["message"]
+                if _HISTORY_SKIP_LABELS.intersection(message.get("labelIds", [])):
+                    continue
+                messages[message["id"]] = {
                     "id": message["id"],
-                    "thread_id": message["threadId"],
-                    "send_time": parsed_time.isoformat(),
+                    "threadId": message["threadId"],
                 }
-                count += 1
-        except Exception:
-            logger.info(f"Failed on {message}")
+        nextPageToken = results.get("nextPageToken")
+        if not nextPageToken:
+            break
+    if messages:
+        # History records can't be searched, so apply the query through a listing
+        matching = {message["id"] for message in _list_messages(service, query)}
+        messages = {k: v for k, v in messages.items() if k in matching}
+    # History is oldest first, callers expect the newest email first like `messages.list`
+    return list(reversed(messages.values()))
+
+
+async def get_history_id(user_email: str) -> str:
+    """Get the mailbox's current Gmail historyId, to checkpoint an incremental sync."""
+    profile = await run_with_service(
+        "gmail",
+        "v1",
+        user_email,
+        lambda service: service.users().getProfile(userId="me").execute(),
+    )
+    return profile["historyId"]
+
+
+def _emails_from_message(
+    message, last_message: MessageRecord, to_email
+) -> Iterable[EmailData]:
+    """Decide what to yield for a listed message, given the last message of its thread.
+
+    Only needs thread metadata. Emails to triage are yielded without `page_content`.
+    """
+    from_header = last_message["from"]
+    if to_email in from_header:
+        yield {
+            "id": message["id"],
+            "thread_id": message["threadId"],
+            "user_respond": True,
+        }
+    # Check if the last message was from you and if the current message is the last in the thread
+    if to_email not in from_header and message["id"] == last_message.id:
+        subject = last_message["subject"]
+        from_email = last_message.get("from", "").strip()
+        _to_email = last_message.get("to", "").strip()
+        if reply_to := last_message.get("reply-to", "").strip():
+            from_email = reply_to
+        send_time = last_message["date"]
+        # Only process emails that are less than an hour old
+        parsed_time = parse_time(send_time)
+        # The body is fetched separately, only for emails we triage
+        yield {
+            "from_email": from_email,
+            "to_email": _to_email,
+            "subject": subject,
+            "id": message["id"],
+            "thread_id": message["threadId"],
+            "send_time": parsed_time.isoformat(),
+            "headers": {
+                name.lower(): last_message[name]
+                for name in _TRIAGE_HEADERS
+                if last_message.get(name) is not None
+            },
+        }
+
+
+async def fetch_group_emails(
+    to_email,
+    minutes_since: int = 30,
+    gmail_token: str | None = None,
+    gmail_secret: str | None = None,
+    batch_size: int | None = None,
+    history_id: str | None = None,
+    body_tokens: int | None = DEFAULT_BODY_TOKENS,
+    failed: list[str] | None = None,
+) -> Iterable[EmailData]:
+    """Fetch recent emails to or from `to_email`.
+
+    Args:
+        to_email: Mailbox to fetch emails for
+        minutes_since: Only fetch emails newer than this many minutes
+        batch_size: If set, fetch threads and bodies up front through Gmail batch
+            requests of this many calls instead of one round trip per call
+        history_id: If set, only fetch messages added since this Gmail historyId
+            (see `get_history_id`). If the checkpoint has expired, fall back to
+            the `minutes_since` window.
+        body_tokens: Token budget of `page_content`, which is compacted with
+            `compact_email` (the body as received is kept as `raw_content`).
+            None leaves bodies as they are.
+        failed: If given, the ids of listed messages whose thread or body could
+            not be fetched are appended to it, so the caller can tell the run
+            missed mail that a later run should pick up again.
+
+    Yields:
+        `EmailData` for emails to triage, and `user_respond` markers for threads
+        where the user sent the last message.
+    """
+    after = int((datetime.now() - timedelta(minutes=minutes_since)).timestamp())
+
+    query = f"(to:{to_email} OR from:{to_email}) after:{after}"
+    messages = None
+    if history_id:
+        try:
+            messages = await run_with_service(
+                "gmail",
+                "v1",
+                to_email,
+                lambda service: _list_history(service, history_id, query),
+            )
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise e
+            logger.info(f"History {history_id} expired, scanning last {minutes_since} minutes")
+    if messages is None:
+        messages = await run_with_service(
+            "gmail", "v1", to_email, lambda service: _list_messages(service, query)
+        )
+
+    def get_thread(service, thread_id):
+        return service.users().threads().get(
+            userId="me", id=thread_id, format="metadata", metadataHeaders=_METADATA_HEADERS
+        )
+
+    def get_message(service, message_id):
+        return service.users().messages().get(userId="me", id=message_id, format="full")
+
+    # Phase one: decide what to triage from thread metadata. Each thread is
+    # downloaded once per run and shared by all of its listed messages.
+    if batch_size:
+        threads = await run_with_service(
+            "gmail",
+            "v1",
+            to_email,
+            lambda service: execute_batched(
+                {m["threadId"]: get_thread(service, m["threadId"]) for m in messages},
+                batch_size,
+            ),
+        )
+    else:
+        threads = {}
+
+    # The last message of each thread, parsed once and shared by the thread's messages
+    last_messages: dict[str, MessageRecord] = {}
+    if failed is None:
+        failed = []
+
+    async def decide_emails():
+        for message in messages:
+            try:
+                thread_id = message["threadId"]
+                if thread_id not in last_messages:
+                    if thread_id not in threads:
+                        if batch_size:
+                            # Its call in the batch failed
+                            failed.append(message["id"])
+                            continue
+                        try:
+                            threads[thread_id] = await run_with_service(
+                                "gmail",
+                                "v1",
+                                to_email,
+                                lambda service: get_thread(service, thread_id).execute(),
+                            )
+                        except Exception:
+                            failed.append(message["id"])
+                            raise
+                    last_messages[thread_id] = MessageRecord(
+                        threads.pop(thread_id)["messages"][-1]
+                    )
+                for email in _emails_from_message(
+                    message, last_messages[thread_id], to_email
+                ):
+                    yield email
+            except Exception:
+                logger.info(f"Failed on {message}")
+
+    # Phase two: fetch and decode bodies, only for the emails we triage
+    bodies = {}
+
+    async def prefetch_bodies():
+        if not batch_size:
+            async for email in decide_emails():
+                yield email
+            return
+        emails = [email async for email in decide_emails()]
+        bodies.update(
+            await run_with_service(
+                "gmail",
+                "v1",
+                to_email,
+                lambda service: execute_batched(
+                    {
+                        email["id"]: get_message(service, email["id"])
+                        for email in emails
+                        if "user_respond" not in email
+                    },
+                    batch_size,
+                ),
+            )
+        )
+        for email in emails:
+            yield email
+
+    count = 0
+    async for email in prefetch_bodies():
+        if "user_respond" not in email:
+            try:
+                if email["id"] not in bodies:
+                    if batch_size:
+                        # Its call in the batch failed
+                        failed.append(email["id"])
+                        continue
+                    try:
+                        bodies[email["id"]] = await run_with_service(
+                            "gmail",
+                            "v1",
+                            to_email,
+                            lambda service: get_message(service, email["id"]).execute(),
+                        )
+                    except Exception:
+                        failed.append(email["id"])
+                        raise
+                payload = bodies.pop(email["id"])["payload"]
+                email["page_content"] = extract_message_part(payload)
+                if body_tokens:
+                    compact_email(email, body_tokens)
+            except Exception:
+                logger.info(f"Failed on {email['id']}")
+                continue
+            count += 1
+        yield email
 
     logger.info(f"Found {count} emails.")
 
 
-def mark_as_read(
+async def mark_as_read(
     message_id,
     user_email: str,
     gmail_token: str | None = None,
     gmail_secret: str | None = None,
 ):
-    import asyncio
-    creds = asyncio.run(get_credentials(user_email))
-
-    service = build("gmail", "v1", credentials=creds)
-    service.users().messages().modify(
-        userId="me", id=message_id, body={"removeLabelIds": ["UNREAD"]}
-    ).execute()
+    await run_with_service(
+        "gmail",
+        "v1",
+        user_email,
+        lambda service: service.users()
+        .messages()
+        .modify(userId="me", id=message_id, body={"removeLabelIds": ["UNREAD"]})
+        .execute(),
+    )
 
 
 class CalInput(BaseModel):
@@ -306,8 +759,111 @@ class CalInput(BaseModel):
     )
 
 
+def event_bounds(event: dict) -> tuple[datetime, datetime]:
+    """Start and end of a Calendar event; all-day events are taken in UTC."""
+    bounds = []
+    for key in ("start", "end"):
+        value = event[key].get("dateTime") or event[key]["date"]
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        bounds.append(parsed)
+    return bounds[0], bounds[1]
+
+
+def day_range(days: list[date]) -> tuple[datetime, datetime]:
+    """From the start of the first of `days` to the end of the last, in UTC."""
+    return (
+        datetime.combine(min(days), time.min, tzinfo=timezone.utc),
+        datetime.combine(max(days), time.max, tzinfo=timezone.utc),
+    )
+
+
+@dataclass
+class CalendarEvents:
+    """The events of a calendar overlapping `time_min` to `time_max`."""
+
+    time_min: datetime
+    time_max: datetime
+    events: list[dict]
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        return self.time_min <= start and end <= self.time_max
+
+    def between(self, start: datetime, end: datetime) -> list[dict]:
+        """Events overlapping `start` to `end`, which must be covered."""
+        return [
+            event
+            for event in self.events
+            if event_bounds(event)[0] < end and event_bounds(event)[1] > start
+        ]
+
+    def by_day(self, days: list[date]) -> dict[date, list[dict]]:
+        return {day: self.between(*day_range([day])) for day in days}
+
+
+def _list_events(service, time_min: datetime, time_max: datetime) -> list[dict]:
+    events = []
+    page_token = None
+    while True:
+        events_result = (
+            service.events()
+            .list(
+                calendarId="primary",
+                timeMin=time_min.astimezone(timezone.utc).isoformat().replace("+00:00", "Z"),
+                timeMax=time_max.astimezone(timezone.utc).isoformat().replace("+00:00", "Z"),
+                singleEvents=True,
+                orderBy="startTime",
+                pageToken=page_token,
+            )
+            .execute()
+        )
+        events.extend(events_result.get("items", []))
+        page_token = events_result.get("nextPageToken")
+        if not page_token:
+            return events
+
+
+async def get_calendar_events(
+    user_email: str, time_min: datetime, time_max: datetime
+) -> CalendarEvents:
+    """Events from `time_min` to `time_max`.
+
+    Answered from the local replica of the calendar (see `eaia/calendar_replica.py`)
+    when it holds that range, and otherwise with one (paginated) Calendar query.
+    """
+    from .calendar_replica import get_calendar_replica
+
+    events = await get_calendar_replica(user_email).between(time_min, time_max)
+    if events is None:
+        events = await run_with_service(
+            "calendar",
+            "v3",
+            user_email,
+            lambda service: _list_events(service, time_min, time_max),
+        )
+    return CalendarEvents(time_min, time_max, events)
+
+
+async def get_events_by_day(user_email: str, days: list[date]) -> dict[date, list[dict]]:
+    """Calendar events of each of `days`, fetched with a single Calendar query."""
+    if not days:
+        return {}
+    calendar = await get_calendar_events(user_email, *day_range(days))
+    return calendar.by_day(days)
+
+
+def format_events_by_day(date_strs: list[str], events_by_day: dict[date, list[dict]]) -> str:
+    """Events of the days in `date_strs` (dd-mm-yyyy), as `get_events_for_days` returns them."""
+    results = ""
+    for date_str in date_strs:
+        day = datetime.strptime(date_str, "%d-%m-%Y").date()
+        results += f"***FOR DAY {date_str}***\n\n" + print_events(events_by_day[day])
+    return results
+
+
 @tool(args_schema=CalInput)
-def get_events_for_days(date_strs: list[str]):
+async def get_events_for_days(date_strs: list[str]):
     """
     Retrieves events for a list of days. If you want to check for multiple days, call this with multiple inputs.
 
@@ -318,7 +874,6 @@ def get_events_for_days(date_strs: list[str]):
 
     Returns: availability for those days.
     """
-    import asyncio
     # Note: This function needs user_email from config - will be handled by calling code
     from .main.config import get_config
     from langchain_core.runnables.config import ensure_config
@@ -326,32 +881,10 @@ def get_events_for_days(date_strs: list[str]):
     config = ensure_config()
     user_config = get_config(config)
     user_email = user_config["email"]
-    
-    creds = asyncio.run(get_credentials(user_email))
-    service = build("calendar", "v3", credentials=creds)
-    results = ""
-    for date_str in date_strs:
-        # Convert the date string to a datetime.date object
-        day = datetime.strptime(date_str, "%d-%m-%Y").date()
-
-        start_of_day = datetime.combine(day, time.min).isoformat() + "Z"
-        end_of_day = datetime.combine(day, time.max).isoformat() + "Z"
-
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=start_of_day,
-                timeMax=end_of_day,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-        )
-        events = events_result.get("items", [])
 
-        results += f"***FOR DAY {date_str}***\n\n" + print_events(events)
-    return results
+    days = [datetime.strptime(date_str, "%d-%m-%Y").date() for date_str in date_strs]
+    events_by_day = await get_events_by_day(user_email, days)
+    return format_events_by_day(date_strs, events_by_day)
 
 
 def format_datetime_with_timezone(dt_str, timezone="US/Pacific"):
@@ -399,13 +932,9 @@ def print_events(events):
     return result
 
 
-def send_calendar_invite(
+async def send_calendar_invite(
     emails, title, start_time, end_time, email_address, timezone="PST"
 ):
-    import asyncio
-    creds = asyncio.run(get_credentials(email_address))
-    service = build("calendar", "v3", credentials=creds)
-
     # Parse the start and end times
     start_datetime = datetime.fromisoformat(start_time)
     end_datetime = datetime.fromisoformat(end_time)
@@ -437,12 +966,22 @@ def send_calendar_invite(
     }
 
     try:
-        service.events().insert(
-            calendarId="primary",
-            body=event,
-            sendNotifications=True,
-            conferenceDataVersion=1,
-        ).execute()
+        created = await run_with_service(
+            "calendar",
+            "v3",
+            email_address,
+            lambda service: service.events()
+            .insert(
+                calendarId="primary",
+                body=event,
+                sendNotifications=True,
+                conferenceDataVersion=1,
+            )
+            .execute(),
+        )
+        from .calendar_replica import get_calendar_replica
+
+        get_calendar_replica(email_address).apply(created)
         return True
     except Exception as e:
         logger.info(f"An error occurred while sending the calendar invite: {e}")
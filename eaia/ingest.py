@@ -0,0 +1,215 @@
+"""Dispatch fetched emails to LangGraph threads and runs."""
+
+import asyncio
+import hashlib
+import logging
+import uuid
+from typing import AsyncIterable, Awaitable, Callable
+
+import httpx
+from langgraph_sdk.client import LangGraphClient
+
+from eaia.schemas import EmailData, RespondTo
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TRIAGE_BATCH_SIZE = 10
+# How long a partial triage batch waits for more emails before it is sent anyway
+_TRIAGE_LINGER = 0.2
+
+TriageFn = Callable[[list[EmailData]], Awaitable[list[RespondTo | None]]]
+
+
+def get_thread_id(email: EmailData) -> str:
+    return str(
+        uuid.UUID(hex=hashlib.md5(email["thread_id"].encode("UTF-8")).hexdigest())
+    )
+
+
+class TriageBatcher:
+    """Groups emails into batches of up to `batch_size`, triaged with one call each.
+
+    A partial batch is sent after `linger` seconds. If a batch fails, its emails
+    get no result, so they go through a full run instead.
+    """
+
+    def __init__(
+        self,
+        triage: TriageFn,
+        batch_size: int = DEFAULT_TRIAGE_BATCH_SIZE,
+        linger: float = _TRIAGE_LINGER,
+    ):
+        self.triage = triage
+        self.batch_size = max(1, batch_size)
+        self.linger = linger
+        self._batch: list[tuple[EmailData, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    def submit(self, email: EmailData) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+        self._batch.append((email, result))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self.flush)
+        return result
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, []
+        if batch:
+            self._tasks.append(asyncio.create_task(self._run(batch)))
+
+    async def _run(self, batch: list[tuple[EmailData, asyncio.Future]]):
+        try:
+            results = await self.triage([email for email, _ in batch])
+        except Exception:
+            logger.exception(f"Failed to triage a batch of {len(batch)} emails")
+            results = [None] * len(batch)
+        for (_, result), triage in zip(batch, results):
+            if not result.done():
+                result.set_result(triage)
+
+
+async def dispatch_emails(
+    client: LangGraphClient,
+    emails: AsyncIterable[EmailData],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    early: bool = True,
+    rerun: bool = False,
+    config: dict | None = None,
+    assistant_id: str = "main",
+    admit: Callable[[EmailData], bool] | None = None,
+    triage: TriageFn | None = None,
+    triage_batch_size: int = DEFAULT_TRIAGE_BATCH_SIZE,
+):
+    """Start a `main` run for each new email, overlapping the LangGraph SDK calls.
+
+    Up to `concurrency` SDK calls are in flight at once, across different threads.
+    Calls for the same thread still happen in the order its emails were fetched,
+    and emails are checked against what was seen before in fetch order, so we
+    never dispatch anything fetched after an already-seen email.
+
+    Args:
+        client: LangGraph SDK client
+        emails: Emails (newest first), as yielded by `fetch_group_emails`
+        concurrency: Maximum number of SDK calls in flight
+        early: Whether to stop at the first email that was already seen
+        rerun: Whether to start runs again for emails that were already seen
+        config: Config for the `main` runs, None to use the deployment's
+        assistant_id: Assistant (or graph) the runs are started with
+        admit: Called before starting a run for an email. Returning False stops
+            dispatching, leaving that email and anything older for later.
+        triage: Triages a batch of new emails before any runs are started. Emails
+            triaged `no` don't get a run (the triage function is expected to
+            handle them), and the others start their run already triaged.
+        triage_batch_size: Maximum number of emails per `triage` call
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    # Per thread, a future that resolves once that thread's latest email is handled
+    tails: dict[str, asyncio.Future] = {}
+    pending: list[tuple[EmailData, asyncio.Task, asyncio.Future]] = []
+    actions: list[asyncio.Task] = []
+    batcher = TriageBatcher(triage, triage_batch_size) if triage is not None else None
+
+    async def lookup(thread_id, previous):
+        if previous is not None:
+            # Shielded, as cancelling this lookup must not cancel the previous email
+            await asyncio.shield(previous)
+        async with semaphore:
+            return await client.threads.get(thread_id)
+
+    async def act(email, thread_id, thread_info, done, triaged):
+        try:
+            triage_result = await triaged if triaged is not None else None
+            async with semaphore:
+                if "user_respond" in email:
+                    await client.threads.update_state(thread_id, None, as_node="__end__")
+                    return
+                if thread_info is None:
+                    await client.threads.create(thread_id=thread_id)
+                await client.threads.update(thread_id, metadata={"email_id": email["id"]})
+                if triage_result is not None and triage_result.response == "no":
+                    return
+                run_input = {"email": email}
+                if triage_result is not None:
+                    run_input["triage"] = triage_result.model_dump()
+                    run_input["triaged_email_id"] = email["id"]
+                await client.runs.create(
+                    thread_id,
+                    assistant_id,
+                    input=run_input,
+                    config=config,
+                    multitask_strategy="rollback",
+                )
+        finally:
+            done.set_result(None)
+
+    def decide(email, thread_info_task, done) -> bool:
+        """Handle the oldest pending email. Returns False to stop dispatching."""
+        thread_id = get_thread_id(email)
+        try:
+            thread_info = thread_info_task.result()
+        except httpx.HTTPStatusError as e:
+            if "user_respond" in email:
+                done.set_result(None)
+                return True
+            if e.response.status_code != 404:
+                raise e
+            thread_info = None
+        if thread_info is not None and "user_respond" not in email:
+            recent_email = thread_info["metadata"].get("email_id")
+            if recent_email == email["id"]:
+                if early:
+                    done.set_result(None)
+                    return False
+                if not rerun:
+                    done.set_result(None)
+                    return True
+        if admit is not None and "user_respond" not in email and not admit(email):
+            done.set_result(None)
+            return False
+        triaged = None
+        if batcher is not None and "user_respond" not in email:
+            triaged = batcher.submit(email)
+        actions.append(
+            asyncio.create_task(act(email, thread_id, thread_info, done, triaged))
+        )
+        return True
+
+    async def resolve_oldest() -> bool:
+        email, thread_info_task, done = pending.pop(0)
+        await asyncio.wait([thread_info_task])
+        return decide(email, thread_info_task, done)
+
+    try:
+        stopped = False
+        async for email in emails:
+            thread_id = get_thread_id(email)
+            done = asyncio.get_running_loop().create_future()
+            previous, tails[thread_id] = tails.get(thread_id), done
+            pending.append(
+                (email, asyncio.create_task(lookup(thread_id, previous)), done)
+            )
+            if len(pending) >= concurrency and not await resolve_oldest():
+                stopped = True
+                break
+        while pending and not stopped:
+            stopped = not await resolve_oldest()
+    finally:
+        for _, thread_info_task, done in pending:
+            thread_info_task.cancel()
+            if not done.done():
+                done.cancel()
+        await asyncio.gather(*(task for _, task, _ in pending), return_exceptions=True)
+        if batcher is not None:
+            batcher.flush()
+        results = await asyncio.gather(*actions, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
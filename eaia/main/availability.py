@@ -0,0 +1,188 @@
+"""Free time on the calendar, worked out from the events rather than by the model.
+
+Busy events are merged into intervals and subtracted from working hours in the
+configured timezone. What is left is returned as maximal free chunks, dropping
+those shorter than the minimum slot length, so the meeting assistant can quote
+them as they are.
+"""
+
+import logging
+import math
+from datetime import date, datetime, time, timedelta
+
+import pytz
+
+from eaia.gmail import event_bounds, get_calendar_events
+
+logger = logging.getLogger(__name__)
+
+Interval = tuple[datetime, datetime]
+
+# Abbreviations people write in `timezone`, which aren't tz database names
+_TIMEZONE_ALIASES = {
+    "PT": "America/Los_Angeles",
+    "PST": "America/Los_Angeles",
+    "PDT": "America/Los_Angeles",
+    "MT": "America/Denver",
+    "MST": "America/Denver",
+    "MDT": "America/Denver",
+    "CT": "America/Chicago",
+    "CST": "America/Chicago",
+    "CDT": "America/Chicago",
+    "ET": "America/New_York",
+    "EST": "America/New_York",
+    "EDT": "America/New_York",
+    "BST": "Europe/London",
+    "CET": "Europe/Paris",
+    "CEST": "Europe/Paris",
+}
+
+
+def resolve_timezone(name: str | None) -> pytz.BaseTzInfo:
+    """The tz database zone for the configured `timezone`, e.g. `PST` or `Europe/Paris`."""
+    if not name:
+        return pytz.utc
+    name = name.strip()
+    try:
+        return pytz.timezone(_TIMEZONE_ALIASES.get(name.upper(), name))
+    except pytz.UnknownTimeZoneError:
+        logger.warning(f"Unknown timezone {name!r}, using UTC")
+        return pytz.utc
+
+
+def parse_working_hours(value: str) -> tuple[time, time]:
+    """Start and end of a `9:00-17:00` style range."""
+    start, end = (datetime.strptime(part.strip(), "%H:%M").time() for part in value.split("-"))
+    if end <= start:
+        raise ValueError(f"Working hours must end after they start: {value}")
+    return start, end
+
+
+def merge_intervals(intervals: list[Interval]) -> list[Interval]:
+    """Sorted, non-overlapping intervals covering the same time as `intervals`."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(base: list[Interval], busy: list[Interval]) -> list[Interval]:
+    """The parts of the (non-overlapping) `base` intervals not covered by `busy`."""
+    busy = merge_intervals(busy)
+    free = []
+    for start, end in sorted(base):
+        cursor = start
+        for busy_start, busy_end in busy:
+            if busy_end <= cursor:
+                continue
+            if busy_start >= end:
+                break
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if cursor < end:
+            free.append((cursor, end))
+    return free
+
+
+def is_busy(event: dict, user_email: str | None = None) -> bool:
+    """Whether the event blocks time: not cancelled, shown as busy and not declined."""
+    if event.get("status") == "cancelled" or event.get("transparency") == "transparent":
+        return False
+    for attendee in event.get("attendees", []):
+        if attendee.get("self") or (user_email and attendee.get("email") == user_email):
+            return attendee.get("responseStatus") != "declined"
+    return True
+
+
+def busy_intervals(
+    events: list[dict], tz: pytz.BaseTzInfo, user_email: str | None = None
+) -> list[Interval]:
+    """Merged times the events block; all-day events block whole days in `tz`."""
+    intervals = []
+    for event in events:
+        if not is_busy(event, user_email):
+            continue
+        if "dateTime" in event["start"]:
+            intervals.append(event_bounds(event))
+        else:
+            start = date.fromisoformat(event["start"]["date"])
+            end = date.fromisoformat(event["end"]["date"])
+            intervals.append(
+                (
+                    tz.localize(datetime.combine(start, time.min)),
+                    tz.localize(datetime.combine(end, time.min)),
+                )
+            )
+    return merge_intervals(intervals)
+
+
+def working_intervals(
+    days: list[date], tz: pytz.BaseTzInfo, working_hours: tuple[time, time]
+) -> list[Interval]:
+    """Working hours of each of `days` (weekends included only if asked for)."""
+    start, end = working_hours
+    return [
+        (tz.localize(datetime.combine(day, start)), tz.localize(datetime.combine(day, end)))
+        for day in sorted(set(days))
+    ]
+
+
+def free_slots(
+    events: list[dict],
+    days: list[date],
+    tz: pytz.BaseTzInfo,
+    working_hours: tuple[time, time],
+    min_slot: timedelta,
+    now: datetime | None = None,
+    user_email: str | None = None,
+) -> list[Interval]:
+    """Maximal free chunks of at least `min_slot` within working hours on `days`.
+
+    Args:
+        now: Time before which nothing is free, rounded up to the quarter hour
+    """
+    base = working_intervals(days, tz, working_hours)
+    if now is not None:
+        earliest = datetime.fromtimestamp(math.ceil(now.timestamp() / 900) * 900, tz)
+        base = [(max(start, earliest), end) for start, end in base if end > earliest]
+    busy = busy_intervals(events, tz, user_email)
+    return [
+        (start.astimezone(tz), end.astimezone(tz))
+        for start, end in subtract_intervals(base, busy)
+        if end - start >= min_slot
+    ]
+
+
+def _format_time(value: datetime) -> str:
+    suffix = "am" if value.hour < 12 else "pm"
+    return f"{value.hour % 12 or 12}:{value.minute:02d}{suffix}"
+
+
+def format_free_slots(slots: list[Interval], days: list[date], tz: pytz.BaseTzInfo) -> str:
+    """One line per day, e.g. `Tuesday July 1: 9:00am-10:30am, 1:00pm-5:00pm`."""
+    by_day = {day: [] for day in sorted(set(days))}
+    for start, end in slots:
+        by_day.setdefault(start.date(), []).append(f"{_format_time(start)}-{_format_time(end)}")
+    lines = []
+    for day, chunks in by_day.items():
+        free = ", ".join(chunks) if chunks else "no free time"
+        zone = tz.localize(datetime.combine(day, time(12))).strftime("%Z")
+        lines.append(f"{day:%A %B} {day.day}: {free} ({zone})")
+    return "\n".join(lines)
+
+
+async def find_conflicts(
+    user_email: str, start_time: str, end_time: str, tz: pytz.BaseTzInfo
+) -> list[dict]:
+    """Busy events overlapping an invite from `start_time` to `end_time`.
+
+    Times are ISO formatted, and taken in `tz` if they have no offset.
+    """
+    start, end = (datetime.fromisoformat(value) for value in (start_time, end_time))
+    start, end = (value if value.tzinfo else tz.localize(value) for value in (start, end))
+    calendar = await get_calendar_events(user_email, start, end)
+    return [event for event in calendar.events if is_busy(event, user_email)]
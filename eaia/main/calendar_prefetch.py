@@ -0,0 +1,164 @@
+"""Speculative calendar prefetch for emails that look like scheduling requests.
+
+The meeting assistant starts from the next `meeting_calendar_days` business days
+(default 5, 0 turns the meeting calendar off) of events. Once triage decides to
+draft a response to an email that looks like it is about finding a time, it
+starts loading them in the background, so the events are ready when
+`find_meeting_time` runs. Prefetches that the run doesn't use are cancelled and
+dropped: when the drafter picks another tool than the meeting assistant, when
+the email is marked as read, or after `PREFETCH_TTL` seconds.
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from langchain_core.runnables import RunnableConfig
+
+from eaia.gmail import CalendarEvents, day_range, get_calendar_events
+from eaia.main.availability import resolve_timezone
+from eaia.main.config import get_config
+from eaia.schemas import EmailData
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEETING_DAYS = 5
+# Seconds an unused prefetch is kept, covering a run's triage and drafting
+PREFETCH_TTL = 600
+
+# Any of these marks an email as about scheduling, or two of the weaker ones
+_STRONG = re.compile(
+    r"\b(schedul\w*|reschedul\w*|availabilit\w*|calendly|calendar invite|"
+    r"find (?:a )?time|time to (?:meet|chat|talk|connect)|meet(?:ing|up)?|"
+    r"are you (?:free|available)|works? for you|book (?:a|some) time)\b",
+    re.IGNORECASE,
+)
+_WEAK = re.compile(
+    r"\b(call|chat|sync|catch up|coffee|lunch|free|available|slot|zoom|"
+    r"tomorrow|next week|this week|(?:mon|tues|wednes|thurs|fri)day|"
+    r"\d{1,2}(?::\d{2})?\s?(?:am|pm))\b",
+    re.IGNORECASE,
+)
+
+_lock = threading.Lock()
+# Per (user email, email id), when the prefetch started and its task
+_pending: dict[tuple[str, str], tuple[float, asyncio.Task]] = {}
+_stats = {"started": 0, "used": 0, "discarded": 0}
+
+
+def looks_like_scheduling(email: EmailData) -> bool:
+    """Whether the email likely asks for a meeting or for availability."""
+    text = f"{email.get('subject') or ''}\n{email.get('page_content') or ''}"
+    if _STRONG.search(text):
+        return True
+    return len({m.lower() for m in _WEAK.findall(text)}) >= 2
+
+
+def business_days(start: date, n: int) -> list[date]:
+    """The first `n` weekdays from `start` on, `start` included."""
+    days = []
+    day = start
+    while len(days) < n:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def meeting_days(config: RunnableConfig) -> list[date]:
+    """The business days the meeting assistant starts from, in the configured timezone."""
+    n_days = int(config["configurable"].get("meeting_calendar_days", DEFAULT_MEETING_DAYS))
+    today = datetime.now(resolve_timezone(get_config(config)["timezone"])).date()
+    return business_days(today, n_days)
+
+
+async def load_meeting_calendar(user_email: str, days: list[date]) -> CalendarEvents:
+    """Events of `days`, both as UTC days and as days in any timezone."""
+    start, end = day_range(days)
+    return await get_calendar_events(user_email, start - timedelta(hours=14), end + timedelta(hours=14))
+
+
+def _key(email: EmailData, config: RunnableConfig) -> tuple[str, str]:
+    return get_config(config)["email"], email["id"]
+
+
+def _discard(entries: list[tuple[float, asyncio.Task]]):
+    for _, task in entries:
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            # Retrieve the result so failed prefetches aren't logged as never retrieved
+            task.exception()
+    with _lock:
+        _stats["discarded"] += len(entries)
+
+
+def _expire():
+    now = time.monotonic()
+    with _lock:
+        expired = [key for key, (started, _) in _pending.items() if now - started > PREFETCH_TTL]
+        entries = [_pending.pop(key) for key in expired]
+    _discard(entries)
+
+
+def start_calendar_prefetch(email: EmailData, config: RunnableConfig) -> bool:
+    """Start loading the next business days of events if the email is about scheduling.
+
+    Returns:
+        Whether a prefetch for the email is now running
+    """
+    _expire()
+    days = meeting_days(config)
+    if not days or not looks_like_scheduling(email):
+        return False
+    key = _key(email, config)
+    with _lock:
+        if key in _pending:
+            return True
+        task = asyncio.create_task(load_meeting_calendar(key[0], days))
+        _pending[key] = (time.monotonic(), task)
+        _stats["started"] += 1
+    return True
+
+
+def discard_calendar_prefetch(email: EmailData, config: RunnableConfig):
+    """Cancel and drop the email's prefetch, if any, as the run won't use it."""
+    with _lock:
+        entry = _pending.pop(_key(email, config), None)
+    if entry is not None:
+        _discard([entry])
+
+
+async def take_calendar_prefetch(
+    email: EmailData, config: RunnableConfig
+) -> CalendarEvents | None:
+    """Events prefetched for the email, waiting for the prefetch if still running.
+
+    Returns:
+        None if nothing was prefetched for the email (in this process), or the prefetch failed
+    """
+    with _lock:
+        entry = _pending.pop(_key(email, config), None)
+    if entry is None:
+        return None
+    task = entry[1]
+    if task.get_loop() is not asyncio.get_running_loop():
+        _discard([entry])
+        return None
+    try:
+        calendar = await task
+    except Exception:
+        logger.warning("Calendar prefetch failed", exc_info=True)
+        return None
+    with _lock:
+        _stats["used"] += 1
+    return calendar
+
+
+def calendar_prefetch_stats() -> dict:
+    """Counts of prefetches started, used by the meeting assistant and discarded."""
+    with _lock:
+        return {**_stats, "pending": len(_pending)}
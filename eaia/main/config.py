@@ -1,15 +1,110 @@
-import yaml
+"""The assistant's configuration, from `config.yaml` or the run's configurable.
+
+Nearly every node reads the config, so it is parsed once into an immutable
+`AssistantConfig`: `config.yaml` is parsed again only when its mtime changes, and
+configs passed in the configurable are kept per assistant id until they change.
+"""
+
+import os
+import threading
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
 from pathlib import Path
+from typing import Any
+
+import yaml
 
 _ROOT = Path(__file__).absolute().parent
+CONFIG_PATH = _ROOT.joinpath("config.yaml")
+
+
+@dataclass(frozen=True)
+class AssistantConfig(Mapping):
+    """Values of `config.yaml`, also readable like the dict they come from."""
+
+    email: str
+    full_name: str | None = None
+    name: str | None = None
+    background: str | None = None
+    timezone: str | None = None
+    schedule_preferences: str | None = None
+    background_preferences: str | None = None
+    response_preferences: str | None = None
+    rewrite_preferences: str | None = None
+    triage_no: str | None = None
+    triage_notify: str | None = None
+    triage_email: str | None = None
+    memory: bool = True
+    triage_rules: tuple = ()
+    # Free time offered for meetings, in `timezone` (see `eaia/main/availability.py`)
+    working_hours: str = "9:00-17:00"
+    min_slot_minutes: int = 15
+
+    @classmethod
+    def from_dict(cls, values: Mapping[str, Any]) -> "AssistantConfig":
+        if "email" not in values:
+            raise ValueError("Missing config value: email")
+        kwargs = {f.name: values[f.name] for f in _FIELDS if f.name in values}
+        kwargs["triage_rules"] = tuple(kwargs.get("triage_rules") or ())
+        return cls(**kwargs)
+
+    def __getitem__(self, key: str):
+        if key not in _NAMES:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(_NAMES)
+
+    def __len__(self) -> int:
+        return len(_NAMES)
+
+
+_FIELDS = fields(AssistantConfig)
+_NAMES = tuple(f.name for f in _FIELDS)
+
+_lock = threading.Lock()
+# mtime of config.yaml when it was parsed, and the parsed config
+_file_config: tuple[int, AssistantConfig] | None = None
+# Per assistant id, the configurable values a config was made from, and the config
+_overrides: dict[str, tuple[tuple, AssistantConfig]] = {}
+# The configurable last read and its config. Every node of a run reads the same
+# configurable, so most reads are answered by an identity check.
+_last: tuple[dict, AssistantConfig] | None = None
+
+
+def _load_file() -> AssistantConfig:
+    global _file_config
+    mtime = os.stat(CONFIG_PATH).st_mtime_ns
+    cached = _file_config
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(CONFIG_PATH) as stream:
+        parsed = AssistantConfig.from_dict(yaml.safe_load(stream))
+    with _lock:
+        _file_config = (mtime, parsed)
+    return parsed
 
 
-def get_config(config: dict):
+def get_config(config: dict) -> AssistantConfig:
     # This loads things either ALL from configurable, or
     # all from the config.yaml
     # This is done intentionally to enforce an "all or nothing" configuration
-    if "email" in config["configurable"]:
-        return config["configurable"]
+    global _last
+    configurable = config["configurable"]
+    last = _last
+    if last is not None and last[0] is configurable:
+        return last[1]
+    if "email" not in configurable:
+        return _load_file()
+    assistant_id = configurable.get("assistant_id", "default")
+    values = tuple(configurable.get(name) for name in _NAMES)
+    cached = _overrides.get(assistant_id)
+    if cached is not None and cached[0] == values:
+        parsed = cached[1]
     else:
-        with open(_ROOT.joinpath("config.yaml")) as stream:
-            return yaml.safe_load(stream)
+        parsed = AssistantConfig.from_dict(configurable)
+        with _lock:
+            _overrides[assistant_id] = (values, parsed)
+    _last = (configurable, parsed)
+    return parsed
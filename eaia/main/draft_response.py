@@ -1,7 +1,6 @@
 """Core agent responsible for drafting email."""
 
 from langchain_core.runnables import RunnableConfig
-from langchain_openai import ChatOpenAI
 from langgraph.store.base import BaseStore
 
 from eaia.schemas import (
@@ -14,7 +13,12 @@ from eaia.schemas import (
     Ignore,
     email_template,
 )
+from eaia.main.calendar_prefetch import discard_calendar_prefetch
 from eaia.main.config import get_config
+from eaia.main.preferences import get_preferences
+from eaia.main.prompts import SplitPrompt
+from eaia.main.tool_calls import repair_tool_calls
+from eaia.models import get_chat_model
 
 EMAIL_WRITING_INSTRUCTIONS = """You are {full_name}'s executive assistant. You are a top-notch executive assistant who cares about {name} performing as well as possible.
 
@@ -70,20 +74,26 @@ Note that you should only call this if working to schedule a meeting - if a meet
 # Background information: information you may find helpful when responding to emails or deciding what to do.
 
 {random_preferences}"""
-draft_prompt = """{instructions}
+draft_prompt = SplitPrompt(
+    "draft",
+    EMAIL_WRITING_INSTRUCTIONS
+    + """
 
 Remember to call a tool correctly! Use the specified names exactly - not add `functions::` to the start. Pass all required arguments.
 
 Here is the email thread. Note that this is the full email thread. Pay special attention to the most recent email.
 
-{email}"""
+""",
+    "{email}",
+)
 
 
 async def draft_response(state: State, config: RunnableConfig, store: BaseStore):
     """Write an email to a customer."""
     model = config["configurable"].get("model", "gpt-4o")
-    llm = ChatOpenAI(
-        model=model,
+    llm = get_chat_model(
+        "openai",
+        model,
         temperature=0,
         parallel_tool_calls=False,
         tool_choice="required",
@@ -99,40 +109,16 @@ async def draft_response(state: State, config: RunnableConfig, store: BaseStore)
     if len(messages) > 0:
         tools.append(Ignore)
     prompt_config = get_config(config)
-    namespace = (config["configurable"].get("assistant_id", "default"),)
-    key = "schedule_preferences"
-    result = await store.aget(namespace, key)
-    if result and "data" in result.value:
-        schedule_preferences = result.value["data"]
-    else:
-        await store.aput(namespace, key, {"data": prompt_config["schedule_preferences"]})
-        schedule_preferences = prompt_config["schedule_preferences"]
-    key = "random_preferences"
-    result = await store.aget(namespace, key)
-    if result and "data" in result.value:
-        random_preferences = result.value["data"]
-    else:
-        await store.aput(
-            namespace, key, {"data": prompt_config["background_preferences"]}
-        )
-        random_preferences = prompt_config["background_preferences"]
-    key = "response_preferences"
-    result = await store.aget(namespace, key)
-    if result and "data" in result.value:
-        response_preferences = result.value["data"]
-    else:
-        await store.aput(namespace, key, {"data": prompt_config["response_preferences"]})
-        response_preferences = prompt_config["response_preferences"]
-    _prompt = EMAIL_WRITING_INSTRUCTIONS.format(
-        schedule_preferences=schedule_preferences,
-        random_preferences=random_preferences,
-        response_preferences=response_preferences,
-        name=prompt_config["name"],
-        full_name=prompt_config["full_name"],
-        background=prompt_config["background"],
-    )
-    input_message = draft_prompt.format(
-        instructions=_prompt,
+    preferences = await get_preferences(config, store)
+    input_message = draft_prompt.render(
+        dict(
+            schedule_preferences=preferences["schedule_preferences"],
+            random_preferences=preferences["random_preferences"],
+            response_preferences=preferences["response_preferences"],
+            name=prompt_config["name"],
+            full_name=prompt_config["full_name"],
+            background=prompt_config["background"],
+        ),
         email=email_template.format(
             email_thread=state["email"]["page_content"],
             author=state["email"]["from_email"],
@@ -145,10 +131,13 @@ async def draft_response(state: State, config: RunnableConfig, store: BaseStore)
     messages = [{"role": "user", "content": input_message}] + messages
     i = 0
     while i < 5:
-        response = await model.ainvoke(messages)
+        response = repair_tool_calls(await model.ainvoke(messages), tools)
         if len(response.tool_calls) != 1:
             i += 1
             messages += [{"role": "user", "content": "Please call a valid tool call."}]
         else:
             break
+    if not any(call["name"] == MeetingAssistant.__name__ for call in response.tool_calls):
+        # The meeting assistant won't run, so the calendar prefetch won't be used
+        discard_calendar_prefetch(state["email"], config)
     return {"draft": response, "messages": [response]}
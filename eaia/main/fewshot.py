@@ -1,8 +1,17 @@
 """Fetches few shot examples for triage step."""
 
+import asyncio
+import re
+from email.utils import parseaddr
+
 from langgraph.store.base import BaseStore
 from eaia.schemas import EmailData
 
+# How much of the body goes into the text examples are embedded from
+_TEXT_BODY_CHARS = 1000
+# Start of the quoted history in a reply
+_QUOTE_HEADER = re.compile(r"^On .+ wrote:\s*$", re.MULTILINE)
+
 
 template = """Email Subject: {subject}
 Email From: {from_email}
@@ -29,12 +38,57 @@ def format_similar_examples_store(examples):
     return "\n\n------------\n\n".join(strs)
 
 
+def few_shot_text(email: EmailData) -> str:
+    """Text an email is embedded from, both when saved as an example and when searching.
+
+    Only what says what the email is about: subject, sender address and the start
+    of the body without quoted history. Ids, timestamps and long bodies would make
+    embedding slower and retrieval noisier.
+    """
+    body = email.get("page_content") or ""
+    quote = _QUOTE_HEADER.search(body)
+    if quote:
+        body = body[: quote.start()]
+    body = " ".join(
+        line for line in body.splitlines() if not line.lstrip().startswith(">")
+    )
+    body = " ".join(body.split())[:_TEXT_BODY_CHARS]
+    sender = parseaddr(email["from_email"])[1].lower() or email["from_email"]
+    return f"Subject: {' '.join(email['subject'].split())}\nFrom: {sender}\n\n{body}"
+
+
 async def get_few_shot_examples(email: EmailData, store: BaseStore, config):
     namespace = (
         config["configurable"].get("assistant_id", "default"),
         "triage_examples",
     )
-    result = await store.asearch(namespace, query=str({"input": email}), limit=5)
+    result = await store.asearch(namespace, query=few_shot_text(email), limit=5)
     if result is None:
         return ""
     return format_similar_examples_store(result)
+
+
+async def get_batch_few_shot_examples(
+    emails: list[EmailData], store: BaseStore, config, limit: int = 10
+):
+    """Few shot examples for triaging several emails at once.
+
+    Takes the closest examples of every email before the next closest ones, so
+    each email is represented.
+    """
+    namespace = (
+        config["configurable"].get("assistant_id", "default"),
+        "triage_examples",
+    )
+    results = await asyncio.gather(
+        *(
+            store.asearch(namespace, query=few_shot_text(email), limit=5)
+            for email in emails
+        )
+    )
+    examples = {}
+    for rank in range(5):
+        for result in results:
+            if rank < len(result) and len(examples) < limit:
+                examples.setdefault(result[rank].key, result[rank])
+    return format_similar_examples_store(list(examples.values()))
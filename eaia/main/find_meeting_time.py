@@ -1,18 +1,43 @@
 """Agent responsible for managing calendar and finding meeting time."""
 
-from datetime import datetime
+import logging
+from datetime import date, datetime, time, timedelta
 
-from langchain.agents.react.agent import create_react_agent
 from langchain_core.messages import ToolMessage
 from langchain_core.runnables import RunnableConfig
-from langchain_openai import ChatOpenAI
-
-from eaia.gmail import get_events_for_days
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from eaia.gmail import (
+    CalInput,
+    CalendarEvents,
+    day_range,
+    format_events_by_day,
+    get_calendar_events,
+    get_events_for_days,
+)
 from eaia.schemas import State
 
+from eaia.main.availability import (
+    format_free_slots,
+    free_slots,
+    parse_working_hours,
+    resolve_timezone,
+)
+from eaia.main.calendar_prefetch import (
+    load_meeting_calendar,
+    meeting_days,
+    take_calendar_prefetch,
+)
 from eaia.main.config import get_config
+from eaia.main.prompts import SplitPrompt
+from eaia.models import get_chat_model
+
+logger = logging.getLogger(__name__)
 
-meeting_prompts = """You are {full_name}'s executive assistant. You are a top-notch executive assistant who cares about {name} performing as well as possible.
+meeting_prompts = SplitPrompt(
+    "meeting",
+    """You are {full_name}'s executive assistant. You are a top-notch executive assistant who cares about {name} performing as well as possible.
 
 The below email thread has been flagged as requesting time to meet. Your SOLE purpose is to survey {name}'s calendar and schedule meetings for {name}.
 
@@ -37,7 +62,7 @@ NOT
 2:30-3pm
 ```
 
-Do not send time slots less than 15 minutes in length.
+Do not send time slots less than {min_slot_minutes} minutes in length.
 
 Your response should be extremely high density. You should not respond directly to the email, but rather just say factually whether {name} is free, and what time slots. Do not give any extra commentary. Examples of good responses include:
 
@@ -53,31 +78,117 @@ Example 2:
 
 </examples>
 
-The current data is {current_date}
+""",
+    """The current data is {current_date}
 
 Here is the email thread:
 
 From: {author}
 Subject: {subject}
 
-{email_thread}"""
+{email_thread}{calendar}""",
+)
+
+
+def _parse_days(date_strs: list[str]) -> list[date]:
+    return [datetime.strptime(date_str, "%d-%m-%Y").date() for date_str in date_strs]
+
+
+class _Calendar:
+    """The user's calendar as the meeting assistant sees it.
+
+    Events of the days the assistant starts from are already loaded; anything else
+    is fetched from Calendar.
+    """
+
+    def __init__(self, prompt_config, loaded: CalendarEvents | None):
+        self.user_email = prompt_config["email"]
+        self.tz = resolve_timezone(prompt_config["timezone"])
+        self.working_hours = parse_working_hours(prompt_config["working_hours"])
+        self.min_slot = timedelta(minutes=prompt_config["min_slot_minutes"])
+        self.loaded = loaded
+
+    async def between(self, start: datetime, end: datetime) -> list[dict]:
+        if self.loaded is not None and self.loaded.covers(start, end):
+            return self.loaded.between(start, end)
+        return (await get_calendar_events(self.user_email, start, end)).events
+
+    async def events_text(self, date_strs: list[str]) -> str:
+        days = _parse_days(date_strs)
+        events = CalendarEvents(*day_range(days), await self.between(*day_range(days)))
+        return format_events_by_day(date_strs, events.by_day(days))
+
+    async def free_times_text(self, days: list[date]) -> str:
+        start = self.tz.localize(datetime.combine(min(days), time.min))
+        end = self.tz.localize(datetime.combine(max(days) + timedelta(days=1), time.min))
+        slots = free_slots(
+            await self.between(start, end),
+            days,
+            self.tz,
+            self.working_hours,
+            self.min_slot,
+            now=datetime.now(self.tz),
+            user_email=self.user_email,
+        )
+        return format_free_slots(slots, days, self.tz)
+
+    def tools(self) -> list:
+        @tool(
+            "get_events_for_days",
+            description=get_events_for_days.description,
+            args_schema=CalInput,
+        )
+        async def get_events(date_strs: list[str]):
+            return await self.events_text(date_strs)
+
+        @tool(args_schema=CalInput)
+        async def find_free_times(date_strs: list[str]):
+            """
+            Finds the free times during working hours on a list of days, as the largest free chunks.
+
+            Input in the format of ['dd-mm-yyyy', 'dd-mm-yyyy']
+            """
+            return await self.free_times_text(_parse_days(date_strs))
+
+        return [find_free_times, get_events]
 
 
 async def find_meeting_time(state: State, config: RunnableConfig):
     """Write an email to a customer."""
     model = config["configurable"].get("model", "gpt-4o")
-    llm = ChatOpenAI(model=model, temperature=0)
-    agent = create_react_agent(llm, [get_events_for_days])
-    current_date = datetime.now()
+    llm = get_chat_model("openai", model, temperature=0)
     prompt_config = get_config(config)
-    input_message = meeting_prompts.format(
+    days = meeting_days(config)
+    loaded = await take_calendar_prefetch(state["email"], config)
+    if loaded is None and days:
+        try:
+            loaded = await load_meeting_calendar(prompt_config["email"], days)
+        except Exception:
+            logger.warning("Could not load the calendar", exc_info=True)
+    calendar = _Calendar(prompt_config, loaded)
+    free_times = ""
+    if loaded is not None and days:
+        free_times = (
+            f"\n\n{prompt_config['name']}'s free times during working hours on the next "
+            "business days, worked out from the calendar and already merged into the "
+            f"largest chunks:\n\n{await calendar.free_times_text(days)}\n\n"
+            "Answer from these where you can, and use the tools for other days."
+        )
+    tools = calendar.tools()
+    agent = create_react_agent(llm, tools)
+    current_date = datetime.now()
+    input_message = meeting_prompts.render(
+        dict(
+            name=prompt_config["name"],
+            full_name=prompt_config["full_name"],
+            tz=prompt_config["timezone"],
+            min_slot_minutes=prompt_config["min_slot_minutes"],
+        ),
         email_thread=state["email"]["page_content"],
         author=state["email"]["from_email"],
         subject=state["email"]["subject"],
         current_date=current_date.strftime("%A %B %d, %Y"),
-        name=prompt_config["name"],
-        full_name=prompt_config["full_name"],
-        tz=prompt_config["timezone"],
+        calendar=free_times,
     )
     messages = state.get("messages") or []
     # we do this because theres currently a tool call just for routing
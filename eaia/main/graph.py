@@ -1,5 +1,4 @@
 """Overall agent."""
-import json
 from typing import TypedDict, Literal
 from langgraph.graph import END, StateGraph
 from langchain_core.messages import HumanMessage
@@ -8,13 +7,16 @@ from eaia.main.triage import (
 )
 from eaia.main.draft_response import draft_response
 from eaia.main.find_meeting_time import find_meeting_time
+from eaia.main.calendar_prefetch import discard_calendar_prefetch
 from eaia.main.rewrite import rewrite
 from eaia.main.config import get_config
+from eaia.main.tool_calls import coerce_list, repair_args
 from langchain_core.messages import ToolMessage
 from eaia.main.human_inbox import (
     send_message,
     send_email_draft,
     notify,
+    check_invite_conflicts,
     send_cal_invite,
 )
 from eaia.gmail import (
@@ -23,6 +25,7 @@ from eaia.gmail import (
     send_calendar_invite,
 )
 from eaia.schemas import (
+    SendCalendarInvite,
     State,
 )
 
@@ -49,7 +52,7 @@ def take_action(
     "rewrite",
     "mark_as_read_node",
     "find_meeting_time",
-    "send_cal_invite",
+    "check_invite_conflicts",
     "bad_tool_name",
 ]:
     prediction = state["messages"][-1]
@@ -65,7 +68,7 @@ def take_action(
     elif tool_call["name"] == "MeetingAssistant":
         return "find_meeting_time"
     elif tool_call["name"] == "SendCalendarInvite":
-        return "send_cal_invite"
+        return "check_invite_conflicts"
     else:
         return "bad_tool_name"
 
@@ -112,12 +115,13 @@ def enter_after_human(
                 raise ValueError
 
 
-def send_cal_invite_node(state, config):
+async def send_cal_invite_node(state, config):
     tool_call = state["messages"][-1].tool_calls[0]
-    _args = tool_call["args"]
+    # Args may have been edited in the inbox
+    _args = repair_args(tool_call["args"], SendCalendarInvite)
     email = get_config(config)["email"]
     try:
-        send_calendar_invite(
+        await send_calendar_invite(
             _args["emails"],
             _args["title"],
             _args["start_time"],
@@ -130,14 +134,12 @@ def send_cal_invite_node(state, config):
     return {"messages": [ToolMessage(content=message, tool_call_id=tool_call["id"])]}
 
 
-def send_email_node(state, config):
+async def send_email_node(state, config):
     tool_call = state["messages"][-1].tool_calls[0]
     _args = tool_call["args"]
     email = get_config(config)["email"]
-    new_receipients = _args["new_recipients"]
-    if isinstance(new_receipients, str):
-        new_receipients = json.loads(new_receipients)
-    send_email(
+    new_receipients = coerce_list(_args["new_recipients"])
+    await send_email(
         state["email"]["id"],
         _args["content"],
         email,
@@ -145,9 +147,10 @@ def send_email_node(state, config):
     )
 
 
-def mark_as_read_node(state, config):
+async def mark_as_read_node(state, config):
+    discard_calendar_prefetch(state["email"], config)
     email = get_config(config)["email"]
-    mark_as_read(state["email"]["id"], email)
+    await mark_as_read(state["email"]["id"], email)
 
 
 def human_node(state: State):
@@ -171,11 +174,13 @@ graph_builder.add_node(send_email_node)
 graph_builder.add_node(bad_tool_name)
 graph_builder.add_node(notify)
 graph_builder.add_node(send_cal_invite_node)
+graph_builder.add_node(check_invite_conflicts)
 graph_builder.add_node(send_cal_invite)
 graph_builder.add_conditional_edges("triage_input", route_after_triage)
 graph_builder.set_entry_point("triage_input")
 graph_builder.add_conditional_edges("draft_response", take_action)
 graph_builder.add_edge("send_message", "human_node")
+graph_builder.add_edge("check_invite_conflicts", "send_cal_invite")
 graph_builder.add_edge("send_cal_invite", "human_node")
 graph_builder.add_node(find_meeting_time)
 graph_builder.add_edge("find_meeting_time", "draft_response")
@@ -1,5 +1,7 @@
 """Parts of the graph that require human input."""
 
+import logging
+import time
 import uuid
 
 from langsmith import traceable
@@ -8,7 +10,14 @@ from langgraph.types import interrupt
 from langgraph.store.base import BaseStore
 from typing import TypedDict, Literal, Union, Optional
 from langgraph_sdk import get_client
+from eaia.gmail import print_events
+from eaia.main.availability import find_conflicts, resolve_timezone
 from eaia.main.config import get_config
+from eaia.main.fewshot import few_shot_text
+from eaia.main.triage import get_triage_cache_entry
+from eaia.main.triage_classifier import update_triage_classifier
+
+logger = logging.getLogger(__name__)
 
 LGC = get_client()
 
@@ -54,7 +63,7 @@ def _generate_email_markdown(state: State):
         url=f"https://mail.google.com/mail/u/0/#inbox/{contents['id']}",
         to=contents["to_email"],
         _from=contents["from_email"],
-        page_content=contents["page_content"],
+        page_content=contents.get("raw_content") or contents["page_content"],
     )
 
 
@@ -66,8 +75,23 @@ async def save_email(state: State, config, store: BaseStore, status: str):
     key = state["email"]["id"]
     response = await store.aget(namespace, key)
     if response is None:
-        data = {"input": state["email"], "triage": status}
-        await store.aput(namespace, str(uuid.uuid4()), data)
+        data = {
+            "input": state["email"],
+            "triage": status,
+            "text": few_shot_text(state["email"]),
+            # For the triage classifier to look up the examples it hasn't learned
+            "saved_at": time.time(),
+        }
+        # Keyed by email id, so saving the same email again doesn't add (and embed)
+        # another copy
+        await store.aput(namespace, key, data, index=["text"])
+        if config["configurable"].get("triage_classifier", True):
+            await update_triage_classifier(config, store)
+    # Triage this email again next time, with the new example
+    cache_entry = get_triage_cache_entry(state["email"], config, store)
+    if cache_entry is not None:
+        cache, *cache_args = cache_entry
+        await cache.adelete(*cache_args)
 
 
 @traceable
@@ -297,12 +321,36 @@ async def notify(state: State, config, store):
     return {"messages": [msg]}
 
 
+async def check_invite_conflicts(state: State, config):
+    """Look up what the proposed invite conflicts with, for `send_cal_invite`.
+
+    A node of its own, so the Calendar lookup is checkpointed and not repeated
+    when `send_cal_invite` runs again on resume.
+    """
+    prompt_config = get_config(config)
+    tool_call = state["messages"][-1].tool_calls[0]
+    try:
+        conflicts = await find_conflicts(
+            prompt_config["email"],
+            tool_call["args"]["start_time"],
+            tool_call["args"]["end_time"],
+            resolve_timezone(prompt_config["timezone"]),
+        )
+    except Exception:
+        logger.warning("Could not check the invite for conflicts", exc_info=True)
+        conflicts = []
+    return {"invite_conflicts": print_events(conflicts) if conflicts else ""}
+
+
 @traceable
 async def send_cal_invite(state: State, config, store):
     prompt_config = get_config(config)
     memory = prompt_config["memory"]
     user = prompt_config['name']
     tool_call = state["messages"][-1].tool_calls[0]
+    description = _generate_email_markdown(state)
+    if state.get("invite_conflicts"):
+        description += "\n\n**Conflicts with:**\n\n" + state["invite_conflicts"]
     request: HumanInterrupt = {
         "action_request": {"action": tool_call["name"], "args": tool_call["args"]},
         "config": {
@@ -311,7 +359,7 @@ async def send_cal_invite(state: State, config, store):
             "allow_edit": True,
             "allow_accept": True,
         },
-        "description": _generate_email_markdown(state),
+        "description": description,
     }
     response = interrupt([request])[0]
     _email_template = email_template.format(
@@ -0,0 +1,71 @@
+"""Learned preferences (the prompt docs the reflection graphs update), cached per assistant.
+
+All of an assistant's prompt docs are read with one batched store operation and
+kept in process. Whenever the reflection graphs rewrite a doc they also write a
+new version marker, so later reads only need to fetch that marker to know the
+cached docs are still current. Docs that don't exist yet are seeded from the
+config, all in one batched write.
+"""
+
+import uuid
+
+from langgraph.store.base import BaseStore, GetOp, PutOp
+
+from eaia.main.config import get_config
+
+# Store key of each prompt doc, and the config key of its default
+PROMPT_KEYS = {
+    "schedule_preferences": "schedule_preferences",
+    "random_preferences": "background_preferences",
+    "response_preferences": "response_preferences",
+    "rewrite_instructions": "rewrite_preferences",
+}
+VERSION_KEY = "prompt_version"
+
+# Per namespace, the version the docs were read at and the docs
+_cache: dict[tuple[str, ...], tuple[str | None, dict[str, str]]] = {}
+
+
+def _namespace(assistant_id: str) -> tuple[str, ...]:
+    return (assistant_id,)
+
+
+async def get_preferences(config, store: BaseStore) -> dict[str, str]:
+    """The assistant's prompt docs, by store key (see `PROMPT_KEYS`)."""
+    namespace = _namespace(config["configurable"].get("assistant_id", "default"))
+    cached = _cache.get(namespace)
+    if cached is not None:
+        item = await store.aget(namespace, VERSION_KEY)
+        if (item.value["version"] if item else None) == cached[0]:
+            return cached[1]
+    results = await store.abatch(
+        [GetOp(namespace, key) for key in PROMPT_KEYS]
+        + [GetOp(namespace, VERSION_KEY)]
+    )
+    *items, version_item = results
+    version = version_item.value["version"] if version_item else None
+    prompt_config = get_config(config)
+    preferences = {}
+    seeds = []
+    for (key, default_key), item in zip(PROMPT_KEYS.items(), items):
+        if item and "data" in item.value:
+            preferences[key] = item.value["data"]
+        else:
+            preferences[key] = prompt_config[default_key]
+            seeds.append(PutOp(namespace, key, {"data": preferences[key]}, index=False))
+    if seeds:
+        await store.abatch(seeds)
+    _cache[namespace] = (version, preferences)
+    return preferences
+
+
+async def put_preference(assistant_id: str, key: str, value: str, store: BaseStore):
+    """Write a prompt doc, and a new version so every worker reloads them."""
+    namespace = _namespace(assistant_id)
+    await store.abatch(
+        [
+            PutOp(namespace, key, {"data": value}, index=False),
+            PutOp(namespace, VERSION_KEY, {"version": uuid.uuid4().hex}, index=False),
+        ]
+    )
+    _cache.pop(namespace, None)
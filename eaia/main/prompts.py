@@ -0,0 +1,95 @@
+"""Prompt assembly, with the per-assistant part of each prompt first.
+
+Model providers cache the longest prompt prefix they have recently seen, which
+makes repeated prefixes faster and cheaper. So every prompt is a prefix that only
+depends on the assistant's config and preferences, followed by a suffix with the
+email and anything else that changes from call to call. The rendered prefix is
+cached per prompt and per version of the values it is rendered from, and prompt
+stats record how many prefix tokens each call shares with an earlier one.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import Counter, OrderedDict
+
+from eaia.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_MAX_PREFIXES = 1_000
+
+
+class SplitPrompt:
+    """A prompt template split into a stable prefix and a volatile suffix.
+
+    The prefix is formatted with the assistant's values only. The suffix can use
+    both, so `template` formats to the same text as `render`.
+    """
+
+    def __init__(self, name: str, prefix: str, suffix: str):
+        self.name = name
+        self.prefix = prefix
+        self.suffix = suffix
+
+    @property
+    def template(self) -> str:
+        return self.prefix + self.suffix
+
+    def render_prefix(self, **static) -> str:
+        return _get_prefix(self, static)[0]
+
+    def render(self, static: dict, **volatile) -> str:
+        prefix, tokens, key = _get_prefix(self, static)
+        text = prefix + self.suffix.format(**static, **volatile)
+        with _stats_lock:
+            # Only prefixes already sent in a prompt count as reused
+            reused = key in _sent
+            _sent.add(key)
+            _stats[self.name, "renders"] += 1
+            _stats[self.name, "prefix_tokens"] += tokens
+            if reused:
+                _stats[self.name, "prefix_tokens_reused"] += tokens
+        return text
+
+
+_prefixes: OrderedDict[tuple[str, str], tuple[str, int]] = OrderedDict()
+_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats: Counter = Counter()
+_sent: set[tuple[str, str]] = set()
+
+
+def _get_prefix(prompt: SplitPrompt, static: dict) -> tuple[str, int, tuple[str, str]]:
+    """The rendered prefix, its length in tokens, and its cache key."""
+    version = hashlib.sha256(
+        json.dumps(static, sort_keys=True, default=str).encode("UTF-8")
+    ).hexdigest()
+    key = (prompt.name, version)
+    with _lock:
+        cached = _prefixes.get(key)
+        if cached is not None:
+            _prefixes.move_to_end(key)
+            return (*cached, key)
+    text = prompt.prefix.format(**static)
+    cached = (text, count_tokens(text))
+    with _lock:
+        _prefixes[key] = cached
+        while len(_prefixes) > _MAX_PREFIXES:
+            evicted, _ = _prefixes.popitem(last=False)
+            _sent.discard(evicted)
+    logger.debug(f"Rendered new `{prompt.name}` prefix ({cached[1]} tokens)")
+    return (*cached, key)
+
+
+def prompt_stats() -> dict[str, dict]:
+    """Per prompt: calls, prefix tokens sent, and how many of those were a repeat.
+
+    Repeated prefix tokens are the ones a provider's prompt cache can serve.
+    """
+    stats: dict[str, dict] = {}
+    with _stats_lock:
+        for (name, stat), value in _stats.items():
+            stats.setdefault(name, {})[stat] = value
+    return stats
@@ -0,0 +1,197 @@
+"""Local validation and repair of the tool calls the drafting model makes.
+
+Small slips in a tool call, like a `functions.` prefix on the tool name, a list
+argument sent as a JSON string or a start time that isn't ISO formatted, would
+otherwise send the call back to the model: `draft_response` retries when it
+doesn't get exactly one tool call, `bad_tool_name` asks again for unknown names
+and failed calendar invites go back to drafting. `repair_tool_calls` fixes these
+in place, and `tool_call_repair_stats()` counts the model round trips saved.
+"""
+
+import json
+import logging
+import re
+import threading
+import typing
+from datetime import datetime
+
+from dateutil import parser as date_parser
+from langchain_core.messages import AIMessage
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Fields holding times, normalized to the `2024-07-01T14:00:00` format the schemas ask for
+DATETIME_FIELDS = {"start_time", "end_time"}
+
+# Two defaults differing in every field `_parse_complete` checks, so that a field
+# missing from the value shows up as a difference between the two parses
+_SENTINELS = (datetime(1901, 1, 1, 0, 0), datetime(1902, 2, 2, 1, 0))
+
+_PREFIX = re.compile(r"^(?:functions?|tools?)\s*(?:\.|::?)\s*", re.IGNORECASE)
+
+_lock = threading.Lock()
+_stats = {"checked": 0, "repaired": 0, "args_repaired": 0, "round_trips_saved": 0}
+
+
+def _name_key(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def repair_name(name: str, schemas: list[type[BaseModel]]) -> str:
+    """The schema name meant by `name`, or `name` if none matches."""
+    names = {_name_key(schema.__name__): schema.__name__ for schema in schemas}
+    stripped = _PREFIX.sub("", name.strip()).strip(": ")
+    return names.get(_name_key(stripped), name)
+
+
+def coerce_list(value) -> list:
+    """A list argument sent as a JSON string or a comma separated string, as a list."""
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    if not text:
+        return []
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        parsed = None
+    if isinstance(parsed, list):
+        return parsed
+    return [item.strip() for item in re.split(r"[,;\n]", text) if item.strip()]
+
+
+def _parse_complete(value: str) -> datetime | None:
+    """`value` parsed, if it gives the date and the time rather than leaving them to defaults."""
+    parsed = []
+    for default in _SENTINELS:
+        try:
+            parsed.append(date_parser.parse(value, default=default))
+        except (ValueError, OverflowError):
+            return None
+    first, second = parsed
+    if (first.year, first.month, first.day, first.hour) != (
+        second.year,
+        second.month,
+        second.day,
+        second.hour,
+    ):
+        return None
+    return first
+
+
+def normalize_datetime(value):
+    """A time in `2024-07-01T14:00:00` format, parsed from e.g. `July 1, 2024 2pm`.
+
+    Times with an offset keep it. Values that don't give both the date and the
+    time, like `Tuesday` or `2pm`, and unparseable ones are returned as is, so
+    they go back to the model rather than becoming a guess.
+    """
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        parsed = _parse_complete(text)
+        if parsed is None:
+            return value
+    else:
+        if len(text) <= len("2024-07-01"):
+            # A date without a time
+            return value
+    if parsed.tzinfo is not None:
+        return parsed.isoformat()
+    return parsed.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _is_list(annotation) -> bool:
+    return typing.get_origin(annotation) in (list, typing.List)
+
+
+def repair_args(args: dict, schema: type[BaseModel]) -> dict:
+    """`args` with list and time arguments coerced to what `schema` expects."""
+    repaired = dict(args)
+    for name, field in schema.model_fields.items():
+        if name not in repaired:
+            continue
+        if _is_list(field.annotation):
+            repaired[name] = coerce_list(repaired[name])
+        elif name in DATETIME_FIELDS:
+            repaired[name] = normalize_datetime(repaired[name])
+    return repaired
+
+
+def _parse_args(args: str) -> dict | None:
+    """Arguments the provider couldn't parse, e.g. wrapped in a code fence."""
+    start, end = args.find("{"), args.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        parsed = json.loads(args[start : end + 1])
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def repair_tool_calls(message: AIMessage, schemas: list[type[BaseModel]]) -> AIMessage:
+    """Fix the message's tool calls where that doesn't need the model.
+
+    Fixes tool names, list and time arguments, arguments that failed to parse,
+    and the same call made more than once.
+
+    Returns:
+        The repaired message, or `message` itself if nothing was repaired
+    """
+    by_name = {schema.__name__: schema for schema in schemas}
+    tool_calls = [dict(tool_call) for tool_call in message.tool_calls]
+    invalid_tool_calls = list(message.invalid_tool_calls)
+    if not tool_calls and len(invalid_tool_calls) == 1:
+        args = _parse_args(invalid_tool_calls[0].get("args") or "")
+        if args is not None:
+            invalid = invalid_tool_calls.pop()
+            tool_calls = [
+                {"name": invalid["name"] or "", "args": args, "id": invalid["id"], "type": "tool_call"}
+            ]
+    # Without the repair, a wrong number of calls or an unknown name goes back to the model
+    saves_round_trip = len(message.tool_calls) != 1 and len(tool_calls) > 0
+    args_repaired = False
+    for tool_call in tool_calls:
+        name = repair_name(tool_call["name"], schemas)
+        schema = by_name.get(name)
+        if schema is None:
+            continue
+        saves_round_trip |= name != tool_call["name"]
+        args = repair_args(tool_call["args"], schema)
+        args_repaired |= args != tool_call["args"]
+        tool_call["name"] = name
+        tool_call["args"] = args
+    if len(tool_calls) > 1 and all(
+        (t["name"], t["args"]) == (tool_calls[0]["name"], tool_calls[0]["args"])
+        for t in tool_calls
+    ):
+        tool_calls = tool_calls[:1]
+    changed = tool_calls != message.tool_calls
+    with _lock:
+        _stats["checked"] += 1
+        _stats["repaired"] += changed
+        _stats["args_repaired"] += args_repaired
+        _stats["round_trips_saved"] += (
+            changed and saves_round_trip and len(tool_calls) == 1 and tool_calls[0]["name"] in by_name
+        )
+    if not changed:
+        return message
+    logger.debug(f"Repaired tool calls {message.tool_calls or message.invalid_tool_calls} to {tool_calls}")
+    return message.model_copy(
+        update={"tool_calls": tool_calls, "invalid_tool_calls": invalid_tool_calls}
+    )
+
+
+def tool_call_repair_stats() -> dict:
+    """Counts of messages checked and repaired, and model round trips saved by repairs.
+
+    Only repairs of the number of calls and of tool names count as saved round
+    trips; `args_repaired` counts messages whose arguments were coerced.
+    """
+    with _lock:
+        return dict(_stats)
@@ -1,19 +1,30 @@
 """Agent responsible for triaging the email, can either ignore it, try to respond, or notify user."""
 
+import asyncio
+
 from langchain_core.runnables import RunnableConfig
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import RemoveMessage
 from langgraph.store.base import BaseStore
 
 from eaia.schemas import (
+    BatchRespondTo,
+    EmailData,
     State,
     RespondTo,
 )
-from eaia.main.fewshot import get_few_shot_examples
+from eaia.main.calendar_prefetch import start_calendar_prefetch
+from eaia.main.fewshot import get_batch_few_shot_examples, get_few_shot_examples
 from eaia.main.config import get_config
+from eaia.main.prompts import SplitPrompt
+from eaia.models import get_chat_model
+from eaia.main.triage_cache import get_triage_cache, triage_cache_key
+from eaia.main.triage_classifier import classify_triage
+from eaia.main.triage_rules import match_triage_rules
 
 
-triage_prompt = """You are {full_name}'s executive assistant. You are a top-notch executive assistant who cares about {name} performing as well as possible.
+triage_prompt = SplitPrompt(
+    "triage",
+    """You are {full_name}'s executive assistant. You are a top-notch executive assistant who cares about {name} performing as well as possible.
 
 {background}.
 
@@ -32,7 +43,8 @@ For emails not worth responding to, respond `no`. For something where {name} sho
 
 If unsure, opt to `notify` {name} - you will learn from this in the future.
 
-{fewshotexamples}
+""",
+    """{fewshotexamples}
 
 Please determine how to handle the below email thread:
 
@@ -40,20 +52,54 @@ From: {author}
 To: {to}
 Subject: {subject}
 
-{email_thread}"""
+{email_thread}""",
+)
 
 
-async def triage_input(state: State, config: RunnableConfig, store: BaseStore):
-    model = config["configurable"].get("model", "gpt-4o")
-    llm = ChatOpenAI(model=model, temperature=0)
-    examples = await get_few_shot_examples(state["email"], store, config)
-    prompt_config = get_config(config)
-    input_message = triage_prompt.format(
-        email_thread=state["email"]["page_content"],
-        author=state["email"]["from_email"],
-        to=state["email"].get("to_email", ""),
-        subject=state["email"]["subject"],
-        fewshotexamples=examples,
+batch_triage_prompt = SplitPrompt(
+    "batch_triage",
+    """You are {full_name}'s executive assistant. You are a top-notch executive assistant who cares about {name} performing as well as possible.
+
+{background}.
+
+{name} gets lots of emails. Your job is to categorize each of the below emails to see whether is it worth responding to.
+
+Emails that are not worth responding to:
+{triage_no}
+
+Emails that are worth responding to:
+{triage_email}
+
+There are also other things that {name} should know about, but don't require an email response. For these, you should notify {name} (using the `notify` response). Examples of this include:
+{triage_notify}
+
+For emails not worth responding to, respond `no`. For something where {name} should respond over email, respond `email`. If it's important to notify {name}, but no email is required, respond `notify`. \
+
+If unsure, opt to `notify` {name} - you will learn from this in the future.
+
+""",
+    """{fewshotexamples}
+
+Please determine how to handle each of the below {count} email threads. Make exactly one decision per email, referring to the email by its number:
+
+{emails}""",
+)
+
+batch_email_template = """<email number="{number}">
+From: {author}
+To: {to}
+Subject: {subject}
+
+{email_thread}
+</email>"""
+
+# Each email's content is cut to this many characters in batched triage, to keep
+# the prompt a reasonable size
+_BATCH_EMAIL_CHARS = 4000
+
+
+def _prompt_kwargs(prompt_config: dict) -> dict:
+    return dict(
         name=prompt_config["name"],
         full_name=prompt_config["full_name"],
         background=prompt_config["background"],
@@ -61,12 +107,139 @@ async def triage_input(state: State, config: RunnableConfig, store: BaseStore):
         triage_email=prompt_config["triage_email"],
         triage_notify=prompt_config["triage_notify"],
     )
-    model = llm.with_structured_output(RespondTo).bind(
-        tool_choice={"type": "function", "function": {"name": "RespondTo"}}
+
+
+def get_triage_cache_entry(email, config, store: BaseStore):
+    """Where this email's triage result is cached, or None if caching is off.
+
+    Returns:
+        (cache, key, store or None, namespace), the arguments for `TriageCache` calls
+    """
+    cache, in_store = get_triage_cache(config)
+    if cache is None:
+        return None
+    rendered_config = triage_prompt.render_prefix(**_prompt_kwargs(get_config(config)))
+    model = config["configurable"].get("model", "gpt-4o")
+    namespace = (
+        config["configurable"].get("assistant_id", "default"),
+        "triage_cache",
     )
-    response = await model.ainvoke(input_message)
+    key = triage_cache_key(email, rendered_config, model)
+    return cache, key, store if in_store else None, namespace
+
+
+async def triage_input(state: State, config: RunnableConfig, store: BaseStore):
+    model = config["configurable"].get("model", "gpt-4o")
+    if state.get("triaged_email_id") == state["email"]["id"] and state.get("triage"):
+        # Already triaged when the run was started
+        cache_entry = None
+        response = state["triage"]
+    else:
+        cache_entry = None
+        response = match_triage_rules(state["email"], get_config(config))
+        if response is None:
+            cache_entry = get_triage_cache_entry(state["email"], config, store)
+            if cache_entry is not None:
+                cache, *cache_args = cache_entry
+                response = await cache.aget(*cache_args)
+        if response is None:
+            response = await classify_triage(state["email"], config, store)
+    if response is None:
+        llm = get_chat_model("openai", model, temperature=0)
+        examples = await get_few_shot_examples(state["email"], store, config)
+        prompt_config = get_config(config)
+        input_message = triage_prompt.render(
+            _prompt_kwargs(prompt_config),
+            email_thread=state["email"]["page_content"],
+            author=state["email"]["from_email"],
+            to=state["email"].get("to_email", ""),
+            subject=state["email"]["subject"],
+            fewshotexamples=examples,
+        )
+        model = llm.with_structured_output(RespondTo).bind(
+            tool_choice={"type": "function", "function": {"name": "RespondTo"}}
+        )
+        response = await model.ainvoke(input_message)
+        if cache_entry is not None:
+            cache_key, cache_store, cache_namespace = cache_args
+            await cache.aput(cache_key, response, cache_store, cache_namespace)
+    if response.response == "email":
+        # Overlaps loading the calendar with drafting, in case the drafter asks
+        # the meeting assistant
+        start_calendar_prefetch(state["email"], config)
     if len(state["messages"]) > 0:
         delete_messages = [RemoveMessage(id=m.id) for m in state["messages"]]
         return {"triage": response, "messages": delete_messages}
     else:
         return {"triage": response}
+
+
+async def triage_emails(
+    emails: list[EmailData], config: RunnableConfig, store: BaseStore
+) -> list[RespondTo | None]:
+    """Triage several emails with a single model call.
+
+    Like `triage_input`, emails are first checked against the triage rules, the
+    triage cache and the local classifier, and new model results are cached.
+
+    Returns:
+        One result per email, None for emails the model didn't decide on
+    """
+    model = config["configurable"].get("model", "gpt-4o")
+    prompt_config = get_config(config)
+    ruled = [match_triage_rules(email, prompt_config) for email in emails]
+    cache_entries = [
+        get_triage_cache_entry(email, config, store) if result is None else None
+        for email, result in zip(emails, ruled)
+    ]
+
+    async def get_cached(entry):
+        if entry is None:
+            return None
+        cache, *cache_args = entry
+        return await cache.aget(*cache_args)
+
+    cached = await asyncio.gather(*(get_cached(entry) for entry in cache_entries))
+    results = [ruled[i] or cached[i] for i in range(len(emails))]
+    for i, email in enumerate(emails):
+        if results[i] is None:
+            results[i] = await classify_triage(email, config, store)
+    uncached = [i for i, result in enumerate(results) if result is None]
+    if not uncached:
+        return results
+    llm = get_chat_model("openai", model, temperature=0)
+    examples = await get_batch_few_shot_examples(
+        [emails[i] for i in uncached], store, config
+    )
+    input_message = batch_triage_prompt.render(
+        _prompt_kwargs(prompt_config),
+        count=len(uncached),
+        emails="\n\n".join(
+            batch_email_template.format(
+                number=number,
+                email_thread=emails[i]["page_content"][:_BATCH_EMAIL_CHARS],
+                author=emails[i]["from_email"],
+                to=emails[i].get("to_email", ""),
+                subject=emails[i]["subject"],
+            )
+            for number, i in enumerate(uncached, start=1)
+        ),
+        fewshotexamples=examples,
+    )
+    model = llm.with_structured_output(BatchRespondTo).bind(
+        tool_choice={"type": "function", "function": {"name": "BatchRespondTo"}}
+    )
+    response = await model.ainvoke(input_message)
+    puts = []
+    for decision in response.decisions:
+        if not 1 <= decision.email <= len(uncached):
+            continue
+        i = uncached[decision.email - 1]
+        if results[i] is not None:
+            continue
+        results[i] = RespondTo(logic=decision.logic, response=decision.response)
+        if cache_entries[i] is not None:
+            cache, key, cache_store, namespace = cache_entries[i]
+            puts.append(cache.aput(key, results[i], cache_store, namespace))
+    await asyncio.gather(*puts)
+    return results
@@ -0,0 +1,266 @@
+"""Cache of triage results, keyed on email content, triage config and model.
+
+Reruns of the same email (`--rerun`, or runs rolled back by a newer email on the
+thread) then skip both the few-shot search and the model call.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from langgraph.store.base import BaseStore
+
+from eaia.schemas import EmailData, RespondTo
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_PATH = Path.home() / ".cache" / "eaia" / "triage_cache.sqlite"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def triage_cache_key(email: EmailData, rendered_config: str, model: str) -> str:
+    """Hash of what the triage result depends on, besides few-shot examples.
+
+    Args:
+        email: Email being triaged
+        rendered_config: Triage prompt rendered with the user's config, but no email
+        model: Name of the triage model
+    """
+    content = {
+        "from_email": _normalize(email["from_email"]).lower(),
+        "to_email": _normalize(email.get("to_email", "")).lower(),
+        "subject": _normalize(email["subject"]),
+        "page_content": _normalize(email["page_content"]),
+        "config": rendered_config,
+        "model": model,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("UTF-8")).hexdigest()
+
+
+class TriageCache:
+    """Cache of triage results with a TTL.
+
+    Entries live in the LangGraph store when calls pass `store` and `namespace`,
+    so every worker shares them. Otherwise they live in a process-wide LRU of up
+    to `max_entries`, or in a local SQLite file of up to `max_entries` if `path`
+    is set, which processes on the same machine share.
+
+    Store entries are only bounded by the TTL, which the store enforces if it
+    supports TTLs; `max_entries` doesn't apply to them.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        path: Path | None = None,
+        in_store: bool = False,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.in_store = in_store
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    def stats(self) -> dict:
+        """Hits and misses of this process, and the number of entries.
+
+        The size is left out for store-backed caches, which can't be counted cheaply.
+        """
+        lookups = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+        if self.in_store:
+            return stats
+        with self._lock:
+            if self.path is None:
+                stats["size"] = len(self._entries)
+            else:
+                (stats["size"],) = (
+                    self._connect()
+                    .execute(
+                        "SELECT COUNT(*) FROM triage_cache WHERE created_at > ?",
+                        (time.time() - self.ttl,),
+                    )
+                    .fetchone()
+                )
+        return stats
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS triage_cache "
+                "(key TEXT PRIMARY KEY, triage TEXT, created_at REAL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS triage_cache_created_at "
+                "ON triage_cache (created_at)"
+            )
+        return self._db
+
+    def _read(self, key: str, now: float) -> tuple[float, dict] | None:
+        with self._lock:
+            if self.path is None:
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[0] >= self.ttl:
+                    del self._entries[key]
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                return entry
+            # Read from the file every time, so entries other processes deleted are gone
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT created_at, triage FROM triage_cache WHERE key = ? AND created_at > ?",
+                    (key, now - self.ttl),
+                )
+                .fetchone()
+            )
+        return (row[0], json.loads(row[1])) if row is not None else None
+
+    def _write(self, key: str, created_at: float, triage: dict):
+        with self._lock:
+            if self.path is None:
+                self._entries[key] = (created_at, triage)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                return
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO triage_cache VALUES (?, ?, ?)",
+                (key, json.dumps(triage), created_at),
+            )
+            # Expired entries go first, then the oldest past `max_entries`
+            db.execute("DELETE FROM triage_cache WHERE created_at <= ?", (created_at - self.ttl,))
+            (count,) = db.execute("SELECT COUNT(*) FROM triage_cache").fetchone()
+            if count > self.max_entries:
+                db.execute(
+                    "DELETE FROM triage_cache WHERE key IN "
+                    "(SELECT key FROM triage_cache ORDER BY created_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            db.commit()
+
+    def _delete(self, key: str):
+        with self._lock:
+            if self.path is None:
+                self._entries.pop(key, None)
+                return
+            db = self._connect()
+            db.execute("DELETE FROM triage_cache WHERE key = ?", (key,))
+            db.commit()
+
+    async def _run(self, fn, *args):
+        # Only the SQLite file blocks, so memory-only caches stay on the event loop
+        if self.path is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def aget(
+        self,
+        key: str,
+        store: BaseStore | None = None,
+        namespace: tuple[str, ...] | None = None,
+    ) -> RespondTo | None:
+        now = time.time()
+        entry = None
+        if store is not None:
+            item = await store.aget(namespace, key)
+            if item is not None and now - item.value["created_at"] < self.ttl:
+                entry = (item.value["created_at"], item.value["triage"])
+        else:
+            entry = await self._run(self._read, key, now)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return RespondTo(**entry[1])
+
+    async def aput(
+        self,
+        key: str,
+        triage: RespondTo,
+        store: BaseStore | None = None,
+        namespace: tuple[str, ...] | None = None,
+    ):
+        created_at = time.time()
+        value = triage.model_dump()
+        if store is not None:
+            await store.aput(
+                namespace,
+                key,
+                {"created_at": created_at, "triage": value},
+                index=False,
+                ttl=self.ttl / 60 if store.supports_ttl else None,
+            )
+            return
+        await self._run(self._write, key, created_at, value)
+
+    async def adelete(
+        self,
+        key: str,
+        store: BaseStore | None = None,
+        namespace: tuple[str, ...] | None = None,
+    ):
+        if store is not None:
+            await store.adelete(namespace, key)
+            return
+        await self._run(self._delete, key)
+
+
+# Process-wide caches, keyed by backend and its settings
+_caches: dict[tuple, TriageCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_triage_cache(config) -> tuple[TriageCache | None, bool]:
+    """Get the triage cache selected by `config`.
+
+    Set `triage_cache` in the configurable to "store" (the default), "file",
+    "memory" or "off". `triage_cache_ttl` (seconds), `triage_cache_size` and
+    `triage_cache_path` tune it. The size limit doesn't apply to the store,
+    where the TTL alone bounds the entries.
+
+    Returns:
+        The cache, or None when turned off, and whether it is backed by the store
+    """
+    configurable = config["configurable"]
+    backend = configurable.get("triage_cache", "store")
+    if backend in (None, "off"):
+        return None, False
+    if backend not in ("store", "file", "memory"):
+        raise ValueError(f"Unknown triage cache backend: {backend}")
+    path = (
+        Path(configurable.get("triage_cache_path") or DEFAULT_PATH)
+        if backend == "file"
+        else None
+    )
+    ttl = configurable.get("triage_cache_ttl", DEFAULT_TTL)
+    max_entries = configurable.get("triage_cache_size", DEFAULT_MAX_ENTRIES)
+    settings = (backend, path, ttl, max_entries)
+    with _caches_lock:
+        if settings not in _caches:
+            _caches[settings] = TriageCache(max_entries, ttl, path, backend == "store")
+        return _caches[settings], backend == "store"
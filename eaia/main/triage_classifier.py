@@ -0,0 +1,257 @@
+"""Local triage classifier, learned from the labeled `triage_examples`.
+
+A multinomial logistic regression over hashed word n-grams of the sender, subject
+and body, learned online and kept in process. Each example is first predicted,
+then learned from, so the model keeps a running record of how often its confident
+predictions were right. It only triages an email locally, without calling the
+model, when that record shows it is right at least as often as the threshold
+asks, and when it has seen enough examples of more than one label.
+
+`save_email` stores examples labeled `email` or `no` (never `notify`), so those
+are the only decisions the classifier makes; everything else goes to the model.
+Along with each example it writes a new version marker. Each triage only reads
+that marker, and after it changes, the model learns just the examples saved since.
+"""
+
+import logging
+import math
+import re
+import threading
+import uuid
+import zlib
+from collections import Counter, deque
+from dataclasses import dataclass, field
+
+from langgraph.store.base import BaseStore
+
+from eaia.schemas import EmailData, RespondTo
+from eaia.store_utils import search_all
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_MIN_EXAMPLES = 100
+# Examples needed of at least two labels before deciding anything locally
+DEFAULT_MIN_PER_LABEL = 20
+# Hash buckets, which also caps the weights of each label
+_N_FEATURES = 1 << 18
+_BODY_CHARS = 2000
+_LEARNING_RATE = 0.5
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9'_-]*")
+# Recent predictions the precision at a threshold is measured on, and how many of
+# them must be at least that confident for the measurement to count
+_CALIBRATION_WINDOW = 500
+_MIN_CALIBRATION = 20
+# Examples saved this long before the newest one learned are looked up again, as
+# workers' clocks differ
+_CLOCK_SKEW = 300.0
+VERSION_KEY = "version"
+
+
+def _hash(feature: str) -> int:
+    # Stable across processes, unlike `hash`
+    return zlib.crc32(feature.encode("UTF-8")) % _N_FEATURES
+
+
+def featurize(email: EmailData) -> dict[int, float]:
+    """Hashed, L2-normalized binary features of an email."""
+    sender = email["from_email"].lower()
+    address = sender[sender.find("<") + 1 : sender.rfind(">")] if "<" in sender else sender
+    domain = address.rpartition("@")[2]
+    names = {"f:" + address, "d:" + domain}
+    subject = _TOKEN.findall(email["subject"].lower())
+    body = _TOKEN.findall((email.get("page_content") or "")[:_BODY_CHARS].lower())
+    names.update("s:" + token for token in subject)
+    names.update("b:" + token for token in body)
+    names.update(f"b:{a} {b}" for a, b in zip(body, body[1:]))
+    value = 1 / math.sqrt(len(names))
+    return {_hash(name): value for name in names}
+
+
+class TriageClassifier:
+    """Softmax regression over hashed features, trained with online SGD."""
+
+    def __init__(self):
+        self.weights: dict[str, dict[int, float]] = {}
+        self.bias: dict[str, float] = {}
+        self.n_examples = 0
+        self.label_counts: Counter[str] = Counter()
+        # (confidence, whether right) of recent predictions, each made before
+        # learning from the example
+        self.calibration: deque[tuple[float, bool]] = deque(maxlen=_CALIBRATION_WINDOW)
+
+    def predict_proba(self, features: dict[int, float]) -> dict[str, float]:
+        if not self.weights:
+            return {}
+        scores = {
+            label: self.bias[label]
+            + sum(weights.get(f, 0.0) * v for f, v in features.items())
+            for label, weights in self.weights.items()
+        }
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exp.values())
+        return {label: e / total for label, e in exp.items()}
+
+    def partial_fit(self, features: dict[int, float], label: str):
+        if label not in self.weights:
+            self.weights[label] = {}
+            self.bias[label] = 0.0
+        probs = self.predict_proba(features)
+        for cls, weights in self.weights.items():
+            gradient = probs[cls] - (cls == label)
+            if not gradient:
+                continue
+            self.bias[cls] -= _LEARNING_RATE * gradient
+            for f, v in features.items():
+                weights[f] = weights.get(f, 0.0) - _LEARNING_RATE * gradient * v
+        self.n_examples += 1
+
+    def learn(self, features: dict[int, float], label: str):
+        """Record how the current model does on an example, then learn from it."""
+        probs = self.predict_proba(features)
+        if probs:
+            predicted, confidence = max(probs.items(), key=lambda x: x[1])
+            self.calibration.append((confidence, predicted == label))
+        self.partial_fit(features, label)
+        self.label_counts[label] += 1
+
+    def precision(self, threshold: float) -> tuple[int, float]:
+        """How many recent predictions were at least `threshold` confident, and how many were right."""
+        confident = [right for confidence, right in self.calibration if confidence >= threshold]
+        return len(confident), sum(confident) / len(confident) if confident else 0.0
+
+    def decide(
+        self,
+        features: dict[int, float],
+        threshold: float = DEFAULT_THRESHOLD,
+        min_examples: int = DEFAULT_MIN_EXAMPLES,
+        min_per_label: int = DEFAULT_MIN_PER_LABEL,
+    ) -> tuple[str, float] | None:
+        """The label to triage with locally and its confidence, or None to ask the model."""
+        if self.n_examples < min_examples:
+            return None
+        if sum(count >= min_per_label for count in self.label_counts.values()) < 2:
+            return None
+        probs = self.predict_proba(features)
+        label, confidence = max(probs.items(), key=lambda x: x[1])
+        if confidence < threshold:
+            return None
+        n_confident, precision = self.precision(threshold)
+        if n_confident < _MIN_CALIBRATION or precision < threshold:
+            return None
+        return label, confidence
+
+
+def _namespaces(config) -> tuple[tuple[str, str], tuple[str, str]]:
+    assistant_id = config["configurable"].get("assistant_id", "default")
+    return (assistant_id, "triage_examples"), (assistant_id, "triage_model")
+
+
+@dataclass
+class _Learned:
+    model: TriageClassifier = field(default_factory=TriageClassifier)
+    version: str | None = None
+    # Keys of the examples learned, and when the newest of them was saved
+    keys: set[str] = field(default_factory=set)
+    saved_until: float | None = None
+
+
+# Per examples namespace, what the in-process model has learned
+_models: dict[tuple, _Learned] = {}
+_stats_lock = threading.Lock()
+_stats = Counter()
+
+
+def _saved_at(example) -> float:
+    # Examples saved before `saved_at` was recorded only come from the first scan
+    return example.value.get("saved_at") or example.created_at.timestamp()
+
+
+async def get_triage_classifier(config, store: BaseStore) -> TriageClassifier:
+    """The assistant's classifier, after learning the examples saved since it last looked."""
+    examples_namespace, version_namespace = _namespaces(config)
+    item = await store.aget(version_namespace, VERSION_KEY)
+    version = item.value["version"] if item else None
+    learned = _models.get(examples_namespace)
+    if learned is not None and learned.version == version:
+        return learned.model
+    if learned is None or learned.saved_until is None:
+        examples = await search_all(store, examples_namespace)
+    else:
+        examples = await search_all(
+            store,
+            examples_namespace,
+            filter={"saved_at": {"$gt": learned.saved_until - _CLOCK_SKEW}},
+        )
+    # Looked up again: another triage may have learned from the same examples meanwhile
+    learned = _models.setdefault(examples_namespace, _Learned())
+    new = sorted(
+        (example for example in examples if example.key not in learned.keys),
+        # In the order they were saved, so every worker learns the same model
+        key=lambda example: (_saved_at(example), example.key),
+    )
+    for example in new:
+        learned.model.learn(featurize(example.value["input"]), example.value["triage"])
+        learned.keys.add(example.key)
+        learned.saved_until = max(learned.saved_until or 0.0, _saved_at(example))
+    learned.version = version
+    if new:
+        logger.info(
+            f"Triage classifier learned {len(new)} examples, {learned.model.n_examples} in all"
+        )
+    return learned.model
+
+
+async def update_triage_classifier(config, store: BaseStore):
+    """Mark the classifier stale after an example was added to `triage_examples`.
+
+    The examples are the model's only shared state, so workers saving examples at
+    the same time can't overwrite each other's updates; each worker learns the new
+    examples when it next sees a new version.
+    """
+    await store.aput(
+        _namespaces(config)[1], VERSION_KEY, {"version": uuid.uuid4().hex}, index=False
+    )
+
+
+def triage_classifier_stats() -> dict:
+    """How many emails the classifier triaged locally, and how many it escalated.
+
+    Every local decision is a model call avoided.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+async def classify_triage(
+    email: EmailData, config, store: BaseStore
+) -> RespondTo | None:
+    """Triage `email` locally, or None if the classifier isn't confident enough.
+
+    Set `triage_classifier` to false in the configurable to turn it off, and tune it
+    with `triage_classifier_threshold`, `triage_classifier_min_examples` and
+    `triage_classifier_min_per_label`.
+    """
+    configurable = config["configurable"]
+    if not configurable.get("triage_classifier", True):
+        return None
+    model = await get_triage_classifier(config, store)
+    min_examples = configurable.get("triage_classifier_min_examples", DEFAULT_MIN_EXAMPLES)
+    if model.n_examples < min_examples:
+        return None
+    decision = model.decide(
+        featurize(email),
+        configurable.get("triage_classifier_threshold", DEFAULT_THRESHOLD),
+        min_examples,
+        configurable.get("triage_classifier_min_per_label", DEFAULT_MIN_PER_LABEL),
+    )
+    with _stats_lock:
+        _stats["local" if decision is not None else "escalated"] += 1
+    if decision is None:
+        return None
+    label, confidence = decision
+    logger.info(f"Triaged email {email['id']} as `{label}` locally ({confidence:.2f})")
+    return RespondTo(
+        logic=f"Classified locally with confidence {confidence:.2f}", response=label
+    )
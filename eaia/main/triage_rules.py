@@ -0,0 +1,162 @@
+"""Rule-based triage, deciding obvious emails without calling the model.
+
+Rules come from `triage_rules` in the config, and are checked in order. Each rule
+has a `response` (`no` or `notify`), an optional `name`, and conditions. Every
+condition a rule lists must match:
+
+- `headers`: any of these headers is present (e.g. `List-Unsubscribe`). Given as a
+  mapping, the header's value must also match the regex it maps to.
+- `senders`: the sender's address is one of these, `*` matching anything (e.g. `no-reply@*`)
+- `domains`: the sender's domain is one of these, or a subdomain of one
+- `subject`: regex found in the subject
+- `content`: regex found in the body
+
+Senders whose address is spelled out in `triage_no` are also triaged `no`.
+"""
+
+import fnmatch
+import json
+import logging
+import re
+import threading
+from collections import Counter
+from email.utils import parseaddr
+
+from eaia.schemas import EmailData, RespondTo
+
+logger = logging.getLogger(__name__)
+
+_ADDRESS = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_CONDITIONS = {"headers", "senders", "domains", "subject", "content"}
+
+
+class _Rule:
+    __slots__ = ("name", "response", "headers", "senders", "domains", "subject", "content")
+
+    def __init__(self, name: str, spec: dict):
+        unknown = set(spec) - _CONDITIONS - {"name", "response"}
+        if unknown:
+            raise ValueError(f"Unknown conditions in triage rule `{name}`: {unknown}")
+        response = spec.get("response")
+        # YAML reads an unquoted `no` as false
+        if response is False:
+            response = "no"
+        if response not in ("no", "notify"):
+            raise ValueError(f"Triage rule `{name}` must respond `no` or `notify`")
+        self.name = name
+        self.response = response
+        headers = spec.get("headers")
+        if isinstance(headers, list):
+            headers = dict.fromkeys(headers)
+        self.headers = (
+            {
+                header.lower(): re.compile(pattern) if pattern else None
+                for header, pattern in headers.items()
+            }
+            if headers
+            else None
+        )
+        self.senders = (
+            re.compile(
+                "|".join(fnmatch.translate(s.lower()) for s in spec["senders"])
+            )
+            if spec.get("senders")
+            else None
+        )
+        self.domains = (
+            frozenset(d.lower().lstrip("@") for d in spec["domains"])
+            if spec.get("domains")
+            else None
+        )
+        self.subject = re.compile(spec["subject"]) if spec.get("subject") else None
+        self.content = re.compile(spec["content"]) if spec.get("content") else None
+
+    def matches(self, email: EmailData, headers: dict, sender: str, domains) -> bool:
+        if self.headers is not None and not any(
+            name in headers and (pattern is None or pattern.search(headers[name]))
+            for name, pattern in self.headers.items()
+        ):
+            return False
+        if self.senders is not None and not self.senders.match(sender):
+            return False
+        if self.domains is not None and self.domains.isdisjoint(domains):
+            return False
+        if self.subject is not None and not self.subject.search(email["subject"]):
+            return False
+        if self.content is not None and not self.content.search(
+            email.get("page_content") or ""
+        ):
+            return False
+        return True
+
+
+class TriageRules:
+    """Triage rules compiled from a config."""
+
+    def __init__(self, config: dict):
+        self.rules = [
+            _Rule(spec.get("name") or f"rule {i}", spec)
+            for i, spec in enumerate(config.get("triage_rules") or [])
+        ]
+        self.no_senders = frozenset(
+            address.lower() for address in _ADDRESS.findall(config.get("triage_no") or "")
+        )
+
+    def match(self, email: EmailData) -> tuple[str, str] | None:
+        """Name and response of the first rule `email` matches, if any."""
+        headers = email.get("headers") or {}
+        # The original sender, as `from_email` may be the Reply-To address
+        sender = parseaddr(headers.get("from") or email["from_email"])[1].lower()
+        labels = sender.rpartition("@")[2].split(".")
+        domains = {".".join(labels[i:]) for i in range(len(labels))}
+        for rule in self.rules:
+            if rule.matches(email, headers, sender, domains):
+                return rule.name, rule.response
+        if sender in self.no_senders:
+            return "triage_no", "no"
+        return None
+
+
+_compiled: dict[str, TriageRules] = {}
+_stats_lock = threading.Lock()
+_evaluated = 0
+_hits: Counter = Counter()
+
+
+def get_triage_rules(config: dict) -> TriageRules:
+    """Rules for a config, compiled once per distinct set of rules."""
+    key = json.dumps(
+        [config.get("triage_rules"), config.get("triage_no")], sort_keys=True, default=str
+    )
+    rules = _compiled.get(key)
+    if rules is None:
+        rules = _compiled[key] = TriageRules(config)
+    return rules
+
+
+def match_triage_rules(email: EmailData, config: dict) -> RespondTo | None:
+    """Triage `email` by the config's rules, or None if no rule matches."""
+    global _evaluated
+    match = get_triage_rules(config).match(email)
+    with _stats_lock:
+        _evaluated += 1
+        if match is not None:
+            _hits[match[0]] += 1
+    if match is None:
+        return None
+    name, response = match
+    logger.info(f"Triaged email {email['id']} as `{response}` by rule `{name}`")
+    return RespondTo(logic=f"Matched triage rule `{name}`", response=response)
+
+
+def triage_rule_stats() -> dict:
+    """How many emails were checked against rules, and how many each rule decided.
+
+    Every hit is a model call avoided.
+    """
+    with _stats_lock:
+        return {
+            "evaluated": _evaluated,
+            "hits": dict(_hits),
+            "model_calls_avoided": sum(_hits.values()),
+        }
@@ -0,0 +1,110 @@
+"""Shared chat model clients.
+
+Building a chat model per node call also builds a new HTTP client, so every call
+pays for a new connection and TLS handshake. `get_chat_model` instead hands out
+one long-lived client per provider, model and settings, and models of the same
+provider and name share a connection pool. Calls to each model are limited to
+`EAIA_MODEL_CONCURRENCY` (default 16) at once per process, so a burst of runs
+waits for a free connection rather than opening hundreds of sockets.
+"""
+
+import asyncio
+import json
+import os
+import weakref
+
+import httpx
+from langchain_anthropic import ChatAnthropic
+from langchain_core.language_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+DEFAULT_CONCURRENCY = 16
+
+
+def _concurrency() -> int:
+    return int(os.getenv("EAIA_MODEL_CONCURRENCY") or DEFAULT_CONCURRENCY)
+
+
+class _Pool:
+    """Clients, semaphores and HTTP connections of one event loop."""
+
+    def __init__(self):
+        self.models: dict[tuple, BaseChatModel] = {}
+        self.semaphores: dict[tuple[str, str], asyncio.Semaphore] = {}
+        self.http_clients: dict[tuple[str, str], httpx.AsyncClient] = {}
+
+    def semaphore(self, provider: str, model: str) -> asyncio.Semaphore:
+        key = (provider, model)
+        if key not in self.semaphores:
+            self.semaphores[key] = asyncio.Semaphore(_concurrency())
+        return self.semaphores[key]
+
+    def http_client(self, provider: str, model: str) -> httpx.AsyncClient:
+        key = (provider, model)
+        if key not in self.http_clients:
+            limit = _concurrency()
+            self.http_clients[key] = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+                timeout=httpx.Timeout(600.0, connect=5.0),
+            )
+        return self.http_clients[key]
+
+
+# HTTP connections and asyncio primitives belong to the loop they were made in
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Pool]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _pool() -> _Pool:
+    loop = asyncio.get_running_loop()
+    if loop not in _pools:
+        _pools[loop] = _Pool()
+    return _pools[loop]
+
+
+class _PooledChatOpenAI(ChatOpenAI):
+    async def _agenerate(self, *args, **kwargs):
+        async with _pool().semaphore("openai", self.model_name):
+            return await super()._agenerate(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        async with _pool().semaphore("openai", self.model_name):
+            async for chunk in super()._astream(*args, **kwargs):
+                yield chunk
+
+
+class _PooledChatAnthropic(ChatAnthropic):
+    async def _agenerate(self, *args, **kwargs):
+        async with _pool().semaphore("anthropic", self.model):
+            return await super()._agenerate(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        async with _pool().semaphore("anthropic", self.model):
+            async for chunk in super()._astream(*args, **kwargs):
+                yield chunk
+
+
+def get_chat_model(provider: str, model: str, **settings) -> BaseChatModel:
+    """Shared client for `model` of `provider` ("openai" or "anthropic").
+
+    Must be called from async code, as clients are tied to the running event loop.
+
+    Args:
+        settings: Other arguments of `ChatOpenAI` or `ChatAnthropic`, e.g. `temperature`
+    """
+    pool = _pool()
+    key = (provider, model, json.dumps(settings, sort_keys=True, default=str))
+    if key not in pool.models:
+        if provider == "openai":
+            pool.models[key] = _PooledChatOpenAI(
+                model=model,
+                http_async_client=pool.http_client(provider, model),
+                **settings,
+            )
+        elif provider == "anthropic":
+            # Anthropic clients already share a process-wide HTTP client
+            pool.models[key] = _PooledChatAnthropic(model=model, **settings)
+        else:
+            raise ValueError(f"Unknown model provider: {provider}")
+    return pool.models[key]
@@ -1,10 +1,11 @@
 from langgraph.store.base import BaseStore
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
 from typing import TypedDict, Optional
 from langgraph.graph import StateGraph, START, END, MessagesState
 from langgraph.types import Command, Send
 
+from eaia.main.preferences import put_preference
+from eaia.models import get_chat_model
+
 TONE_INSTRUCTIONS = "Only update the prompt to include instructions on the **style and tone and format** of the response. Do NOT update the prompt to include anything about the actual content - only the style and tone and format. The user sometimes responds differently to different types of people - take that into account, but don't be too specific."
 RESPONSE_INSTRUCTIONS = "Only update the prompt to include instructions on the **content** of the response. Do NOT update the prompt to include anything about the tone or style or format of the response."
 SCHEDULE_INSTRUCTIONS = "Only update the prompt to include instructions on how to send calendar invites - eg when to send them, what title should be, length, time of day, etc"
@@ -62,8 +63,8 @@ You should return the full prompt, so if there's anything from before that you w
 
 
 async def update_general(state: ReflectionState, config, store: BaseStore):
-    reflection_model = ChatOpenAI(model="o1", disable_streaming=True)
-    # reflection_model = ChatAnthropic(model="claude-3-5-sonnet-latest")
+    reflection_model = get_chat_model("openai", "o1", disable_streaming=True)
+    # reflection_model = get_chat_model("anthropic", "claude-3-5-sonnet-latest")
     namespace = (state["assistant_key"],)
     key = state["prompt_key"]
     result = await store.aget(namespace, key)
@@ -88,9 +89,7 @@ async def update_general(state: ReflectionState, config, store: BaseStore):
         state["instructions"],
     )
     if output["update_prompt"]:
-        await store.aput(
-            namespace, key, {"data": output["new_prompt"]}, index=False
-        )
+        await put_preference(state["assistant_key"], key, output["new_prompt"], store)
 
 
 
@@ -148,8 +147,7 @@ class MultiMemoryInput(MessagesState):
 
 
 async def determine_what_to_update(state: MultiMemoryInput):
-    reflection_model = ChatOpenAI(model="gpt-4o", disable_streaming=True)
-    reflection_model = ChatAnthropic(model="claude-3-5-sonnet-latest")
+    reflection_model = get_chat_model("anthropic", "claude-3-5-sonnet-latest")
     trajectory = get_trajectory_clean(state["messages"])
     types_of_prompts = "\n".join(
         [f"`{p_type}`: {MEMORY_TO_UPDATE[p_type]}" for p_type in state["prompt_types"]]
@@ -163,7 +161,9 @@ async def determine_what_to_update(state: MultiMemoryInput):
     class MemoryToUpdate(TypedDict):
         memory_types_to_update: list[str]
 
-    response = reflection_model.with_structured_output(MemoryToUpdate).invoke(prompt)
+    response = await reflection_model.with_structured_output(MemoryToUpdate).ainvoke(
+        prompt
+    )
     sends = []
     for t in response["memory_types_to_update"]:
         _state = {
@@ -0,0 +1,318 @@
+"""Poll many mailboxes from one deployment, sharded across cron jobs.
+
+Mailboxes are registered in the store under `MAILBOX_NAMESPACE`, keyed by email
+address, with the same values as `eaia/main/config.yaml`. Each one gets its own
+`main` assistant, so what the graph learns and stores under the assistant id
+(preferences, triage examples, the triage cache and classifier) is kept per
+mailbox. Each cron job polls the mailboxes in its shard. Within a shard, the most lagging mailboxes are polled
+first, and a per-mailbox token bucket caps how many emails each one dispatches,
+so one huge inbox can't starve the rest. Whatever a mailbox couldn't dispatch is
+picked up on its next poll.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+
+from langgraph.store.base import BaseStore
+from langgraph_sdk.client import LangGraphClient
+
+from eaia.gmail import fetch_group_emails, get_history_id, mark_as_read
+from eaia.ingest import DEFAULT_CONCURRENCY, DEFAULT_TRIAGE_BATCH_SIZE, dispatch_emails
+from eaia.main.triage import triage_emails
+from eaia.schemas import EmailData
+from eaia.store_utils import search_all
+
+logger = logging.getLogger(__name__)
+
+MAILBOX_NAMESPACE = ("mailboxes",)
+# Per mailbox: quota tokens, when it was last caught up, and its lag
+STATUS_NAMESPACE = ("ingest_status",)
+HISTORY_NAMESPACE = ("gmail_history",)
+DEFAULT_MAILBOX_CONCURRENCY = 4
+
+
+def get_mailbox_assistant_id(email_address: str) -> str:
+    """Stable id of the mailbox's `main` assistant."""
+    digest = hashlib.md5(f"mailbox:{email_address.lower()}".encode("UTF-8")).hexdigest()
+    return str(uuid.UUID(hex=digest))
+
+
+async def ensure_mailbox_assistant(client: LangGraphClient, mailbox: dict) -> str:
+    """Create the mailbox's `main` assistant if it doesn't exist yet, and return its id."""
+    assistant_id = get_mailbox_assistant_id(mailbox["email"])
+    await client.assistants.create(
+        graph_id="main",
+        config={"configurable": mailbox},
+        assistant_id=assistant_id,
+        if_exists="do_nothing",
+        name=f"main ({mailbox['email']})",
+        metadata={"mailbox": mailbox["email"]},
+    )
+    return assistant_id
+
+
+def get_shard(email_address: str, num_shards: int) -> int:
+    """Stable shard of a mailbox, so it is always polled by the same cron job."""
+    digest = hashlib.md5(email_address.lower().encode("UTF-8")).hexdigest()
+    return int(digest, 16) % num_shards
+
+
+class TokenBucket:
+    """Allows bursts of up to `capacity` emails, refilled at `rate` per second."""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated_at")
+
+    def __init__(
+        self,
+        capacity: float,
+        rate: float,
+        tokens: float | None = None,
+        updated_at: float | None = None,
+    ):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity if tokens is None else tokens
+        self.updated_at = updated_at
+
+    def refill(self, now: float):
+        if self.updated_at is not None:
+            elapsed = max(0.0, now - self.updated_at)
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def take(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+async def list_mailboxes(store: BaseStore) -> list[dict]:
+    """All registered mailbox configs."""
+    return [item.value for item in await search_all(store, MAILBOX_NAMESPACE)]
+
+
+async def ingest_mailbox(
+    client: LangGraphClient,
+    store: BaseStore,
+    email_address: str,
+    state: dict,
+    status: dict,
+    run_config: dict | None = None,
+    triage_config: dict | None = None,
+    assistant_id: str = "main",
+) -> dict:
+    """Dispatch new emails for one mailbox, within its quota.
+
+    Args:
+        client: LangGraph SDK client
+        store: Store holding checkpoints and ingest status
+        email_address: Mailbox to poll
+        state: Cron job input (see `JobKickoff`)
+        status: The mailbox's status from the previous poll
+        run_config: Config for the `main` runs, None to use the deployment's
+        triage_config: Config to triage new emails in batches with, before
+            starting runs only for those that need handling. None to let each
+            run triage its own email.
+        assistant_id: Assistant the runs are started with
+
+    Returns:
+        The mailbox's new status, as saved to the store
+    """
+    started = time.time()
+    bucket = None
+    if state.get("quota_per_hour"):
+        bucket = TokenBucket(
+            state.get("quota_burst") or state["quota_per_hour"],
+            state["quota_per_hour"] / 3600,
+            status.get("tokens"),
+            status.get("refilled_at"),
+        )
+        bucket.refill(started)
+    throttled = False
+    dispatched = 0
+
+    def admit(email: EmailData) -> bool:
+        nonlocal throttled, dispatched
+        if bucket is not None and not bucket.take():
+            throttled = True
+            return False
+        dispatched += 1
+        return True
+
+    ignored = 0
+
+    async def triage(emails: list[EmailData]):
+        nonlocal ignored
+        results = await triage_emails(emails, triage_config, store)
+        no_response = [
+            email
+            for email, result in zip(emails, results)
+            if result is not None and result.response == "no"
+        ]
+        # What the `main` graph would have done for these
+        await asyncio.gather(
+            *(mark_as_read(email["id"], email_address) for email in no_response)
+        )
+        ignored += len(no_response)
+        return results
+
+    history_id = None
+    if state.get("incremental"):
+        checkpoint = await store.aget(HISTORY_NAMESPACE, email_address)
+        if checkpoint:
+            history_id = checkpoint.value["history_id"]
+        # Read before fetching, so mail arriving mid-run is picked up next time
+        new_history_id = await get_history_id(email_address)
+    # Messages that could not be fetched this time
+    failed: list[str] = []
+
+    await dispatch_emails(
+        client,
+        fetch_group_emails(
+            email_address,
+            minutes_since=state["minutes_since"],
+            batch_size=state.get("batch_size"),
+            history_id=history_id,
+            failed=failed,
+        ),
+        concurrency=state.get("concurrency", DEFAULT_CONCURRENCY),
+        # Emails older than the ones dispatched last time may not have been, so
+        # skip over already seen emails rather than stopping at the first one
+        early=not status.get("backlog"),
+        config=run_config,
+        assistant_id=assistant_id,
+        admit=admit,
+        triage=triage if triage_config is not None else None,
+        triage_batch_size=state.get("triage_batch_size", DEFAULT_TRIAGE_BATCH_SIZE),
+    )
+
+    # Mail that was throttled or failed to fetch is fetched again next time
+    if failed:
+        logger.info(f"{email_address}: failed to fetch {len(failed)} messages")
+    behind = throttled or bool(failed)
+    # Keep the old checkpoint until the mailbox catches up
+    if state.get("incremental") and not behind:
+        await store.aput(
+            HISTORY_NAMESPACE, email_address, {"history_id": new_history_id}, index=False
+        )
+
+    finished = time.time()
+    caught_up_at = (status.get("caught_up_at") or started) if behind else started
+    new_status = {
+        "last_run": finished,
+        "caught_up_at": caught_up_at,
+        "lag_seconds": finished - caught_up_at,
+        "backlog": behind,
+        "dispatched": dispatched,
+        "ignored": ignored,
+    }
+    if bucket is not None:
+        new_status["tokens"] = bucket.tokens
+        new_status["refilled_at"] = bucket.updated_at
+    await store.aput(STATUS_NAMESPACE, email_address, new_status, index=False)
+    logger.info(
+        f"{email_address}: dispatched {dispatched} emails ({ignored} ignored), "
+        f"lag {new_status['lag_seconds']:.0f}s{' (throttled)' if throttled else ''}"
+    )
+    return new_status
+
+
+async def ingest_mailboxes(
+    client: LangGraphClient,
+    store: BaseStore,
+    state: dict,
+    mailboxes: list[tuple[str, dict | None]],
+    config: dict | None = None,
+):
+    """Poll mailboxes, most lagging first, with a few in flight at once.
+
+    A failing mailbox doesn't stop the others; the first failure is raised once
+    they are all done.
+
+    Args:
+        client: LangGraph SDK client
+        store: Store holding checkpoints and ingest status
+        state: Cron job input (see `JobKickoff`)
+        mailboxes: (email address, config for its `main` runs) pairs
+        config: Config of the cron run, used to triage emails for mailboxes without
+            a run config
+    """
+    items = await asyncio.gather(
+        *(store.aget(STATUS_NAMESPACE, email_address) for email_address, _ in mailboxes)
+    )
+    statuses = [item.value if item else {} for item in items]
+    order = sorted(
+        range(len(mailboxes)), key=lambda i: statuses[i].get("caught_up_at", 0)
+    )
+    semaphore = asyncio.Semaphore(
+        max(1, state.get("mailbox_concurrency", DEFAULT_MAILBOX_CONCURRENCY))
+    )
+    main_assistant_id = None
+    if state.get("batch_triage") and any(run_config is None for _, run_config in mailboxes):
+        # The deployment's own mailbox stores its examples under the `main`
+        # assistant, not this one
+        assistants = await client.assistants.search(
+            graph_id="main", metadata={"created_by": "system"}, limit=1
+        )
+        if assistants:
+            main_assistant_id = assistants[0]["assistant_id"]
+
+    def get_triage_config(run_config, assistant_id):
+        if not state.get("batch_triage"):
+            return None
+        configurable = dict((run_config or config or {}).get("configurable", {}))
+        if assistant_id is not None:
+            configurable["assistant_id"] = assistant_id
+        return {"configurable": configurable}
+
+    async def poll(i):
+        email_address, run_config = mailboxes[i]
+        async with semaphore:
+            try:
+                assistant_id = main_assistant_id
+                if run_config is not None:
+                    # Registered mailboxes each have their own assistant
+                    assistant_id = await ensure_mailbox_assistant(
+                        client, run_config["configurable"]
+                    )
+                return await ingest_mailbox(
+                    client,
+                    store,
+                    email_address,
+                    state,
+                    statuses[i],
+                    run_config,
+                    get_triage_config(run_config, assistant_id),
+                    assistant_id if run_config is not None else "main",
+                )
+            except Exception:
+                logger.exception(f"Failed to ingest emails for {email_address}")
+                raise
+
+    # Tasks are created in lag order, so the semaphore admits them in that order
+    results = await asyncio.gather(*(poll(i) for i in order), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def get_shard_mailboxes(
+    store: BaseStore, default_config: dict, shard: int = 0, num_shards: int = 1
+) -> list[tuple[str, dict | None]]:
+    """Mailboxes for one shard, as (email address, run config) pairs.
+
+    Without any registered mailboxes, the first shard polls the deployment's own
+    mailbox from `default_config`.
+    """
+    registry = await list_mailboxes(store)
+    if not registry:
+        return [(default_config["email"], None)] if shard == 0 else []
+    return [
+        (mailbox["email"], {"configurable": mailbox})
+        for mailbox in registry
+        if get_shard(mailbox["email"], num_shards) == shard
+    ]
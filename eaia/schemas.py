@@ -1,7 +1,7 @@
 from typing import Annotated, List, Literal
 from langgraph.graph.message import AnyMessage
 from pydantic import BaseModel, Field
-from typing_extensions import TypedDict
+from typing_extensions import NotRequired, TypedDict
 
 
 from langgraph.graph import add_messages
@@ -15,6 +15,10 @@ class EmailData(TypedDict):
     page_content: str
     send_time: str
     to_email: str
+    # Lowercased header name to value, for the headers rule-based triage looks at
+    headers: NotRequired[dict[str, str]]
+    # Body as received, when `page_content` was compacted for prompts
+    raw_content: NotRequired[str]
 
 
 class RespondTo(BaseModel):
@@ -24,6 +28,16 @@ class RespondTo(BaseModel):
     response: Literal["no", "email", "notify", "question"] = "no"
 
 
+class EmailTriage(RespondTo):
+    email: int = Field(description="Number of the email this decision is for")
+
+
+class BatchRespondTo(BaseModel):
+    """How to handle each of the emails, one decision per email."""
+
+    decisions: List[EmailTriage]
+
+
 class ResponseEmailDraft(BaseModel):
     """Draft of an email to send as a response."""
 
@@ -92,6 +106,10 @@ class State(TypedDict):
     email: EmailData
     triage: Annotated[RespondTo, convert_obj]
     messages: Annotated[List[AnyMessage], add_messages]
+    # Id of the email `triage` was decided for before the run started, if any
+    triaged_email_id: NotRequired[str]
+    # Events the pending calendar invite conflicts with, rendered for the inbox
+    invite_conflicts: NotRequired[str]
 
 
 email_template = """From: {author}
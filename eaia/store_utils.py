@@ -0,0 +1,44 @@
+"""Paging through store namespaces, from graphs (`BaseStore`) and from scripts (SDK client)."""
+
+from typing import Awaitable, Callable
+
+from langgraph.store.base import BaseStore, Item
+from langgraph_sdk.client import LangGraphClient
+
+PAGE_SIZE = 100
+
+
+async def _page_all(fetch: Callable[[int, int], Awaitable[list]], page_size: int) -> list:
+    items = []
+    while True:
+        page = await fetch(page_size, len(items))
+        items.extend(page)
+        if len(page) < page_size:
+            return items
+
+
+async def search_all(
+    store: BaseStore,
+    namespace: tuple[str, ...],
+    filter: dict | None = None,
+    page_size: int = PAGE_SIZE,
+) -> list[Item]:
+    """Every item in a store namespace, or those matching `filter`."""
+    return await _page_all(
+        lambda limit, offset: store.asearch(
+            namespace, filter=filter, limit=limit, offset=offset
+        ),
+        page_size,
+    )
+
+
+async def search_all_items(
+    client: LangGraphClient, namespace: tuple[str, ...], page_size: int = PAGE_SIZE
+) -> list[dict]:
+    """Every item in a store namespace, through the LangGraph SDK (for scripts)."""
+
+    async def fetch(limit, offset):
+        page = await client.store.search_items(list(namespace), limit=limit, offset=offset)
+        return page["items"]
+
+    return await _page_all(fetch, page_size)
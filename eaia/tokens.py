@@ -0,0 +1,19 @@
+"""Token counting for prompts and email bodies."""
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in `text` for OpenAI models, estimated if the tokenizer is unavailable."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # The tokenizer downloads its vocabulary the first time it is used
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 4
+    return len(_encoding.encode(text, disallowed_special=()))
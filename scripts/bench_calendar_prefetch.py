@@ -0,0 +1,186 @@
+"""Measure what the speculative calendar prefetch saves the meeting assistant.
+
+Runs drafting (which the prefetch overlaps, as triage starts it once it decides to
+respond) followed by `find_meeting_time` on scheduling emails against the fake
+Google server, with and without the prefetch. Model calls are scripted, taking
+`--model-ms` each: the meeting agent first asks `get_events_for_days` for the
+next business days unless its prompt already has the free times, then answers. Also reports
+how often the scheduling heuristic starts a prefetch, i.e. speculates, on the
+synthetic mailbox and on a few scheduling and other emails.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+from google.oauth2.credentials import Credentials
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+sys.path.insert(0, str(Path(__file__).parent))
+import fake_google  # noqa: E402
+
+from eaia import gmail  # noqa: E402
+from eaia.main import calendar_prefetch, find_meeting_time  # noqa: E402
+
+USER_EMAIL = "me@example.com"
+SCHEDULING_EMAILS = [
+    ("Quick sync next week?", "Hi, do you have 30 minutes next week to chat about the launch?"),
+    ("Intro call", "Would love to find a time to meet. Are you free Tuesday or Wednesday afternoon?"),
+    ("Re: partnership", "Could we schedule a call this week? Let me know your availability."),
+    ("Coffee", "Are you around for coffee on Thursday at 10am or Friday at 2pm?"),
+]
+OTHER_EMAILS = [
+    ("Your invoice is ready", "Your monthly invoice for September is attached."),
+    ("Re: docs PR", "Thanks, I pushed the fixes. Can you take another look when you get a chance?"),
+    ("Q3 numbers", "Attached are the Q3 numbers we discussed. Revenue is up 20%."),
+    ("Offsite recap", "Great seeing everyone on Friday! Photos are in the shared folder."),
+]
+
+
+class ScriptedMeetingModel(BaseChatModel):
+    """Stands in for the meeting agent's model, taking `delay` seconds per call."""
+
+    delay: float
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        has_events = "free times during working hours" in messages[0].content or any(
+            message.type == "tool" for message in messages
+        )
+        if has_events:
+            message = AIMessage(content="Harrison is free Tuesday 1pm-3pm")
+        else:
+            days = calendar_prefetch.business_days(date.today(), 5)
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": "get_events_for_days",
+                        "args": {"date_strs": [day.strftime("%d-%m-%Y") for day in days]},
+                        "id": f"call_{self.calls}",
+                    }
+                ],
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+async def _fake_credentials(user_email, langsmith_api_key=None):
+    return Credentials(token="fake-token")
+
+
+def _email(i: int, subject: str, body: str) -> dict:
+    return {
+        "id": f"s{i}",
+        "thread_id": f"st{i}",
+        "from_email": "Someone <someone@example.com>",
+        "to_email": USER_EMAIL,
+        "subject": subject,
+        "page_content": body,
+        "send_time": "",
+    }
+
+
+async def run_email(
+    email: dict, config: dict, model: ScriptedMeetingModel, fake, prefetch: bool
+) -> tuple[float, int]:
+    """Drafting (one model call) then the meeting assistant.
+
+    Returns:
+        The assistant's latency and Google round trips
+    """
+    if prefetch:
+        calendar_prefetch.start_calendar_prefetch(email, config)
+    await asyncio.sleep(model.delay)
+    state = {
+        "email": email,
+        "messages": [
+            AIMessage(
+                content="",
+                tool_calls=[{"name": "MeetingAssistant", "args": {"call": True}, "id": "route"}],
+            )
+        ],
+    }
+    round_trips = fake.round_trips
+    start = time.perf_counter()
+    await find_meeting_time.find_meeting_time(state, config)
+    return time.perf_counter() - start, fake.round_trips - round_trips
+
+
+async def main(n_messages: int, model_ms: float, latency_ms: float):
+    fake = fake_google.FakeGoogle(
+        fake_google.generate_mailbox(USER_EMAIL, n_messages),
+        USER_EMAIL,
+        events=fake_google.generate_calendar(),
+        latency=latency_ms / 1000,
+    )
+    server = fake_google.serve(fake)
+    os.environ["GOOGLE_API_ROOT"] = f"http://127.0.0.1:{server.server_port}/"
+    gmail.get_credentials = _fake_credentials
+    config = {
+        "configurable": {
+            "email": USER_EMAIL,
+            "name": "Harrison",
+            "full_name": "Harrison Chase",
+            "timezone": "PST",
+        }
+    }
+
+    emails = [
+        email
+        async for email in gmail.fetch_group_emails(USER_EMAIL, minutes_since=10**6, batch_size=50)
+        if "user_respond" not in email
+    ]
+    started = sum(calendar_prefetch.looks_like_scheduling(email) for email in emails)
+    print(f"Synthetic mailbox: prefetch started for {started} of {len(emails)} emails")
+    for name, samples in (("Scheduling", SCHEDULING_EMAILS), ("Other", OTHER_EMAILS)):
+        started = sum(
+            calendar_prefetch.looks_like_scheduling(_email(i, *pair))
+            for i, pair in enumerate(samples)
+        )
+        print(f"{name} emails: prefetch started for {started} of {len(samples)}")
+
+    model = ScriptedMeetingModel(delay=model_ms / 1000)
+    find_meeting_time.get_chat_model = lambda *args, **kwargs: model
+    print(f"Meeting assistant, model calls {model_ms:.0f}ms, Google round trips {latency_ms:.0f}ms:")
+    for prefetch in (False, True):
+        model.calls = 0
+        results = [
+            await run_email(_email(i, *pair), config, model, fake, prefetch)
+            for i, pair in enumerate(SCHEDULING_EMAILS)
+        ]
+        name = "prefetch" if prefetch else "no prefetch"
+        print(
+            f"  {name:<12} {statistics.mean(r[0] for r in results) * 1e3:>7.0f}ms per email, "
+            f"{model.calls / len(results):.1f} model calls, "
+            f"{statistics.mean(r[1] for r in results):.1f} calendar round trips"
+        )
+    print(f"Prefetch stats: {calendar_prefetch.calendar_prefetch_stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--model-ms", type=float, default=800)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.model_ms, args.latency_ms))
@@ -0,0 +1,122 @@
+"""Count the Calendar round trips of availability lookups with and without the replica.
+
+Replays `--lookups` multi-day lookups, as the meeting assistant makes them, against
+the fake Google server while the calendar changes every `--change-every` lookups.
+"Per day" is how `get_events_for_days` used to list events: one request per day,
+in sequence. "Replica" answers from the local calendar replica, which syncs the
+changes with a sync token once it is older than `--max-age` seconds. The lookups
+are spread over `--duration` simulated seconds.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from google.oauth2.credentials import Credentials
+
+sys.path.insert(0, str(Path(__file__).parent))
+import fake_google  # noqa: E402
+
+from eaia import calendar_replica, gmail  # noqa: E402
+
+USER_EMAIL = "me@example.com"
+
+
+async def _fake_credentials(user_email, langsmith_api_key=None):
+    return Credentials(token="fake-token")
+
+
+def per_day(service, days: list[date]) -> list[dict]:
+    events = []
+    for day in days:
+        events.extend(gmail._list_events(service, *gmail.day_range([day])))
+    return events
+
+
+def lookups(n: int, seed: int = 0) -> list[list[date]]:
+    rng = random.Random(seed)
+    today = datetime.now(timezone.utc).date()
+    return [
+        [today + timedelta(days=rng.randint(0, 9) + i) for i in range(rng.randint(1, 5))]
+        for _ in range(n)
+    ]
+
+
+def change(fake: fake_google.FakeGoogle, rng: random.Random):
+    start = datetime.now(timezone.utc) + timedelta(days=rng.randint(0, 9), hours=rng.randint(9, 16))
+    fake.put_event(
+        {
+            "id": uuid.uuid4().hex,
+            "status": "confirmed",
+            "summary": "New meeting",
+            "start": {"dateTime": start.isoformat()},
+            "end": {"dateTime": (start + timedelta(minutes=30)).isoformat()},
+        }
+    )
+
+
+async def run(fake, name: str, plan, change_every: int, step: float, max_age: float):
+    rng = random.Random(1)
+    # Simulated wall clock, which the replica compares its last sync against
+    wall_time = time.time
+    clock = [wall_time()]
+    time.time = lambda: clock[0]
+    calendar_replica._replicas.clear()
+    fake.reset_stats()
+    start = time.perf_counter()
+    try:
+        for i, days in enumerate(plan):
+            if change_every and i % change_every == 0:
+                change(fake, rng)
+            clock[0] += step
+            if name == "per day":
+                await gmail.run_with_service(
+                    "calendar", "v3", USER_EMAIL, lambda s: per_day(s, days)
+                )
+            else:
+                calendar_replica.get_calendar_replica(USER_EMAIL).max_age = max_age
+                await gmail.get_calendar_events(USER_EMAIL, *gmail.day_range(days))
+    finally:
+        time.time = wall_time
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {name:<8} {fake.round_trips:>5} round trips, "
+        f"{fake.round_trips / len(plan):.2f} per lookup, {elapsed / len(plan) * 1e3:.1f}ms per lookup"
+    )
+
+
+async def main(n_lookups: int, change_every: int, duration: float, max_age: float, latency_ms: float):
+    fake = fake_google.FakeGoogle(
+        {}, USER_EMAIL, events=fake_google.generate_calendar(), latency=latency_ms / 1000
+    )
+    server = fake_google.serve(fake)
+    os.environ["GOOGLE_API_ROOT"] = f"http://127.0.0.1:{server.server_port}/"
+    os.environ["EAIA_CALENDAR_REPLICA_PATH"] = tempfile.mkdtemp()
+    gmail.get_credentials = _fake_credentials
+    plan = lookups(n_lookups)
+    print(
+        f"{n_lookups} lookups of 1-5 days over {duration:.0f}s, a change every {change_every} "
+        f"lookups, {latency_ms:.0f}ms per round trip, replica max age {max_age:.0f}s:"
+    )
+    for name in ("per day", "replica"):
+        await run(fake, name, plan, change_every, duration / n_lookups, max_age)
+    print(f"Replica stats: {calendar_replica.calendar_replica_stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--change-every", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=3600, help="Simulated seconds")
+    parser.add_argument("--max-age", type=float, default=calendar_replica.DEFAULT_MAX_AGE)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.lookups, args.change_every, args.duration, args.max_age, args.latency_ms))
@@ -0,0 +1,135 @@
+"""Measure how much body compaction shrinks prompts, on synthetic long threads.
+
+Every thread is a reply chain where each message quotes the whole previous one,
+with signatures, mobile signatures, legal footers and tracking links, like long
+threads in a real inbox. `--llm N` also times triage model calls on the last
+message of N threads, with raw and compacted bodies (needs `OPENAI_API_KEY`).
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from eaia.compaction import DEFAULT_BODY_TOKENS, compact_body
+from eaia.tokens import count_tokens
+
+_SIGNATURES = [
+    "--\n{name}\nVP Engineering | Example Corp\n+1 555 0100 | example.com",
+    "Best,\n{name}\n\nSent from my iPhone",
+    "Thanks,\n{name}\n________________________________",
+]
+_FOOTER = (
+    "CONFIDENTIALITY NOTICE: This email and any attachments are confidential and "
+    "intended solely for the use of the addressee. If you are not the intended "
+    "recipient, please notify the sender and delete this message."
+)
+_TRACKING_LINK = (
+    "https://click.example-mail.com/ls/click?upn={token}&utm_source=crm"
+    "&utm_medium=email&utm_campaign=q3"
+)
+_WORDS = (
+    "meeting schedule proposal budget review timeline customer launch contract "
+    "draft feedback agenda quarter numbers deck intro partnership hiring"
+).split()
+
+
+def _message(rng: random.Random, name: str) -> str:
+    sentences = [
+        " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+        for _ in range(rng.randint(2, 6))
+    ]
+    link = _TRACKING_LINK.format(token="".join(rng.choices("ABCDEFGH0123456789", k=120)))
+    signature = rng.choice(_SIGNATURES).format(name=name)
+    parts = [f"Hi,\n\n{' '.join(sentences)}\n\nMore here: {link}", signature]
+    if rng.random() < 0.5:
+        parts.append(_FOOTER)
+    return "\n\n".join(parts)
+
+
+def generate_threads(n_threads: int, depth: int, seed: int = 0) -> list[str]:
+    """Body of the last message of each thread, quoting all earlier messages."""
+    rng = random.Random(seed)
+    bodies = []
+    for _ in range(n_threads):
+        body = ""
+        for i in range(rng.randint(1, depth)):
+            name = f"Person {rng.randint(0, 20)}"
+            message = _message(rng, name)
+            if body:
+                quoted = "\n".join("> " + line if line else ">" for line in body.split("\n"))
+                if rng.random() < 0.7:
+                    header = f"On Mon, Jan {i + 1}, 2025 at 9:{i:02d} AM {name} <p@example.com> wrote:"
+                else:
+                    header = (
+                        "-----Original Message-----\n"
+                        f"From: {name} <p@example.com>\nSent: Monday, January {i + 1}, 2025"
+                    )
+                message += f"\n\n{header}\n{quoted}"
+            body = message
+        bodies.append(body)
+    return bodies
+
+
+async def time_triage(bodies: list[str], n: int) -> None:
+    from langchain_openai import ChatOpenAI
+
+    from eaia.main.config import get_config
+    from eaia.main.triage import _prompt_kwargs, triage_prompt
+    from eaia.schemas import RespondTo
+
+    llm = ChatOpenAI(model="gpt-4o", temperature=0).with_structured_output(RespondTo)
+    static = _prompt_kwargs(get_config({"configurable": {}}))
+    latencies = {"raw": [], "compacted": []}
+    agreed = 0
+    for body in bodies[:n]:
+        responses = {}
+        for variant, text in (("raw", body), ("compacted", compact_body(body))):
+            prompt = triage_prompt.render(
+                static,
+                email_thread=text,
+                author="Person 1 <p@example.com>",
+                to="me@example.com",
+                subject="Re: Q3 planning",
+                fewshotexamples="",
+            )
+            start = time.perf_counter()
+            responses[variant] = (await llm.ainvoke(prompt)).response
+            latencies[variant].append(time.perf_counter() - start)
+        agreed += responses["raw"] == responses["compacted"]
+    for variant, values in latencies.items():
+        print(
+            f"Triage latency, {variant:<9}: median {statistics.median(values):.2f}s, "
+            f"mean {statistics.mean(values):.2f}s"
+        )
+    print(f"Same triage decision: {agreed} of {n}")
+
+
+def main(n_threads: int, depth: int, max_tokens: int, llm: int):
+    bodies = generate_threads(n_threads, depth)
+    start = time.perf_counter()
+    compacted = [compact_body(body, max_tokens) for body in bodies]
+    elapsed = time.perf_counter() - start
+    raw_tokens = [count_tokens(body) for body in bodies]
+    compacted_tokens = [count_tokens(body) for body in compacted]
+    print(f"{n_threads} threads of up to {depth} messages, budget {max_tokens} tokens")
+    print(
+        f"Tokens per body: raw mean {statistics.mean(raw_tokens):.0f} "
+        f"(max {max(raw_tokens)}), compacted mean {statistics.mean(compacted_tokens):.0f} "
+        f"(max {max(compacted_tokens)})"
+    )
+    print(f"Token reduction: {1 - sum(compacted_tokens) / sum(raw_tokens):.0%}")
+    print(f"Compaction: {elapsed / n_threads * 1e3:.2f}ms per body")
+    if llm:
+        asyncio.run(time_triage(bodies, llm))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=12)
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_BODY_TOKENS)
+    parser.add_argument("--llm", type=int, default=0, help="Time this many triage calls")
+    args = parser.parse_args()
+    main(args.threads, args.depth, args.max_tokens, args.llm)
@@ -0,0 +1,55 @@
+"""Micro-benchmark of config loading, as done by the nodes of one run.
+
+A run reads the config about ten times (triage, draft, rewrite, the human inbox
+handlers, send and mark-as-read nodes, calendar tools). Compares parsing
+`config.yaml` on every read, as before, with the cached loader, for configs from
+the file and from the configurable.
+"""
+
+import argparse
+import time
+
+import yaml
+
+from eaia.main.config import CONFIG_PATH, get_config
+
+READS_PER_RUN = 10
+
+
+def get_config_uncached(config: dict):
+    if "email" in config["configurable"]:
+        return config["configurable"]
+    with open(CONFIG_PATH) as stream:
+        return yaml.safe_load(stream)
+
+
+def per_run(load, config: dict, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        for _ in range(READS_PER_RUN):
+            load(config)
+    return (time.perf_counter() - start) / runs
+
+
+def main(runs: int):
+    file_config = {"configurable": {}}
+    with open(CONFIG_PATH) as stream:
+        configurable = {
+            **yaml.safe_load(stream),
+            "assistant_id": "bench",
+            "thread_id": "thread",
+            "model": "gpt-4o",
+        }
+    override_config = {"configurable": configurable}
+    print(f"Config overhead per run ({READS_PER_RUN} reads), mean of {runs} runs:")
+    for name, config in (("config.yaml", file_config), ("configurable", override_config)):
+        before = per_run(get_config_uncached, config, runs)
+        after = per_run(get_config, config, runs)
+        print(f"  {name:<12} before {before * 1e6:>9.1f}us  after {after * 1e6:>7.1f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    main(args.runs)
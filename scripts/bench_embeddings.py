@@ -0,0 +1,109 @@
+"""Count the embedding calls the store makes with and without the embedding cache.
+
+Replays a triage workload against an in-memory store indexed like the deployment:
+every email of the fake mailbox gets a few-shot search, some are triaged again
+(reruns and rolled back runs), some are saved as examples, and drafts read the
+preferences. The second pass restarts with the persisted cache, as a new worker
+would.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+from google.oauth2.credentials import Credentials
+from langgraph.store.memory import InMemoryStore
+
+sys.path.insert(0, str(Path(__file__).parent))
+import fake_google  # noqa: E402
+
+from eaia import embeddings, gmail  # noqa: E402
+from eaia.main import preferences  # noqa: E402
+from eaia.main.fewshot import few_shot_text, get_few_shot_examples  # noqa: E402
+from eaia.main.preferences import get_preferences  # noqa: E402
+
+USER_EMAIL = "me@example.com"
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+        self.texts = 0
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        return [[float(len(text) % 13), 1.0, float(len(text) % 7)] for text in texts]
+
+
+async def _fake_credentials(user_email, langsmith_api_key=None):
+    return Credentials(token="fake-token")
+
+
+async def fetch_emails(n_messages: int) -> list[dict]:
+    server = fake_google.serve(
+        fake_google.FakeGoogle(fake_google.generate_mailbox(USER_EMAIL, n_messages), USER_EMAIL)
+    )
+    os.environ["GOOGLE_API_ROOT"] = f"http://127.0.0.1:{server.server_port}/"
+    gmail.get_credentials = _fake_credentials
+    emails = [
+        email
+        async for email in gmail.fetch_group_emails(USER_EMAIL, minutes_since=10**6, batch_size=50)
+        if "user_respond" not in email
+    ]
+    server.shutdown()
+    return emails
+
+
+async def workload(emails: list[dict], embed, rerun: float, save: float, draft: float):
+    store = InMemoryStore(index={"embed": embed, "dims": 3})
+    config = {"configurable": {"assistant_id": "bench"}}
+    preferences._cache.clear()
+    rng = random.Random(0)
+    for email in emails:
+        for _ in range(2 if rng.random() < rerun else 1):
+            await get_few_shot_examples(email, store, config)
+        if rng.random() < draft:
+            await get_preferences(config, store)
+        if rng.random() < save:
+            await store.aput(
+                ("bench", "triage_examples"),
+                email["id"],
+                {"input": email, "triage": "email", "text": few_shot_text(email)},
+                index=["text"],
+            )
+
+
+async def main(n_messages: int, rerun: float, save: float, draft: float):
+    emails = await fetch_emails(n_messages)
+    print(f"{len(emails)} emails")
+
+    uncached = CountingEmbeddings()
+    await workload(emails, uncached.aembed_documents, rerun, save, draft)
+    print(f"{'no cache':<24} {uncached.calls:>6} calls {uncached.texts:>6} texts")
+
+    path = Path(tempfile.mkdtemp()) / "embeddings.sqlite"
+    for run in ("cache", "cache after restart"):
+        counting = CountingEmbeddings()
+        embeddings._embeddings = counting
+        embeddings._cache = embeddings.EmbeddingCache(path=path)
+        await workload(emails, embeddings.aembed_texts, rerun, save, draft)
+        stats = embeddings.embedding_cache_stats()
+        print(
+            f"{run:<24} {counting.calls:>6} calls {counting.texts:>6} texts "
+            f"({stats['embedding_calls_saved']} calls saved, {stats['hit_rate']:.0%} of texts cached)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=600)
+    parser.add_argument("--rerun", type=float, default=0.3, help="Fraction of emails triaged twice")
+    parser.add_argument("--save", type=float, default=0.2, help="Fraction saved as examples")
+    parser.add_argument("--draft", type=float, default=0.3, help="Fraction drafted")
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.rerun, args.save, args.draft))
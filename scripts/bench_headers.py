@@ -0,0 +1,79 @@
+"""Micro-benchmark header parsing over a synthetic corpus of large-header messages."""
+
+import argparse
+import random
+import timeit
+
+from eaia.gmail import MessageRecord, get_recipients
+
+USER_EMAIL = "me@example.com"
+
+
+def generate_corpus(n_messages: int, n_headers: int, seed: int = 0) -> list[dict]:
+    """Messages shaped like real mail: the interesting headers sit behind a long
+    tail of Received/DKIM/ARC/X- headers."""
+    rng = random.Random(seed)
+    noise = ["Received", "DKIM-Signature", "ARC-Seal", "ARC-Message-Signature", "X-Google-Smtp-Source"]
+    corpus = []
+    for i in range(n_messages):
+        headers = [
+            {"name": rng.choice(noise), "value": "x" * rng.randint(40, 400)}
+            for _ in range(n_headers)
+        ]
+        headers += [
+            {"name": "From", "value": f"Sender {i} <sender{i}@example.com>"},
+            {"name": "To", "value": f"{USER_EMAIL}, other{i}@example.com"},
+            {"name": "Cc", "value": f"cc{i}@example.com"},
+            {"name": "Subject", "value": f"Subject {i}"},
+            {"name": "Reply-To", "value": f"reply{i}@example.com"},
+            {"name": "Date", "value": "Thu, 26 Dec 2024 13:13:41 -0800"},
+            {"name": "Message-ID", "value": f"<{i}@example.com>"},
+        ]
+        rng.shuffle(headers)
+        corpus.append({"id": str(i), "threadId": str(i), "payload": {"headers": headers}})
+    return corpus
+
+
+def linear_scans(message):
+    # How gmail.py used to look headers up: one scan of the header list per lookup
+    headers = message["payload"]["headers"]
+    fields = []
+    for name in ["From", "From", "Subject", "From", "To", "Reply-To", "Date"]:
+        fields.append(next((h["value"] for h in headers if h["name"] == name), ""))
+    fields.append(next(h["value"] for h in headers if h["name"].lower() == "message-id"))
+    fields.append(next(h["value"] for h in headers if h["name"].lower() == "subject"))
+    recipients = set()
+    for header in headers:
+        if header["name"].lower() in ["to", "cc"]:
+            recipients.update(header["value"].replace(" ", "").split(","))
+        if header["name"].lower() == "from":
+            recipients.add(header["value"])
+    return fields, recipients
+
+
+def single_pass(message):
+    record = MessageRecord(message)
+    fields = [
+        record["from"],
+        record["subject"],
+        record.get("to", ""),
+        record.get("reply-to", ""),
+        record["date"],
+        record["message-id"],
+    ]
+    return fields, get_recipients(record, USER_EMAIL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--headers", type=int, default=80, help="Extra headers per message")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.messages, args.headers)
+    for name, fn in [("linear scans", linear_scans), ("single pass", single_pass)]:
+        best = min(
+            timeit.repeat(lambda: [fn(m) for m in corpus], number=1, repeat=args.repeat)
+        )
+        print(f"{name:<14} {best / args.messages * 1e6:8.2f} us/message")
@@ -0,0 +1,199 @@
+"""Ingest benchmark suite, run against the local fake Gmail/Calendar and LangGraph servers.
+
+Drives `fetch_group_emails`, `scripts/run_ingest.py`, `cron_graph.main` and the
+Gmail/Calendar actions, and reports messages/sec, Google API calls per message and
+peak Python memory (measured in a separate `tracemalloc` pass, as tracing slows
+everything down).
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from google.oauth2.credentials import Credentials
+from langgraph.store.memory import InMemoryStore
+from langgraph_sdk import get_client
+
+sys.path.insert(0, str(Path(__file__).parent))
+import fake_google  # noqa: E402
+import fake_langgraph  # noqa: E402
+import run_ingest  # noqa: E402
+
+from eaia import cron_graph, gmail  # noqa: E402
+
+USER_EMAIL = "me@example.com"
+CONFIG = {"configurable": {"email": USER_EMAIL}}
+
+
+async def _fake_credentials(user_email, langsmith_api_key=None):
+    return Credentials(token="fake-token")
+
+
+class Suite:
+    def __init__(self, n_messages: int, latency: float):
+        self.n_messages = n_messages
+        self.google = fake_google.FakeGoogle(
+            {}, USER_EMAIL, events=fake_google.generate_calendar(), latency=latency
+        )
+        self.langgraph = fake_langgraph.FakeLangGraph(latency=latency)
+        self.google_server = fake_google.serve(self.google)
+        self.langgraph_server = fake_langgraph.serve(self.langgraph)
+        self.langgraph_url = f"http://127.0.0.1:{self.langgraph_server.server_port}"
+        os.environ["GOOGLE_API_ROOT"] = f"http://127.0.0.1:{self.google_server.server_port}/"
+        gmail.get_credentials = _fake_credentials
+        cron_graph.client = get_client(url=self.langgraph_url)
+
+    def reset(self):
+        """Restore the mailbox and forget every LangGraph thread."""
+        self.google.messages = fake_google.generate_mailbox(
+            USER_EMAIL, self.n_messages, noise_headers=10
+        )
+        self.google.history_id = max(int(m["historyId"]) for m in self.google.messages.values())
+        self.google.history_floor = 0
+        self.google.reset_stats()
+        self.langgraph.threads.clear()
+        self.langgraph.runs.clear()
+        self.langgraph.reset_stats()
+
+    async def measure(self, name: str, make_coro, n_items: int, memory: bool):
+        """Time one scenario and, if `memory`, rerun it under tracemalloc."""
+        self.reset()
+        start = time.perf_counter()
+        # run_ingest.py prints every email
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            await make_coro()
+        elapsed = time.perf_counter() - start
+        round_trips, calls = self.google.round_trips, self.google.calls
+        langgraph_calls = self.langgraph.calls
+        peak = None
+        if memory:
+            self.reset()
+            tracemalloc.start()
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                await make_coro()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        print(
+            f"{name:<28} msgs/sec: {n_items / elapsed:8.1f}   "
+            f"API calls/msg: {calls / n_items:5.2f}   "
+            f"round trips/msg: {round_trips / n_items:5.2f}   "
+            f"LangGraph calls/msg: {langgraph_calls / n_items:5.2f}   "
+            + (f"peak memory: {peak / 2**20:6.1f} MiB" if peak is not None else "")
+        )
+
+
+async def main(n_messages: int, batch_size: int, concurrency: int, latency: float, memory: bool):
+    suite = Suite(n_messages, latency)
+    print(f"{n_messages} messages, {latency * 1000:.0f}ms simulated latency per request")
+
+    async def fetch(**kwargs):
+        async for _ in gmail.fetch_group_emails(USER_EMAIL, minutes_since=10**6, **kwargs):
+            pass
+
+    await suite.measure("fetch (sequential)", fetch, n_messages, memory)
+    await suite.measure(
+        f"fetch (batch_size={batch_size})",
+        lambda: fetch(batch_size=batch_size),
+        n_messages,
+        memory,
+    )
+    await suite.measure(
+        "run_ingest.py",
+        lambda: run_ingest.main(
+            url=suite.langgraph_url,
+            minutes_since=10**6,
+            email=USER_EMAIL,
+            batch_size=batch_size,
+            concurrency=concurrency,
+        ),
+        n_messages,
+        memory,
+    )
+    await suite.measure(
+        "cron_graph.main",
+        lambda: cron_graph.main(
+            {"minutes_since": 10**6, "batch_size": batch_size, "concurrency": concurrency},
+            CONFIG,
+            InMemoryStore(),
+        ),
+        n_messages,
+        memory,
+    )
+
+    async def incremental_tick():
+        # Checkpoint the current mailbox, then ingest the mail that arrives after it
+        store = InMemoryStore()
+        state = {"minutes_since": 10**6, "batch_size": batch_size, "incremental": True}
+        await store.aput(
+            ("gmail_history",),
+            USER_EMAIL,
+            {"history_id": await gmail.get_history_id(USER_EMAIL)},
+            index=False,
+        )
+        new = fake_google.generate_mailbox(USER_EMAIL, n_new, seed=1)
+        for i, message in enumerate(new.values()):
+            suite.google.add_message({**message, "id": f"new{i:06d}", "threadId": f"new{i:06d}"})
+        suite.google.reset_stats()
+        await cron_graph.main(state, CONFIG, store)
+
+    n_new = max(1, n_messages // 30)
+    await suite.measure(f"cron tick ({n_new} new)", incremental_tick, n_new, memory)
+
+    message_ids = list(suite.google.messages)[: min(20, n_messages)]
+    today = datetime.now()
+
+    async def actions():
+        for message_id in message_ids:
+            await gmail.mark_as_read(message_id, USER_EMAIL)
+            await gmail.send_email(message_id, "Sounds good.", USER_EMAIL)
+            await gmail.get_events_for_days.ainvoke(
+                {"date_strs": [today.strftime("%d-%m-%Y")]}, config=CONFIG
+            )
+            start = today.replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+            await gmail.send_calendar_invite(
+                ["sender0@example.com"],
+                "Sync",
+                start.isoformat(),
+                (start + timedelta(minutes=30)).isoformat(),
+                USER_EMAIL,
+            )
+
+    await suite.measure("actions (read/send/cal)", actions, len(message_ids), memory)
+
+    suite.google_server.shutdown()
+    suite.langgraph_server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0,
+        help="Simulated network latency added to every request to the fake servers.",
+    )
+    parser.add_argument(
+        "--memory",
+        type=int,
+        default=1,
+        help="Whether to rerun each scenario under tracemalloc to report peak memory.",
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.messages,
+            args.batch_size,
+            args.concurrency,
+            args.latency_ms / 1000,
+            bool(args.memory),
+        )
+    )
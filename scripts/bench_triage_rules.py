@@ -0,0 +1,70 @@
+"""Measure how many emails the triage rules in config.yaml decide without the model.
+
+Emails are fetched from the local fake Gmail server's synthetic mailbox.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from google.oauth2.credentials import Credentials
+
+sys.path.insert(0, str(Path(__file__).parent))
+import fake_google  # noqa: E402
+
+from eaia import gmail  # noqa: E402
+from eaia.main.config import get_config  # noqa: E402
+from eaia.main.triage_rules import get_triage_rules, match_triage_rules, triage_rule_stats  # noqa: E402
+
+USER_EMAIL = "me@example.com"
+
+
+async def _fake_credentials(user_email, langsmith_api_key=None):
+    return Credentials(token="fake-token")
+
+
+async def main(n_messages: int, repeat: int):
+    server = fake_google.serve(
+        fake_google.FakeGoogle(fake_google.generate_mailbox(USER_EMAIL, n_messages), USER_EMAIL)
+    )
+    os.environ["GOOGLE_API_ROOT"] = f"http://127.0.0.1:{server.server_port}/"
+    gmail.get_credentials = _fake_credentials
+    emails = [
+        email
+        async for email in gmail.fetch_group_emails(USER_EMAIL, minutes_since=10**6, batch_size=50)
+        if "user_respond" not in email
+    ]
+    server.shutdown()
+
+    config = get_config({"configurable": {}})
+    start = time.perf_counter()
+    get_triage_rules(config)
+    print(f"Compiled rules in {(time.perf_counter() - start) * 1e6:.0f}us")
+    for email in emails:
+        match_triage_rules(email, config)
+    stats = triage_rule_stats()
+    print(
+        f"{stats['model_calls_avoided']} of {len(emails)} emails decided by rules "
+        f"({stats['model_calls_avoided'] / len(emails):.0%} of model calls avoided)"
+    )
+    for name, hits in sorted(stats["hits"].items(), key=lambda x: -x[1]):
+        print(f"  {name:<28} {hits}")
+
+    rules = get_triage_rules(config)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for email in emails:
+            rules.match(email)
+    elapsed = time.perf_counter() - start
+    print(f"Matching: {elapsed / (repeat * len(emails)) * 1e6:.1f}us per email")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.repeat))
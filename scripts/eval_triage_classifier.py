@@ -0,0 +1,181 @@
+"""Offline evaluation of the local triage classifier.
+
+Replays an assistant's `triage_examples` in the order they were saved, the way the
+classifier learns in production: each example is first decided by the classifier
+as it stands (`TriageClassifier.decide`, with the same example count, per-label and
+calibration checks), then learned from (`TriageClassifier.learn`). For each
+confidence threshold, reports the fraction of model calls the classifier would
+have avoided, and how often its local decisions agreed with the saved triage label.
+
+`--llm N` also triages the last N locally decided examples with the model, and
+reports how often the classifier agreed with it.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+from google.oauth2.credentials import Credentials
+from langgraph.store.memory import InMemoryStore
+from langgraph_sdk import get_client
+
+sys.path.insert(0, str(Path(__file__).parent))
+import fake_google  # noqa: E402
+
+from eaia import gmail  # noqa: E402
+from eaia.main.config import get_config  # noqa: E402
+from eaia.main.triage import triage_input  # noqa: E402
+from eaia.main.triage_classifier import TriageClassifier, featurize  # noqa: E402
+from eaia.main.triage_rules import get_triage_rules  # noqa: E402
+from eaia.store_utils import search_all_items  # noqa: E402
+
+USER_EMAIL = "me@example.com"
+THRESHOLDS = [0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+
+async def deployment_examples(url: Optional[str], assistant_id: str) -> list[dict]:
+    client = get_client(url=url or "http://127.0.0.1:2024")
+    items = await search_all_items(client, (assistant_id, "triage_examples"))
+    return [item["value"] for item in sorted(items, key=lambda x: x["created_at"])]
+
+
+async def _fake_credentials(user_email, langsmith_api_key=None):
+    return Credentials(token="fake-token")
+
+
+async def synthetic_examples(n_messages: int) -> list[dict]:
+    """Examples from the fake Gmail mailbox, labeled by the config's triage rules.
+
+    Only exercises the classifier: the labels are much more regular than real ones.
+    """
+    server = fake_google.serve(
+        fake_google.FakeGoogle(fake_google.generate_mailbox(USER_EMAIL, n_messages), USER_EMAIL)
+    )
+    os.environ["GOOGLE_API_ROOT"] = f"http://127.0.0.1:{server.server_port}/"
+    gmail.get_credentials = _fake_credentials
+    emails = [
+        email
+        async for email in gmail.fetch_group_emails(USER_EMAIL, minutes_since=10**6, batch_size=50)
+        if "user_respond" not in email
+    ]
+    server.shutdown()
+    rules = get_triage_rules(get_config({"configurable": {}}))
+    examples = []
+    for email in emails:
+        match = rules.match(email)
+        examples.append({"input": email, "triage": match[1] if match else "email"})
+    return examples
+
+
+def replay(
+    examples: list[dict], min_examples: int, threshold: float
+) -> list[tuple[str | None, str]]:
+    """(local decision, label) of each example after the first `min_examples`.
+
+    The decision is None where the classifier would have asked the model.
+    """
+    model = TriageClassifier()
+    decisions = []
+    for example in examples:
+        features = featurize(example["input"])
+        if model.n_examples >= min_examples:
+            decision = model.decide(features, threshold, min_examples)
+            decisions.append((decision[0] if decision else None, example["triage"]))
+        model.learn(features, example["triage"])
+    return decisions
+
+
+async def llm_agreement(
+    examples: list[dict], decisions, min_examples: int, threshold: float, n: int
+):
+    store = InMemoryStore()
+    namespace = ("default", "triage_examples")
+    for i, example in enumerate(examples):
+        store.put(namespace, str(i), example)
+    config = {
+        "configurable": {
+            **get_config({"configurable": {}}),
+            "triage_cache": "off",
+            "triage_classifier": False,
+            # Don't load the calendar for emails the model would draft a response to
+            "meeting_calendar_days": 0,
+            # Compare the classifier to the model, not to the rules
+            "triage_rules": [],
+            "triage_no": "",
+        }
+    }
+    confident = [
+        (examples[min_examples + i], decision)
+        for i, (decision, _) in enumerate(decisions)
+        if decision is not None
+    ][-n:]
+    agreed = 0
+    for example, prediction in confident:
+        state = {"email": example["input"], "messages": []}
+        response = (await triage_input(state, config, store))["triage"].response
+        agreed += response == prediction
+    if confident:
+        print(
+            f"Agreement with the model at threshold {threshold}: "
+            f"{agreed / len(confident):.1%} of {len(confident)}"
+        )
+
+
+async def main(
+    url: Optional[str],
+    assistant_id: str,
+    synthetic: int,
+    min_examples: int,
+    llm: int,
+    threshold: float,
+):
+    if synthetic:
+        examples = await synthetic_examples(synthetic)
+    else:
+        examples = await deployment_examples(url, assistant_id)
+    if len(examples) <= min_examples:
+        print(f"Need more than {min_examples} examples, have {len(examples)}")
+        return
+    print(f"{len(examples)} examples, {len(examples) - min_examples} evaluated")
+    print(f"{'threshold':>9} {'calls avoided':>14} {'agreement':>10}")
+    for t in THRESHOLDS:
+        decisions = replay(examples, min_examples, t)
+        local = [(d, label) for d, label in decisions if d is not None]
+        agreement = (
+            sum(d == label for d, label in local) / len(local) if local else float("nan")
+        )
+        print(f"{t:>9} {len(local) / len(decisions):>14.1%} {agreement:>10.1%}")
+    if llm:
+        decisions = replay(examples, min_examples, threshold)
+        await llm_agreement(examples, decisions, min_examples, threshold, llm)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default=None)
+    parser.add_argument("--assistant-id", type=str, default="default")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Evaluate on this many synthetic messages instead of a deployment's examples",
+    )
+    parser.add_argument("--min-examples", type=int, default=100)
+    parser.add_argument(
+        "--llm", type=int, default=0, help="Compare this many decisions with the model"
+    )
+    parser.add_argument("--threshold", type=float, default=0.95)
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.url,
+            args.assistant_id,
+            args.synthetic,
+            args.min_examples,
+            args.llm,
+            args.threshold,
+        )
+    )
@@ -0,0 +1,518 @@
+"""Local stand-in for the subset of the Gmail and Calendar APIs used by `eaia/gmail.py`.
+
+Implements Gmail messages list/get/send/modify, threads get, history list, profile
+and batch requests, and Calendar events list (with sync tokens)/insert. Point the Google clients at it
+by setting `GOOGLE_API_ROOT` to the server URL. Every HTTP round trip is counted,
+so benchmarks can report API traffic.
+"""
+
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from email import message_from_bytes
+from email.parser import Parser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_PAGE_SIZE = 100
+_NOISE_HEADERS = ["Received", "DKIM-Signature", "ARC-Seal", "X-Google-Smtp-Source"]
+_SIGNATURE = (
+    "\n\n--\nSender Name\nHead of Partnerships | Example Corp\n+1 555 0100\n"
+    "This email and any attachments are confidential."
+)
+
+
+def _header(name, value):
+    return {"name": name, "value": value}
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode()
+
+
+def _text_part(mime_type: str, text: str) -> dict:
+    return {"mimeType": mime_type, "body": {"data": _b64(text), "size": len(text)}}
+
+
+def _body_payload(kind: str, text: str, rng: random.Random) -> dict:
+    if kind == "html":
+        paragraphs = "".join(f"<p>{line}</p>" for line in text.split("\n"))
+        return _text_part("text/html", f"<html><body>{paragraphs}</body></html>")
+    if kind == "attachment":
+        return {
+            "mimeType": "multipart/mixed",
+            "parts": [
+                {
+                    "mimeType": "multipart/alternative",
+                    "parts": [
+                        _text_part("text/plain", text),
+                        _text_part("text/html", f"<div>{text}</div>"),
+                    ],
+                },
+                {
+                    "mimeType": "application/pdf",
+                    "filename": "deck.pdf",
+                    "body": {"attachmentId": f"att{rng.randint(0, 10**9)}", "size": 2_000_000},
+                },
+            ],
+        }
+    return _text_part("text/plain", text)
+
+
+def generate_mailbox(
+    user_email: str,
+    n_messages: int = 100,
+    messages_per_thread: int = 3,
+    seed: int = 0,
+    noise_headers: int = 0,
+) -> dict:
+    """Generate a synthetic mailbox of `n_messages` spread over reply chains.
+
+    The mix roughly follows a real inbox: replies with quoted history and
+    signatures, HTML newsletters with `List-Unsubscribe`, no-reply notifications,
+    calendar notifications and messages with attachments.
+
+    Args:
+        noise_headers: Number of transport headers (`Received`, `DKIM-Signature`, ...)
+            added to each message
+
+    Returns:
+        Mapping of message id to a Gmail `format=full` message resource.
+    """
+    rng = random.Random(seed)
+    now = int(time.time())
+    messages = {}
+    quoted = {}
+    for i in range(n_messages):
+        thread_id = f"t{i // messages_per_thread:06d}"
+        message_id = f"m{i:06d}"
+        sent = now - (n_messages - i) * 10
+        kind = rng.choices(
+            ["reply", "newsletter", "noreply", "calendar", "attachment"],
+            weights=[60, 15, 10, 5, 10],
+        )[0]
+        extra_headers = []
+        body_kind = "plain"
+        if kind == "newsletter":
+            sender = f"Weekly Digest <news@digest{rng.randint(0, 5)}.example.com>"
+            extra_headers.append(
+                _header("List-Unsubscribe", "<mailto:unsubscribe@example.com>")
+            )
+            body_kind = "html"
+        elif kind == "noreply":
+            sender = f"Notifications <no-reply@service{rng.randint(0, 5)}.example.com>"
+        elif kind == "calendar":
+            sender = "Google Calendar <calendar-notification@google.com>"
+        else:
+            sender = (
+                user_email
+                if rng.random() < 0.2
+                else f"Sender {rng.randint(0, 50)} <sender{rng.randint(0, 50)}@example.com>"
+            )
+            if kind == "attachment":
+                body_kind = "attachment"
+        text = f"Message {i} in thread {thread_id}.\n\n" + "lorem ipsum " * rng.randint(10, 90)
+        if kind in ("reply", "attachment"):
+            text += _SIGNATURE
+            if thread_id in quoted:
+                history = "\n".join("> " + line for line in quoted[thread_id].split("\n"))
+                text += (
+                    "\n\nOn Mon, Jan 6, 2025 at 9:00 AM Someone <someone@example.com> "
+                    f"wrote:\n{history}"
+                )
+            quoted[thread_id] = text
+        headers = [
+            _header(rng.choice(_NOISE_HEADERS), "x" * rng.randint(40, 300))
+            for _ in range(noise_headers)
+        ]
+        headers += [
+            _header("From", sender),
+            _header("To", user_email),
+            _header("Subject", f"Subject {thread_id}"),
+            _header("Date", time.strftime("%a, %d %b %Y %H:%M:%S +0000", time.gmtime(sent))),
+            _header("Message-ID", f"<{message_id}@example.com>"),
+        ] + extra_headers
+        messages[message_id] = {
+            "id": message_id,
+            "threadId": thread_id,
+            "historyId": str(i + 1),
+            "labelIds": ["INBOX", "UNREAD"],
+            "internalDate": str(sent * 1000),
+            "payload": {**_body_payload(body_kind, text, rng), "headers": headers},
+        }
+    return messages
+
+
+def generate_calendar(days: int = 14, events_per_day: int = 5, seed: int = 0) -> dict:
+    """Generate events over the next `days` days, within 9am-5pm UTC.
+
+    Returns:
+        Mapping of event id to a Calendar event resource.
+    """
+    rng = random.Random(seed)
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    events = {}
+    for day in range(days):
+        for _ in range(events_per_day):
+            start = today + timedelta(
+                days=day, hours=rng.randint(9, 16), minutes=rng.choice([0, 30])
+            )
+            end = start + timedelta(minutes=rng.choice([30, 60, 90]))
+            event_id = uuid.UUID(int=rng.getrandbits(128)).hex
+            events[event_id] = {
+                "id": event_id,
+                "status": "confirmed",
+                "summary": f"Meeting {event_id[:6]}",
+                "start": {"dateTime": start.isoformat()},
+                "end": {"dateTime": end.isoformat()},
+            }
+    return events
+
+
+def _parse_time(value: str) -> datetime:
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _event_bounds(event: dict) -> tuple[datetime, datetime]:
+    start = event["start"].get("dateTime") or event["start"]["date"]
+    end = event["end"].get("dateTime") or event["end"]["date"]
+    return _parse_time(start), _parse_time(end)
+
+
+class FakeGoogle:
+    """In-memory mailbox and calendar plus request counters."""
+
+    def __init__(
+        self,
+        messages: dict,
+        user_email: str = "me@example.com",
+        events: dict | None = None,
+        latency: float = 0.0,
+    ):
+        self.messages = messages
+        self.user_email = user_email
+        self.events = events if events is not None else {}
+        # Calendar change counter, and the change at which each event last changed;
+        # sync tokens are the counter value a client has seen
+        self.calendar_version = 0
+        self.event_versions = {event_id: 0 for event_id in self.events}
+        # Sync tokens older than this are rejected as expired
+        self.sync_floor = 0
+        # Seconds of simulated network latency added to every HTTP round trip
+        self.latency = latency
+        self.sent = []
+        self.history_id = max((int(m["historyId"]) for m in messages.values()), default=0)
+        # Oldest startHistoryId still served by `history.list`
+        self.history_floor = 0
+        self.round_trips = 0
+        self.calls = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    def reset_stats(self):
+        with self.lock:
+            self.round_trips = 0
+            self.calls = 0
+            self.bytes_sent = 0
+
+    def add_message(self, message: dict):
+        """Deliver a new message, as produced by `generate_mailbox`."""
+        with self.lock:
+            self.history_id += 1
+            message = {**message, "historyId": str(self.history_id)}
+            message["internalDate"] = str(int(time.time() * 1000))
+            self.messages[message["id"]] = message
+
+    def put_event(self, event: dict):
+        """Create or update a Calendar event; events with status `cancelled` are deleted."""
+        with self.lock:
+            self.calendar_version += 1
+            self.events[event["id"]] = event
+            self.event_versions[event["id"]] = self.calendar_version
+
+    def _list_events(self, query: dict):
+        if "syncToken" in query:
+            token = int(query["syncToken"][0])
+            if token < self.sync_floor:
+                return 410, {"error": {"code": 410, "message": "Sync token is no longer valid"}}
+            with self.lock:
+                items = [
+                    self.events[event_id]
+                    for event_id, version in self.event_versions.items()
+                    if version > token
+                ]
+                next_token = self.calendar_version
+            return 200, {"kind": "calendar#events", "items": items, "nextSyncToken": str(next_token)}
+        time_min = _parse_time(query["timeMin"][0]) if "timeMin" in query else None
+        time_max = _parse_time(query["timeMax"][0]) if "timeMax" in query else None
+        with self.lock:
+            items = sorted(
+                (
+                    event
+                    for event in self.events.values()
+                    if event.get("status") != "cancelled"
+                    and (time_min is None or _event_bounds(event)[1] > time_min)
+                    and (time_max is None or _event_bounds(event)[0] < time_max)
+                ),
+                key=lambda event: _event_bounds(event)[0],
+            )
+            next_token = self.calendar_version
+        return 200, {"kind": "calendar#events", "items": items, "nextSyncToken": str(next_token)}
+
+    def _threads(self):
+        threads = {}
+        for msg in self.messages.values():
+            threads.setdefault(msg["threadId"], []).append(msg)
+        return threads
+
+    @staticmethod
+    def _format(msg: dict, query: dict) -> dict:
+        """Render a message resource in the requested `format`."""
+        if query.get("format", ["full"])[0] != "metadata":
+            return msg
+        wanted = {h.lower() for h in query.get("metadataHeaders", [])}
+        return {
+            **msg,
+            "payload": {
+                "mimeType": msg["payload"]["mimeType"],
+                "headers": [
+                    h
+                    for h in msg["payload"]["headers"]
+                    if not wanted or h["name"].lower() in wanted
+                ],
+            },
+        }
+
+    def handle(self, method: str, path: str, query: dict, body: bytes):
+        """Route a single API call, returning (status, json_body)."""
+        with self.lock:
+            self.calls += 1
+        if path.startswith("/calendar/v3/"):
+            return self._handle_calendar(method, path, query, body)
+        m = re.fullmatch(r"/gmail/v1/users/[^/]+/profile", path)
+        if m and method == "GET":
+            return 200, {"emailAddress": self.user_email, "historyId": str(self.history_id)}
+        m = re.fullmatch(r"/gmail/v1/users/[^/]+/history", path)
+        if m and method == "GET":
+            return self._list_history(query)
+        m = re.fullmatch(r"/gmail/v1/users/[^/]+/messages", path)
+        if m and method == "GET":
+            return 200, self._list_messages(query)
+        m = re.fullmatch(r"/gmail/v1/users/[^/]+/messages/send", path)
+        if m and method == "POST":
+            return 200, self._send_message(json.loads(body))
+        m = re.fullmatch(r"/gmail/v1/users/[^/]+/messages/([^/]+)/modify", path)
+        if m and method == "POST":
+            return self._modify_message(m.group(1), json.loads(body))
+        m = re.fullmatch(r"/gmail/v1/users/[^/]+/messages/([^/]+)", path)
+        if m and method == "GET":
+            msg = self.messages.get(m.group(1))
+            if not msg:
+                return 404, {"error": {"code": 404}}
+            return 200, self._format(msg, query)
+        m = re.fullmatch(r"/gmail/v1/users/[^/]+/threads/([^/]+)", path)
+        if m and method == "GET":
+            messages = self._threads().get(m.group(1))
+            if not messages:
+                return 404, {"error": {"code": 404}}
+            messages = sorted(messages, key=lambda x: int(x["internalDate"]))
+            return 200, {
+                "id": m.group(1),
+                "messages": [self._format(msg, query) for msg in messages],
+            }
+        return 404, {"error": {"code": 404, "message": f"{method} {path}"}}
+
+    def _list_history(self, query: dict):
+        start = int(query["startHistoryId"][0])
+        if start < self.history_floor:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+        added = sorted(
+            (m for m in self.messages.values() if int(m["historyId"]) > start),
+            key=lambda x: int(x["historyId"]),
+        )
+        return 200, {
+            "history": [
+                {
+                    "id": m["historyId"],
+                    "messagesAdded": [
+                        {
+                            "message": {
+                                "id": m["id"],
+                                "threadId": m["threadId"],
+                                "labelIds": m["labelIds"],
+                            }
+                        }
+                    ],
+                }
+                for m in added
+            ],
+            "historyId": str(self.history_id),
+        }
+
+    def _list_messages(self, query: dict):
+        q = query.get("q", [""])[0]
+        after = re.search(r"after:(\d+)", q)
+        matching = sorted(
+            (
+                msg
+                for msg in self.messages.values()
+                if "SENT" not in msg["labelIds"]
+                and (not after or int(msg["internalDate"]) // 1000 > int(after.group(1)))
+            ),
+            key=lambda x: -int(x["internalDate"]),
+        )
+        start = int(query.get("pageToken", ["0"])[0] or 0)
+        page = matching[start : start + _PAGE_SIZE]
+        result = {
+            "messages": [{"id": m["id"], "threadId": m["threadId"]} for m in page],
+            "resultSizeEstimate": len(matching),
+        }
+        if start + _PAGE_SIZE < len(matching):
+            result["nextPageToken"] = str(start + _PAGE_SIZE)
+        return result
+
+    def _send_message(self, request: dict):
+        raw = message_from_bytes(base64.urlsafe_b64decode(request["raw"]))
+        with self.lock:
+            message_id = f"sent{len(self.sent):06d}"
+            thread_id = request.get("threadId") or message_id
+            message = {
+                "id": message_id,
+                "threadId": thread_id,
+                "historyId": str(self.history_id),
+                "labelIds": ["SENT"],
+                "internalDate": str(int(time.time() * 1000)),
+                "payload": {
+                    "mimeType": "text/plain",
+                    "headers": [
+                        _header(name, raw[name])
+                        for name in ("From", "To", "Cc", "Subject", "In-Reply-To")
+                        if raw[name]
+                    ],
+                    "body": {"data": ""},
+                },
+            }
+            self.sent.append(message)
+        return {"id": message_id, "threadId": thread_id, "labelIds": ["SENT"]}
+
+    def _modify_message(self, message_id: str, request: dict):
+        with self.lock:
+            msg = self.messages.get(message_id)
+            if not msg:
+                return 404, {"error": {"code": 404}}
+            labels = set(msg["labelIds"]) - set(request.get("removeLabelIds", []))
+            msg["labelIds"] = sorted(labels | set(request.get("addLabelIds", [])))
+        return 200, {"id": msg["id"], "threadId": msg["threadId"], "labelIds": msg["labelIds"]}
+
+    def _handle_calendar(self, method: str, path: str, query: dict, body: bytes):
+        m = re.fullmatch(r"/calendar/v3/calendars/[^/]+/events", path)
+        if m and method == "GET":
+            return self._list_events(query)
+        if m and method == "POST":
+            event = {**json.loads(body), "id": uuid.uuid4().hex, "status": "confirmed"}
+            self.put_event(event)
+            return 200, event
+        return 404, {"error": {"code": 404, "message": f"{method} {path}"}}
+
+    def handle_batch(self, content_type: str, body: bytes):
+        """Split a multipart/mixed batch into calls and build the batch response."""
+        mime = Parser().parsestr(
+            f"Content-Type: {content_type}\r\n\r\n" + body.decode("utf-8")
+        )
+        boundary = "batch_fake_google"
+        out = []
+        for part in mime.get_payload():
+            request_line, rest = part.get_payload().lstrip().split("\n", 1)
+            method, target, _ = request_line.split(" ", 2)
+            inner_body = rest.split("\r\n\r\n", 1)[1] if "\r\n\r\n" in rest else ""
+            url = urlparse(target)
+            status, payload = self.handle(
+                method, url.path, parse_qs(url.query), inner_body.encode()
+            )
+            content_id = part["Content-ID"].strip("<>")
+            out.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(out).encode("utf-8")
+
+
+def make_handler(fake: FakeGoogle):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, content_type, body: bytes):
+            with fake.lock:
+                fake.bytes_sent += len(body)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _dispatch(self, method):
+            with fake.lock:
+                fake.round_trips += 1
+            if fake.latency:
+                time.sleep(fake.latency)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            url = urlparse(self.path)
+            if url.path.startswith("/batch/"):
+                content_type, payload = fake.handle_batch(
+                    self.headers["Content-Type"], body
+                )
+                self._send(200, content_type, payload)
+                return
+            status, payload = fake.handle(method, url.path, parse_qs(url.query), body)
+            self._send(status, "application/json", json.dumps(payload).encode("utf-8"))
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+    return Handler
+
+
+def serve(fake: FakeGoogle, port: int = 0) -> ThreadingHTTPServer:
+    """Start the fake server on a background thread and return it."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fake))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--email", type=str, default="me@example.com")
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--calendar-days", type=int, default=14)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    fake = FakeGoogle(
+        generate_mailbox(args.email, args.messages),
+        args.email,
+        events=generate_calendar(args.calendar_days),
+        latency=args.latency_ms / 1000,
+    )
+    server = serve(fake, args.port)
+    print(f"Serving fake Google APIs on http://127.0.0.1:{args.port}/")
+    print(f"export GOOGLE_API_ROOT=http://127.0.0.1:{args.port}/")
+    threading.Event().wait()
@@ -0,0 +1,126 @@
+"""Local stand-in for the LangGraph API endpoints used by ingest.
+
+Lets `scripts/run_ingest.py` and `eaia/cron_graph.py` dispatch emails without a
+LangGraph server. Runs are recorded, not executed.
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class FakeLangGraph:
+    """In-memory assistants, threads and runs plus request counters."""
+
+    def __init__(self, latency: float = 0.0):
+        self.threads = {}
+        self.assistants = {}
+        self.runs = []
+        # Seconds of simulated network latency added to every request
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls = 0
+
+    def handle(self, method: str, path: str, body: dict):
+        with self.lock:
+            self.calls += 1
+            if method == "POST" and path == "/threads":
+                thread_id = body.get("thread_id") or str(uuid.uuid4())
+                if thread_id in self.threads and body.get("if_exists") != "do_nothing":
+                    return 409, {"detail": "Thread already exists"}
+                thread = self.threads.setdefault(
+                    thread_id,
+                    {"thread_id": thread_id, "metadata": body.get("metadata") or {}},
+                )
+                return 200, thread
+            if method == "POST" and path == "/assistants":
+                assistant_id = body.get("assistant_id") or str(uuid.uuid4())
+                if assistant_id in self.assistants and body.get("if_exists") != "do_nothing":
+                    return 409, {"detail": "Assistant already exists"}
+                assistant = self.assistants.setdefault(
+                    assistant_id,
+                    {
+                        "assistant_id": assistant_id,
+                        "graph_id": body.get("graph_id"),
+                        "config": body.get("config") or {},
+                        "metadata": body.get("metadata") or {},
+                    },
+                )
+                return 200, assistant
+            if method == "POST" and path == "/assistants/search":
+                graph_id = body.get("graph_id")
+                return 200, [
+                    {"assistant_id": f"{graph_id}-assistant", "graph_id": graph_id}
+                ]
+            m = re.fullmatch(r"/threads/([^/]+)", path)
+            if m:
+                thread = self.threads.get(m.group(1))
+                if thread is None:
+                    return 404, {"detail": "Thread not found"}
+                if method == "PATCH":
+                    thread["metadata"].update(body.get("metadata") or {})
+                return 200, thread
+            m = re.fullmatch(r"/threads/([^/]+)/state", path)
+            if m and method == "POST":
+                if m.group(1) not in self.threads:
+                    return 404, {"detail": "Thread not found"}
+                return 200, {"checkpoint": {"thread_id": m.group(1)}}
+            m = re.fullmatch(r"/threads/([^/]+)/runs", path)
+            if m and method == "POST":
+                run = {
+                    "run_id": str(uuid.uuid4()),
+                    "thread_id": m.group(1),
+                    "assistant_id": body.get("assistant_id"),
+                    "input": body.get("input"),
+                    "status": "pending",
+                }
+                self.runs.append(run)
+                return 200, run
+        return 404, {"detail": f"{method} {path}"}
+
+
+def make_handler(fake: FakeLangGraph):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _dispatch(self, method):
+            if fake.latency:
+                time.sleep(fake.latency)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else {}
+            status, payload = fake.handle(method, urlparse(self.path).path, body)
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def do_PATCH(self):
+            self._dispatch("PATCH")
+
+    return Handler
+
+
+def serve(fake: FakeLangGraph, port: int = 0) -> ThreadingHTTPServer:
+    """Start the fake server on a background thread and return it."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fake))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
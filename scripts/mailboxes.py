@@ -0,0 +1,91 @@
+"""Register mailboxes for the cron jobs to poll, and report how far behind each one is."""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from typing import Optional
+
+import yaml
+from langgraph_sdk import get_client
+
+from eaia.scheduler import MAILBOX_NAMESPACE, STATUS_NAMESPACE, get_shard
+from eaia.store_utils import search_all_items
+
+
+async def register(url: Optional[str], config_path: str):
+    client = get_client(url=url or "http://127.0.0.1:2024")
+    with open(config_path) as stream:
+        config = yaml.safe_load(stream)
+    await client.store.put_item(
+        list(MAILBOX_NAMESPACE), config["email"], config, index=False
+    )
+    print(f"Registered {config['email']}")
+
+
+async def remove(url: Optional[str], email: str):
+    client = get_client(url=url or "http://127.0.0.1:2024")
+    await client.store.delete_item(list(MAILBOX_NAMESPACE), email)
+    print(f"Removed {email}")
+
+
+async def status(url: Optional[str], shards: int):
+    client = get_client(url=url or "http://127.0.0.1:2024")
+    mailboxes = [item["key"] for item in await search_all_items(client, MAILBOX_NAMESPACE)]
+    statuses = {
+        item["key"]: item["value"]
+        for item in await search_all_items(client, STATUS_NAMESPACE)
+    }
+    now = time.time()
+    print(f"{'mailbox':<40} {'shard':>5} {'lag':>10} {'last run':>10} {'dispatched':>10}")
+    for email in sorted(mailboxes or statuses):
+        mailbox_status = statuses.get(email)
+        if mailbox_status is None:
+            print(f"{email:<40} {get_shard(email, shards):>5} {'never polled':>10}")
+            continue
+        # Lag keeps growing between runs until the mailbox catches up again
+        lag = now - mailbox_status["caught_up_at"]
+        last_run = now - mailbox_status["last_run"]
+        print(
+            f"{email:<40} {get_shard(email, shards):>5} {lag:>9.0f}s {last_run:>8.0f}s ago "
+            f"{mailbox_status['dispatched']:>10}"
+            + (" (throttled)" if mailbox_status["backlog"] else "")
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=None,
+        help="URL to run against",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    register_parser = subparsers.add_parser(
+        "register", help="Register a mailbox from its config file."
+    )
+    register_parser.add_argument(
+        "--config",
+        type=str,
+        default=str(Path(__file__).parent.parent / "eaia" / "main" / "config.yaml"),
+        help="Config for the mailbox, in the same format as eaia/main/config.yaml",
+    )
+    remove_parser = subparsers.add_parser("remove", help="Stop polling a mailbox.")
+    remove_parser.add_argument("email", type=str)
+    status_parser = subparsers.add_parser(
+        "status", help="Show the ingest lag of every mailbox."
+    )
+    status_parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Number of cron jobs the mailboxes are split across (see setup_cron.py)",
+    )
+
+    args = parser.parse_args()
+    if args.command == "register":
+        asyncio.run(register(args.url, args.config))
+    elif args.command == "remove":
+        asyncio.run(remove(args.url, args.email))
+    else:
+        asyncio.run(status(args.url, args.shards))
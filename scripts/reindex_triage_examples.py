@@ -0,0 +1,37 @@
+"""Re-index saved triage examples on their normalized text.
+
+Examples saved before `few_shot_text` existed are indexed on their whole value,
+so they are embedded differently from the queries that search them.
+"""
+import argparse
+import asyncio
+from typing import Optional
+
+from langgraph_sdk import get_client
+
+from eaia.main.fewshot import few_shot_text
+from eaia.store_utils import search_all_items
+
+
+async def main(url: Optional[str], assistant_id: str):
+    client = get_client(url=url or "http://127.0.0.1:2024")
+    namespace = [assistant_id, "triage_examples"]
+    updated = 0
+    for item in await search_all_items(client, namespace):
+        value = item["value"]
+        text = few_shot_text(value["input"])
+        if value.get("text") == text:
+            continue
+        await client.store.put_item(
+            namespace, item["key"], {**value, "text": text}, index=["text"]
+        )
+        updated += 1
+    print(f"Re-indexed {updated} examples")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default=None)
+    parser.add_argument("--assistant-id", type=str, default="default")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.assistant_id))
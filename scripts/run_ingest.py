@@ -3,10 +3,8 @@ import asyncio
 from typing import Optional
 from eaia.gmail import fetch_group_emails
 from eaia.main.config import get_config
+from eaia.ingest import dispatch_emails, DEFAULT_CONCURRENCY
 from langgraph_sdk import get_client
-import httpx
-import uuid
-import hashlib
 
 
 async def main(
@@ -17,6 +15,8 @@ async def main(
     early: bool = True,
     rerun: bool = False,
     email: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
 ):
     if email is None:
         email_address = get_config({"configurable": {}})["email"]
@@ -31,48 +31,22 @@ async def main(
 
     print(f"📧 Fetching emails for {email_address} from last {minutes_since} minutes...")
     
-    email_count = 0
-    async for email in fetch_group_emails(
-        email_address,
-        minutes_since=minutes_since,
-        gmail_token=gmail_token,
-        gmail_secret=gmail_secret,
-    ):
-        email_count += 1
-        print(f"📬 Email {email_count}: {email.get('subject', 'No Subject')} from {email.get('from_email', 'Unknown')}")
-        
-        thread_id = str(
-            uuid.UUID(hex=hashlib.md5(email["thread_id"].encode("UTF-8")).hexdigest())
-        )
-        try:
-            thread_info = await client.threads.get(thread_id)
-        except httpx.HTTPStatusError as e:
-            if "user_respond" in email:
-                continue
-            if e.response.status_code == 404:
-                thread_info = await client.threads.create(thread_id=thread_id)
-            else:
-                raise e
-        if "user_respond" in email:
-            await client.threads.update_state(thread_id, None, as_node="__end__")
-            continue
-        recent_email = thread_info["metadata"].get("email_id")
-        if recent_email == email["id"]:
-            if early:
-                break
-            else:
-                if rerun:
-                    pass
-                else:
-                    continue
-        await client.threads.update(thread_id, metadata={"email_id": email["id"]})
+    async def fetch():
+        email_count = 0
+        async for email in fetch_group_emails(
+            email_address,
+            minutes_since=minutes_since,
+            gmail_token=gmail_token,
+            gmail_secret=gmail_secret,
+            batch_size=batch_size,
+        ):
+            email_count += 1
+            print(f"📬 Email {email_count}: {email.get('subject', 'No Subject')} from {email.get('from_email', 'Unknown')}")
+            yield email
 
-        await client.runs.create(
-            thread_id,
-            "main",
-            input={"email": email},
-            multitask_strategy="rollback",
-        )
+    await dispatch_emails(
+        client, fetch(), concurrency=concurrency, early=early, rerun=rerun
+    )
 
 
 if __name__ == "__main__":
@@ -119,6 +93,18 @@ if __name__ == "__main__":
         default=None,
         help="The email address to use",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Fetch emails through Gmail batch requests of this many calls.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum number of LangGraph calls in flight while dispatching emails.",
+    )
 
     args = parser.parse_args()
     asyncio.run(
@@ -130,5 +116,7 @@ if __name__ == "__main__":
             early=bool(args.early),
             rerun=bool(args.rerun),
             email=args.email,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
         )
     )
@@ -8,6 +8,15 @@ from langgraph_sdk import get_client
 async def main(
     url: Optional[str] = None,
     minutes_since: int = 60,
+    batch_size: Optional[int] = None,
+    incremental: bool = False,
+    concurrency: Optional[int] = None,
+    shards: int = 1,
+    mailbox_concurrency: Optional[int] = None,
+    quota_per_hour: Optional[float] = None,
+    quota_burst: Optional[int] = None,
+    batch_triage: bool = False,
+    triage_batch_size: Optional[int] = None,
 ):
     if url is None:
         client = get_client(url="http://127.0.0.1:2024")
@@ -15,7 +24,27 @@ async def main(
         client = get_client(
             url=url
         )
-    await client.crons.create("cron", schedule="*/10 * * * *", input={"minutes_since": minutes_since})
+    cron_input = {"minutes_since": minutes_since}
+    if batch_size:
+        cron_input["batch_size"] = batch_size
+    if incremental:
+        cron_input["incremental"] = True
+    if concurrency:
+        cron_input["concurrency"] = concurrency
+    if mailbox_concurrency:
+        cron_input["mailbox_concurrency"] = mailbox_concurrency
+    if quota_per_hour:
+        cron_input["quota_per_hour"] = quota_per_hour
+    if quota_burst:
+        cron_input["quota_burst"] = quota_burst
+    if batch_triage:
+        cron_input["batch_triage"] = True
+    if triage_batch_size:
+        cron_input["triage_batch_size"] = triage_batch_size
+    # One cron job per shard of the registered mailboxes
+    for shard in range(shards):
+        shard_input = {**cron_input, "shard": shard, "num_shards": shards}
+        await client.crons.create("cron", schedule="*/10 * * * *", input=shard_input)
 
 
 
@@ -33,11 +62,75 @@ if __name__ == "__main__":
         default=60,
         help="Only process emails that are less than this many minutes old.",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Fetch emails through Gmail batch requests of this many calls.",
+    )
+    parser.add_argument(
+        "--incremental",
+        type=int,
+        default=0,
+        help="whether to only fetch emails added since the last run (falls back to --minutes-since)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Maximum number of LangGraph calls in flight while dispatching emails.",
+    )
+
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Number of cron jobs to split the registered mailboxes across.",
+    )
+    parser.add_argument(
+        "--mailbox-concurrency",
+        type=int,
+        default=None,
+        help="Maximum number of mailboxes each cron job polls at once.",
+    )
+    parser.add_argument(
+        "--quota-per-hour",
+        type=float,
+        default=None,
+        help="Maximum number of emails dispatched per mailbox per hour (unlimited by default).",
+    )
+    parser.add_argument(
+        "--quota-burst",
+        type=int,
+        default=None,
+        help="Maximum number of emails dispatched per mailbox at once (defaults to --quota-per-hour).",
+    )
+    parser.add_argument(
+        "--batch-triage",
+        type=int,
+        default=0,
+        help="whether to triage new emails in batches, and only start runs for emails that need handling",
+    )
+    parser.add_argument(
+        "--triage-batch-size",
+        type=int,
+        default=None,
+        help="Maximum number of emails triaged per model call with --batch-triage (default 10).",
+    )
 
     args = parser.parse_args()
     asyncio.run(
         main(
             url=args.url,
             minutes_since=args.minutes_since,
+            batch_size=args.batch_size,
+            incremental=bool(args.incremental),
+            concurrency=args.concurrency,
+            shards=args.shards,
+            mailbox_concurrency=args.mailbox_concurrency,
+            quota_per_hour=args.quota_per_hour,
+            quota_burst=args.quota_burst,
+            batch_triage=bool(args.batch_triage),
+            triage_batch_size=args.triage_batch_size,
         )
     )
\ No newline at end of file
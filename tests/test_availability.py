@@ -0,0 +1,84 @@
+from datetime import date, datetime, time, timedelta
+
+import pytz
+
+from eaia.gmail import CalendarEvents
+from eaia.main import availability
+from eaia.main.availability import find_conflicts, free_slots, merge_intervals
+from eaia.main.find_meeting_time import meeting_prompts
+
+TZ = pytz.timezone("America/Los_Angeles")
+DAY = date(2026, 10, 20)
+WORKING_HOURS = (time(9), time(17))
+
+
+def at(hour: int, minute: int = 0) -> datetime:
+    return TZ.localize(datetime.combine(DAY, time(hour, minute)))
+
+
+def event(start: datetime, end: datetime, **fields) -> dict:
+    return {
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": end.isoformat()},
+        **fields,
+    }
+
+
+def test_merge_intervals_joins_overlapping_and_touching():
+    assert merge_intervals([(at(11), at(12)), (at(9), at(10)), (at(10), at(10, 30))]) == [
+        (at(9), at(10, 30)),
+        (at(11), at(12)),
+    ]
+
+
+def test_free_slots_subtract_busy_events_from_working_hours():
+    events = [
+        event(at(10), at(11)),
+        event(at(10, 30), at(12)),
+        # Shorter free chunks than the minimum are dropped
+        event(at(12, 10), at(16)),
+        # Declined and free events don't block time
+        event(
+            at(9),
+            at(10),
+            attendees=[{"email": "me@example.com", "responseStatus": "declined"}],
+        ),
+        event(at(16), at(17), transparency="transparent"),
+    ]
+    slots = free_slots(
+        events, [DAY], TZ, WORKING_HOURS, timedelta(minutes=15), user_email="me@example.com"
+    )
+    assert slots == [(at(9), at(10)), (at(16), at(17))]
+
+
+def test_free_slots_start_after_now():
+    slots = free_slots([], [DAY], TZ, WORKING_HOURS, timedelta(minutes=15), now=at(13, 5))
+    assert slots == [(at(13, 15), at(17))]
+
+
+def test_all_day_events_block_the_whole_day():
+    all_day = {"start": {"date": "2026-10-20"}, "end": {"date": "2026-10-21"}}
+    assert free_slots([all_day], [DAY], TZ, WORKING_HOURS, timedelta(minutes=15)) == []
+
+
+async def test_find_conflicts_reads_naive_times_in_the_timezone(monkeypatch):
+    requested = []
+
+    async def get_calendar_events(user_email, start, end):
+        requested.append((start, end))
+        events = [event(at(10), at(11)), event(at(10), at(11), status="cancelled")]
+        return CalendarEvents(start, end, events)
+
+    monkeypatch.setattr(availability, "get_calendar_events", get_calendar_events)
+    conflicts = await find_conflicts(
+        "me@example.com", "2026-10-20T10:30:00", "2026-10-20T11:30:00", TZ
+    )
+    assert requested == [(at(10, 30), at(11, 30))]
+    assert len(conflicts) == 1
+
+
+def test_meeting_prompt_uses_the_configured_minimum_slot():
+    prefix = meeting_prompts.render_prefix(
+        name="Alice", full_name="Alice Smith", tz="PST", min_slot_minutes=30
+    )
+    assert "less than 30 minutes" in prefix
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from eaia import calendar_replica
+from eaia.calendar_replica import CalendarReplica
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def event(event_id: str, hours_from_now: int, **fields) -> dict:
+    start = NOW + timedelta(hours=hours_from_now)
+    return {
+        "id": event_id,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + timedelta(hours=1)).isoformat()},
+        **fields,
+    }
+
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeCalendar:
+    """Calendar `events.list`, answering with the queued responses in order."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        self.requests.append(params)
+        return FakeRequest(self.responses.pop(0))
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    service = FakeCalendar()
+
+    async def run_with_service(api, version, user_email, fn):
+        return fn(service)
+
+    monkeypatch.setattr(calendar_replica, "run_with_service", run_with_service)
+    return service
+
+
+async def lookup(replica: CalendarReplica) -> list[str] | None:
+    events = await replica.between(NOW, NOW + timedelta(days=2))
+    return None if events is None else [e["id"] for e in events]
+
+
+async def test_syncs_only_changes_after_the_first_sync(calendar):
+    calendar.responses = [
+        {"items": [event("a", 1), event("b", 2)], "nextSyncToken": "1"},
+        {"items": [event("a", 1, status="cancelled"), event("c", 3)], "nextSyncToken": "2"},
+    ]
+    replica = CalendarReplica("me@example.com", max_age=0)
+
+    assert await lookup(replica) == ["a", "b"]
+    assert await lookup(replica) == ["b", "c"]
+    assert "timeMin" in calendar.requests[0]
+    assert calendar.requests[1]["syncToken"] == "1"
+    assert replica.sync_token == "2"
+
+
+async def test_fresh_replica_answers_without_requests(calendar):
+    calendar.responses = [{"items": [event("a", 1)], "nextSyncToken": "1"}]
+    replica = CalendarReplica("me@example.com", max_age=60)
+
+    await lookup(replica)
+    assert await lookup(replica) == ["a"]
+    assert len(calendar.requests) == 1
+
+
+async def test_expired_sync_token_syncs_everything_again(calendar):
+    calendar.responses = [
+        {"items": [event("a", 1)], "nextSyncToken": "1"},
+        HttpError(httplib2.Response({"status": 410}), b"{}"),
+        {"items": [event("b", 2)], "nextSyncToken": "5"},
+    ]
+    replica = CalendarReplica("me@example.com", max_age=0)
+
+    await lookup(replica)
+    assert await lookup(replica) == ["b"]
+    assert replica.full_syncs == 2
+
+
+async def test_no_sync_token_leaves_lookups_to_calendar(calendar):
+    calendar.responses = [{"items": [event("a", 1)]}]
+    replica = CalendarReplica("me@example.com", max_age=0)
+
+    assert await lookup(replica) is None
+    assert await lookup(replica) is None
+    assert len(calendar.requests) == 1
+
+
+async def test_restarted_replica_only_syncs_changes(calendar, tmp_path):
+    path = tmp_path / "replica.json"
+    calendar.responses = [
+        {"items": [event("a", 1)], "nextSyncToken": "1"},
+        {"items": [], "nextSyncToken": "1"},
+    ]
+    await lookup(CalendarReplica("me@example.com", path, max_age=0))
+
+    assert await lookup(CalendarReplica("me@example.com", path, max_age=0)) == ["a"]
+    assert calendar.requests[1]["syncToken"] == "1"
+
+
+async def test_failing_to_save_does_not_fail_the_lookup(calendar, tmp_path):
+    (tmp_path / "file").write_text("")
+    calendar.responses = [{"items": [event("a", 1)], "nextSyncToken": "1"}]
+    replica = CalendarReplica("me@example.com", tmp_path / "file" / "replica.json")
+
+    assert await lookup(replica) == ["a"]
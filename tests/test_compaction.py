@@ -0,0 +1,45 @@
+from eaia.compaction import compact_body
+
+DOCS_LINK = (
+    "https://docs.google.com/document/d/1AbCdEfGhIjKlMnOpQrStUvWxYz0123456789abcdefghij/edit"
+    "?usp=sharing&tab=t.0"
+)
+
+
+def test_keeps_latest_message_mentioning_footer_keywords():
+    body = (
+        "Hey,\n\nHow do I unsubscribe my team from the LangChain newsletter? They keep getting it."
+    )
+    assert compact_body(body) == body
+
+
+def test_keeps_links_in_latest_message():
+    body = f"Notes are in {DOCS_LINK}&utm_source=newsletter\n\nThanks"
+    assert compact_body(body) == body
+
+
+def test_strips_footers_and_tracking_from_earlier_messages():
+    body = (
+        "Sounds good.\n\n"
+        "On Mon, Jan 1, 2024 at 9:00 AM Bob <bob@example.com> wrote:\n"
+        f"> Agenda: {DOCS_LINK}&utm_source=newsletter\n"
+        ">\n"
+        "> This email is confidential and intended for the recipient only."
+    )
+    assert compact_body(body) == (
+        f"Sounds good.\n\n[earlier message]\nAgenda: {DOCS_LINK}"
+    )
+
+
+def test_keeps_text_after_a_separator_in_the_middle():
+    body = (
+        "Agenda for Thursday:\n\n--\n\n"
+        + "\n".join(f"{i}. Item {i}" for i in range(1, 13))
+        + "\n\nLet me know what to add."
+    )
+    assert compact_body(body) == body
+
+
+def test_strips_signature_after_the_last_separator():
+    body = "Part one\n\n--\n\nPart two\n\n-- \nAlice\nVP Engineering, Example Inc."
+    assert compact_body(body) == "Part one\n\n--\n\nPart two"
@@ -0,0 +1,178 @@
+import asyncio
+
+import httplib2
+import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+
+from eaia import gmail
+
+
+@pytest.fixture(autouse=True)
+def clear_credentials():
+    gmail._credentials.clear()
+    gmail._credentials_refreshes.clear()
+    yield
+    gmail._credentials.clear()
+    gmail._credentials_refreshes.clear()
+
+
+def fake_authenticate(monkeypatch, tokens: list[str], delay: float = 0.05):
+    calls = []
+
+    async def authenticate(user_email, langsmith_api_key=None):
+        calls.append(user_email)
+        await asyncio.sleep(delay)
+        return Credentials(token=tokens[len(calls) - 1])
+
+    monkeypatch.setattr(gmail, "_authenticate", authenticate)
+    return calls
+
+
+async def test_cancelled_waiter_does_not_fail_the_refresh(monkeypatch):
+    calls = fake_authenticate(monkeypatch, ["token"])
+    owner = asyncio.create_task(gmail.get_credentials("me@example.com"))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(gmail.get_credentials("me@example.com"))
+    other = asyncio.create_task(gmail.get_credentials("me@example.com"))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+
+    assert (await owner).token == "token"
+    assert (await other).token == "token"
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert len(calls) == 1
+
+
+async def test_waiters_refresh_again_when_the_owner_is_cancelled(monkeypatch):
+    calls = fake_authenticate(monkeypatch, ["first", "second"])
+    owner = asyncio.create_task(gmail.get_credentials("me@example.com"))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(gmail.get_credentials("me@example.com"))
+    await asyncio.sleep(0.01)
+    owner.cancel()
+
+    assert (await waiter).token == "second"
+    assert len(calls) == 2
+
+
+async def test_rejected_credentials_are_refreshed_once(monkeypatch):
+    fake_authenticate(monkeypatch, ["old", "new"], delay=0)
+    monkeypatch.setattr(gmail, "_get_service", lambda api, version, user, creds: creds)
+    seen = []
+
+    def call(creds):
+        seen.append(creds.token)
+        if creds.token == "old":
+            raise HttpError(httplib2.Response({"status": 401}), b"{}")
+        return "ok"
+
+    assert await gmail.run_with_service("gmail", "v1", "me@example.com", call) == "ok"
+    assert seen == ["old", "new"]
+
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeGmail:
+    """Just enough of the Gmail service for `fetch_group_emails` without batching."""
+
+    def __init__(self, history: list[dict], listed: list[dict], threads: dict):
+        self.history_records = history
+        self.listed = listed
+        self.thread_results = threads
+
+    def users(self):
+        return self
+
+    def history(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def threads(self):
+        return self
+
+    def list(self, userId, startHistoryId=None, historyTypes=None, q=None, pageToken=None):
+        if startHistoryId is not None:
+            return FakeRequest({"history": self.history_records})
+        return FakeRequest({"messages": self.listed})
+
+    def get(self, userId, id, format=None, metadataHeaders=None):
+        if format == "metadata":
+            return FakeRequest(self.thread_results[id])
+        return FakeRequest({"payload": {"mimeType": "text/plain", "body": {"data": ""}}})
+
+
+def thread(message_id: str) -> dict:
+    headers = {
+        "From": "sender@example.com",
+        "To": "me@example.com",
+        "Subject": "Hello",
+        "Date": "Mon, 12 Oct 2026 10:00:00 +0000",
+    }
+    return {
+        "messages": [
+            {
+                "id": message_id,
+                "threadId": message_id,
+                "payload": {"headers": [{"name": k, "value": v} for k, v in headers.items()]},
+            }
+        ]
+    }
+
+
+def added(*message_ids: str) -> list[dict]:
+    return [
+        {"messagesAdded": [{"message": {"id": i, "threadId": i, "labelIds": ["INBOX"]}}]}
+        for i in message_ids
+    ]
+
+
+def use_service(monkeypatch, service):
+    async def run_with_service(api, version, user_email, fn):
+        return fn(service)
+
+    monkeypatch.setattr(gmail, "run_with_service", run_with_service)
+
+
+async def fetch(**kwargs) -> list[str]:
+    return [
+        email["id"]
+        async for email in gmail.fetch_group_emails("me@example.com", body_tokens=None, **kwargs)
+    ]
+
+
+async def test_history_only_keeps_messages_the_query_matches(monkeypatch):
+    # "b" was added since the checkpoint, but isn't to or from the mailbox
+    service = FakeGmail(
+        added("a", "b", "c"),
+        [{"id": "c", "threadId": "c"}, {"id": "a", "threadId": "a"}],
+        {i: thread(i) for i in "abc"},
+    )
+    use_service(monkeypatch, service)
+
+    assert await fetch(history_id="1") == ["c", "a"]
+
+
+async def test_messages_that_failed_to_fetch_are_reported(monkeypatch):
+    error = HttpError(httplib2.Response({"status": 500}), b"{}")
+    service = FakeGmail(
+        added("a", "b"),
+        [{"id": "b", "threadId": "b"}, {"id": "a", "threadId": "a"}],
+        {"a": thread("a"), "b": error},
+    )
+    use_service(monkeypatch, service)
+    failed = []
+
+    assert await fetch(history_id="1", failed=failed) == ["a"]
+    assert failed == ["b"]
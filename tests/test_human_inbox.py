@@ -0,0 +1,62 @@
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import START, StateGraph
+from langgraph.store.memory import InMemoryStore
+from langgraph.types import Command
+
+from eaia.main import human_inbox
+from eaia.schemas import State
+
+
+async def test_invite_conflicts_are_not_looked_up_again_on_resume(monkeypatch):
+    lookups = []
+
+    async def find_conflicts(user_email, start_time, end_time, tz):
+        lookups.append((start_time, end_time))
+        return [
+            {
+                "summary": "Standup",
+                "start": {"dateTime": "2026-10-20T10:00:00-07:00"},
+                "end": {"dateTime": "2026-10-20T10:30:00-07:00"},
+            }
+        ]
+
+    monkeypatch.setattr(human_inbox, "find_conflicts", find_conflicts)
+    builder = StateGraph(State)
+    builder.add_node(human_inbox.check_invite_conflicts)
+    builder.add_node(human_inbox.send_cal_invite)
+    builder.add_edge(START, "check_invite_conflicts")
+    builder.add_edge("check_invite_conflicts", "send_cal_invite")
+    graph = builder.compile(checkpointer=MemorySaver(), store=InMemoryStore())
+    config = {
+        "configurable": {"thread_id": "1", "email": "me@example.com", "memory": False}
+    }
+    invite = {
+        "id": "call",
+        "name": "SendCalendarInvite",
+        "args": {
+            "emails": ["bob@example.com"],
+            "title": "Sync",
+            "start_time": "2026-10-20T10:00:00",
+            "end_time": "2026-10-20T10:30:00",
+        },
+    }
+    state = {
+        "email": {
+            "id": "1",
+            "thread_id": "1",
+            "from_email": "bob@example.com",
+            "to_email": "me@example.com",
+            "subject": "Sync",
+            "page_content": "Can we meet?",
+            "send_time": "2026-10-19T09:00:00",
+        },
+        "messages": [AIMessage(content="", tool_calls=[invite])],
+    }
+
+    result = await graph.ainvoke(state, config)
+    [request] = result["__interrupt__"][0].value
+    assert "Standup" in request["description"]
+
+    await graph.ainvoke(Command(resume=[{"type": "accept", "args": None}]), config)
+    assert len(lookups) == 1
@@ -0,0 +1,118 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+
+from eaia.ingest import dispatch_emails, get_thread_id
+
+
+class FakeThreads:
+    def __init__(self, client):
+        self.client = client
+        self.metadata = {}
+
+    async def get(self, thread_id):
+        async with self.client.call():
+            if thread_id not in self.metadata:
+                request = httpx.Request("GET", f"http://test/threads/{thread_id}")
+                raise httpx.HTTPStatusError(
+                    "Not found", request=request, response=httpx.Response(404, request=request)
+                )
+            return {"metadata": dict(self.metadata[thread_id])}
+
+    async def create(self, thread_id):
+        async with self.client.call():
+            self.metadata[thread_id] = {}
+
+    async def update(self, thread_id, metadata):
+        async with self.client.call():
+            self.metadata[thread_id].update(metadata)
+
+    async def update_state(self, thread_id, values, as_node):
+        async with self.client.call():
+            pass
+
+
+class FakeRuns:
+    def __init__(self, client):
+        self.client = client
+        self.started = []
+
+    async def create(self, thread_id, assistant_id, input, config, multitask_strategy):
+        async with self.client.call():
+            self.started.append(input["email"]["id"])
+
+
+class FakeClient:
+    """LangGraph SDK client whose calls take a little while, counting those in flight."""
+
+    def __init__(self):
+        self.threads = FakeThreads(self)
+        self.runs = FakeRuns(self)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @asynccontextmanager
+    async def call(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.001)
+            yield
+        finally:
+            self.in_flight -= 1
+
+
+def email(email_id: str, thread_id: str | None = None) -> dict:
+    return {"id": email_id, "thread_id": thread_id or email_id}
+
+
+async def emails(*items):
+    for item in items:
+        yield item
+
+
+async def test_calls_in_flight_are_bounded():
+    client = FakeClient()
+    await dispatch_emails(client, emails(*(email(str(i)) for i in range(20))), concurrency=3)
+
+    assert sorted(client.runs.started, key=int) == [str(i) for i in range(20)]
+    assert 1 < client.max_in_flight <= 3
+
+
+async def test_emails_of_a_thread_are_handled_in_fetch_order():
+    client = FakeClient()
+    await dispatch_emails(
+        client, emails(email("new", "t"), email("other"), email("old", "t")), concurrency=4
+    )
+
+    started = [e for e in client.runs.started if e != "other"]
+    assert started == ["new", "old"]
+    assert client.threads.metadata[get_thread_id(email("x", "t"))] == {"email_id": "old"}
+
+
+async def test_stops_at_the_first_email_already_seen():
+    client = FakeClient()
+    client.threads.metadata[get_thread_id(email("seen"))] = {"email_id": "seen"}
+    await dispatch_emails(
+        client, emails(email("a"), email("seen"), email("b")), concurrency=4
+    )
+
+    assert client.runs.started == ["a"]
+
+
+async def test_admit_stops_dispatching():
+    client = FakeClient()
+    admitted = []
+
+    def admit(item):
+        if len(admitted) == 2:
+            return False
+        admitted.append(item["id"])
+        return True
+
+    await dispatch_emails(
+        client, emails(*(email(str(i)) for i in range(5))), concurrency=2, admit=admit
+    )
+
+    assert sorted(client.runs.started) == admitted == ["0", "1"]
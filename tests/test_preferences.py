@@ -0,0 +1,59 @@
+import pytest
+from langgraph.store.memory import InMemoryStore
+
+from eaia.main import preferences
+from eaia.main.config import get_config
+from eaia.main.preferences import get_preferences, put_preference
+
+CONFIG = {"configurable": {"assistant_id": "a"}}
+
+
+class CountingStore(InMemoryStore):
+    def __init__(self):
+        super().__init__()
+        self.operations = 0
+
+    async def abatch(self, ops):
+        ops = list(ops)
+        self.operations += len(ops)
+        return await super().abatch(ops)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    preferences._cache.clear()
+    yield
+    preferences._cache.clear()
+
+
+async def test_missing_docs_are_seeded_from_the_config():
+    store = CountingStore()
+
+    prefs = await get_preferences(CONFIG, store)
+
+    default = get_config(CONFIG)["schedule_preferences"]
+    assert prefs["schedule_preferences"] == default
+    item = await store.aget(("a",), "schedule_preferences")
+    assert item.value == {"data": default}
+
+
+async def test_cached_docs_only_need_the_version_marker():
+    store = CountingStore()
+    await get_preferences(CONFIG, store)
+    store.operations = 0
+
+    await get_preferences(CONFIG, store)
+
+    assert store.operations == 1
+
+
+async def test_docs_written_by_another_worker_are_reloaded():
+    store = CountingStore()
+    await get_preferences(CONFIG, store)
+    await put_preference("a", "schedule_preferences", "1 hour meetings", store)
+    # Another worker still has the old docs cached
+    preferences._cache[("a",)] = (None, {"schedule_preferences": "30 minute meetings"})
+
+    prefs = await get_preferences(CONFIG, store)
+
+    assert prefs["schedule_preferences"] == "1 hour meetings"
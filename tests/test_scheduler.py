@@ -0,0 +1,142 @@
+from langgraph.store.memory import InMemoryStore
+
+from eaia import scheduler
+from eaia.scheduler import TokenBucket, get_mailbox_assistant_id, get_shard
+
+
+def test_token_bucket_allows_bursts_then_refills():
+    bucket = TokenBucket(capacity=2, rate=0.5)
+    bucket.refill(100.0)
+    assert [bucket.take() for _ in range(3)] == [True, True, False]
+
+    bucket.refill(102.0)
+    assert bucket.take()
+    assert not bucket.take()
+
+    # Never refills past its capacity
+    bucket.refill(1000.0)
+    assert bucket.tokens == 2
+
+
+def test_token_bucket_resumes_from_saved_state():
+    bucket = TokenBucket(capacity=10, rate=1.0, tokens=0.5, updated_at=100.0)
+    bucket.refill(100.5)
+    assert bucket.take()
+    assert bucket.tokens == 0
+
+
+def test_mailboxes_get_stable_shards_and_assistants():
+    assert get_shard("Me@Example.com", 8) == get_shard("me@example.com", 8)
+    assert {get_shard(f"user{i}@example.com", 4) for i in range(100)} == {0, 1, 2, 3}
+    assert get_mailbox_assistant_id("Me@Example.com") == get_mailbox_assistant_id(
+        "me@example.com"
+    )
+    assert get_mailbox_assistant_id("me@example.com") != get_mailbox_assistant_id(
+        "you@example.com"
+    )
+
+
+async def test_shard_mailboxes_fall_back_to_the_deployment_mailbox():
+    store = InMemoryStore()
+    assert await scheduler.get_shard_mailboxes(store, {"email": "me@example.com"}) == [
+        ("me@example.com", None)
+    ]
+
+    for i in range(10):
+        mailbox = {"email": f"user{i}@example.com"}
+        await store.aput(scheduler.MAILBOX_NAMESPACE, mailbox["email"], mailbox)
+    shards = [
+        await scheduler.get_shard_mailboxes(store, {"email": "me@example.com"}, shard, 3)
+        for shard in range(3)
+    ]
+    emails = sorted(email for shard in shards for email, _ in shard)
+    assert emails == sorted(f"user{i}@example.com" for i in range(10))
+
+
+def fake_mailbox(monkeypatch, failed_ids: list[str], n_emails: int = 1):
+    async def fetch_group_emails(email_address, failed=None, **kwargs):
+        failed.extend(failed_ids)
+        for i in range(n_emails):
+            yield {"id": f"new{i}", "thread_id": f"new{i}"}
+
+    async def get_history_id(email_address):
+        return "200"
+
+    async def dispatch_emails(client, emails, **kwargs):
+        async for email in emails:
+            kwargs["admit"](email)
+
+    monkeypatch.setattr(scheduler, "fetch_group_emails", fetch_group_emails)
+    monkeypatch.setattr(scheduler, "get_history_id", get_history_id)
+    monkeypatch.setattr(scheduler, "dispatch_emails", dispatch_emails)
+
+
+async def ingest(store: InMemoryStore, **state) -> dict:
+    await store.aput(scheduler.HISTORY_NAMESPACE, "me@example.com", {"history_id": "100"})
+    state = {"minutes_since": 60, "incremental": True, **state}
+    return await scheduler.ingest_mailbox(None, store, "me@example.com", state, {})
+
+
+async def test_checkpoint_advances_when_everything_was_fetched(monkeypatch):
+    fake_mailbox(monkeypatch, [])
+    store = InMemoryStore()
+
+    status = await ingest(store)
+
+    checkpoint = await store.aget(scheduler.HISTORY_NAMESPACE, "me@example.com")
+    assert checkpoint.value["history_id"] == "200"
+    assert not status["backlog"]
+
+
+async def test_checkpoint_is_kept_when_messages_failed_to_fetch(monkeypatch):
+    fake_mailbox(monkeypatch, ["lost"])
+    store = InMemoryStore()
+
+    status = await ingest(store)
+
+    checkpoint = await store.aget(scheduler.HISTORY_NAMESPACE, "me@example.com")
+    assert checkpoint.value["history_id"] == "100"
+    # So the next run doesn't stop at the first email it already dispatched
+    assert status["backlog"]
+
+
+async def test_quota_throttles_and_keeps_the_checkpoint(monkeypatch):
+    fake_mailbox(monkeypatch, [], n_emails=5)
+    store = InMemoryStore()
+
+    status = await ingest(store, quota_per_hour=3600, quota_burst=2)
+
+    assert status["dispatched"] == 2
+    assert status["backlog"]
+    checkpoint = await store.aget(scheduler.HISTORY_NAMESPACE, "me@example.com")
+    assert checkpoint.value["history_id"] == "100"
+
+
+async def test_registered_mailboxes_dispatch_to_their_own_assistant(monkeypatch):
+    created = []
+    dispatched_to = {}
+
+    class Assistants:
+        async def create(self, graph_id, config, assistant_id, **kwargs):
+            created.append(assistant_id)
+
+    class Client:
+        assistants = Assistants()
+
+    async def ingest_mailbox(client, store, email_address, *args):
+        dispatched_to[email_address] = args[-1]
+        return {}
+
+    monkeypatch.setattr(scheduler, "ingest_mailbox", ingest_mailbox)
+    mailboxes = [
+        (email, {"configurable": {"email": email}})
+        for email in ("a@example.com", "b@example.com")
+    ]
+
+    await scheduler.ingest_mailboxes(Client(), InMemoryStore(), {}, mailboxes)
+
+    assert dispatched_to == {
+        "a@example.com": get_mailbox_assistant_id("a@example.com"),
+        "b@example.com": get_mailbox_assistant_id("b@example.com"),
+    }
+    assert sorted(created) == sorted(dispatched_to.values())
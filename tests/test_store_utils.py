@@ -0,0 +1,14 @@
+from langgraph.store.memory import InMemoryStore
+
+from eaia.store_utils import search_all
+
+
+async def test_search_all_pages_through_the_namespace():
+    store = InMemoryStore()
+    for i in range(5):
+        await store.aput(("a", "examples"), str(i), {"i": i})
+    await store.aput(("b", "examples"), "other", {"i": -1})
+
+    items = await search_all(store, ("a", "examples"), page_size=2)
+
+    assert sorted(item.value["i"] for item in items) == [0, 1, 2, 3, 4]
@@ -0,0 +1,101 @@
+import pytest
+from langchain_core.messages import AIMessage
+
+from eaia.main.tool_calls import (
+    coerce_list,
+    normalize_datetime,
+    repair_name,
+    repair_tool_calls,
+)
+from eaia.schemas import Ignore, ResponseEmailDraft, SendCalendarInvite
+
+SCHEMAS = [ResponseEmailDraft, SendCalendarInvite, Ignore]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2024-07-01T14:00:00", "2024-07-01T14:00:00"),
+        ("2024-07-01 14:00", "2024-07-01T14:00:00"),
+        ("July 1, 2024 2pm", "2024-07-01T14:00:00"),
+        ("2024-07-01T14:00:00Z", "2024-07-01T14:00:00+00:00"),
+        # Missing the date or the time: left for the model rather than guessed
+        ("Tuesday", "Tuesday"),
+        ("2pm", "2pm"),
+        ("2024-07-01", "2024-07-01"),
+        ("whenever works", "whenever works"),
+    ],
+)
+def test_normalize_datetime(value, expected):
+    assert normalize_datetime(value) == expected
+
+
+def test_coerce_list():
+    assert coerce_list('["a@example.com", "b@example.com"]') == ["a@example.com", "b@example.com"]
+    assert coerce_list("a@example.com, b@example.com") == ["a@example.com", "b@example.com"]
+    assert coerce_list("") == []
+    assert coerce_list(["a@example.com"]) == ["a@example.com"]
+
+
+def test_repair_name():
+    assert repair_name("functions.SendCalendarInvite", SCHEMAS) == "SendCalendarInvite"
+    assert repair_name("send_calendar_invite", SCHEMAS) == "SendCalendarInvite"
+    assert repair_name("Unknown", SCHEMAS) == "Unknown"
+
+
+def test_repairs_name_and_arguments():
+    message = AIMessage(
+        content="",
+        tool_calls=[
+            {
+                "name": "functions.SendCalendarInvite",
+                "args": {
+                    "emails": "bob@example.com",
+                    "title": "Sync",
+                    "start_time": "July 1, 2024 2pm",
+                    "end_time": "2024-07-01 14:30",
+                },
+                "id": "call",
+            }
+        ],
+    )
+    [tool_call] = repair_tool_calls(message, SCHEMAS).tool_calls
+    assert tool_call["name"] == "SendCalendarInvite"
+    assert tool_call["args"] == {
+        "emails": ["bob@example.com"],
+        "title": "Sync",
+        "start_time": "2024-07-01T14:00:00",
+        "end_time": "2024-07-01T14:30:00",
+    }
+
+
+def test_duplicate_calls_become_one():
+    call = {"name": "Ignore", "args": {"ignore": True}}
+    message = AIMessage(
+        content="", tool_calls=[{**call, "id": "1"}, {**call, "id": "2"}]
+    )
+    assert len(repair_tool_calls(message, SCHEMAS).tool_calls) == 1
+
+
+def test_arguments_that_failed_to_parse_are_recovered():
+    message = AIMessage(
+        content="",
+        invalid_tool_calls=[
+            {
+                "name": "Ignore",
+                "args": '```json\n{"ignore": true}\n```',
+                "id": "call",
+                "error": None,
+            }
+        ],
+    )
+    repaired = repair_tool_calls(message, SCHEMAS)
+    assert [(t["name"], t["args"]) for t in repaired.tool_calls] == [("Ignore", {"ignore": True})]
+    assert repaired.invalid_tool_calls == []
+
+
+def test_valid_message_is_returned_as_is():
+    message = AIMessage(
+        content="", tool_calls=[{"name": "Ignore", "args": {"ignore": True}, "id": "call"}]
+    )
+    assert repair_tool_calls(message, SCHEMAS) is message
@@ -0,0 +1,55 @@
+import pytest
+from langgraph.store.memory import InMemoryStore
+
+from eaia.main import calendar_prefetch, triage
+from eaia.schemas import RespondTo
+
+EMAIL = {
+    "id": "1",
+    "thread_id": "1",
+    "from_email": "bob@example.com",
+    "to_email": "me@example.com",
+    "subject": "Are you free to meet next week?",
+    "page_content": "Would Tuesday at 2pm work for you?",
+    "send_time": "2026-10-19T09:00:00",
+}
+
+
+@pytest.fixture
+def prefetches(monkeypatch):
+    started = []
+    monkeypatch.setattr(
+        triage,
+        "start_calendar_prefetch",
+        lambda email, config: started.append(email["id"]) or True,
+    )
+    return started
+
+
+async def run_triage(response: str, **configurable) -> RespondTo:
+    state = {
+        "email": EMAIL,
+        "messages": [],
+        "triaged_email_id": EMAIL["id"],
+        "triage": RespondTo(response=response),
+    }
+    config = {"configurable": {"email": "me@example.com", **configurable}}
+    return (await triage.triage_input(state, config, InMemoryStore()))["triage"]
+
+
+@pytest.mark.parametrize("response", ["no", "notify"])
+async def test_no_calendar_prefetch_unless_responding(prefetches, response):
+    await run_triage(response)
+    assert prefetches == []
+
+
+async def test_calendar_prefetch_starts_once_triaged_email(prefetches):
+    await run_triage("email")
+    assert prefetches == ["1"]
+
+
+async def test_no_calendar_prefetch_without_meeting_days(monkeypatch):
+    monkeypatch.setattr(calendar_prefetch, "load_meeting_calendar", None)
+    assert not calendar_prefetch.start_calendar_prefetch(
+        EMAIL, {"configurable": {"meeting_calendar_days": 0}}
+    )
@@ -0,0 +1,39 @@
+from langgraph.store.memory import InMemoryStore
+
+from eaia.main.triage_cache import TriageCache
+from eaia.schemas import RespondTo
+
+TRIAGE = RespondTo(logic="", response="no")
+
+
+async def test_memory_cache_size_is_bounded():
+    cache = TriageCache(max_entries=2)
+    for key in "abc":
+        await cache.aput(key, TRIAGE)
+
+    assert await cache.aget("a") is None
+    assert await cache.aget("c") == TRIAGE
+    assert cache.stats()["size"] == 2
+
+
+async def test_file_cache_size_counts_the_file(tmp_path):
+    path = tmp_path / "triage_cache.sqlite"
+    cache = TriageCache(max_entries=2, path=path)
+    for key in "abc":
+        await cache.aput(key, TRIAGE)
+
+    # Another process sees the same entries
+    other = TriageCache(max_entries=2, path=path)
+    assert other.stats()["size"] == 2
+    assert await other.aget("c") == TRIAGE
+
+
+async def test_store_cache_stats_leave_out_the_size():
+    store = InMemoryStore()
+    cache = TriageCache(in_store=True)
+    await cache.aput("a", TRIAGE, store, ("default", "triage_cache"))
+
+    assert await cache.aget("a", store, ("default", "triage_cache")) == TRIAGE
+    stats = cache.stats()
+    assert "size" not in stats
+    assert stats["hits"] == 1
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+from langgraph.store.memory import InMemoryStore
+
+from eaia.main import triage_classifier
+from eaia.main.triage_classifier import (
+    classify_triage,
+    get_triage_classifier,
+    update_triage_classifier,
+)
+
+NAMESPACE = ("default", "triage_examples")
+CONFIG = {"configurable": {"assistant_id": "default"}}
+
+
+@pytest.fixture(autouse=True)
+def clear_models():
+    triage_classifier._models.clear()
+    yield
+    triage_classifier._models.clear()
+
+
+def make_email(i: int, spam: bool) -> dict:
+    if spam:
+        return {
+            "id": f"spam{i}",
+            "thread_id": f"spam{i}",
+            "from_email": f"Deals <deals@shop{i % 3}.com>",
+            "to_email": "me@example.com",
+            "subject": "Huge sale, limited offer",
+            "page_content": "Unsubscribe from these deals. Sale ends tonight, buy now.",
+            "send_time": "",
+        }
+    return {
+        "id": f"ask{i}",
+        "thread_id": f"ask{i}",
+        "from_email": f"Colleague {i} <person{i}@corp.com>",
+        "to_email": "me@example.com",
+        "subject": "Quick question about the roadmap",
+        "page_content": "Could you take a look at the plan and tell me what you think?",
+        "send_time": "",
+    }
+
+
+async def save(store: InMemoryStore, email: dict, label: str):
+    await store.aput(
+        NAMESPACE, email["id"], {"input": email, "triage": label, "saved_at": time.time()}
+    )
+    await update_triage_classifier(CONFIG, store)
+
+
+async def test_single_label_examples_never_decide_locally():
+    store = InMemoryStore()
+    for i in range(120):
+        await save(store, make_email(i, spam=False), "email")
+
+    assert await classify_triage(make_email(999, spam=True), CONFIG, store) is None
+
+
+async def test_decides_locally_once_calibrated_on_two_labels():
+    store = InMemoryStore()
+    for i in range(150):
+        await save(store, make_email(i, spam=i % 2 == 0), "no" if i % 2 == 0 else "email")
+
+    result = await classify_triage(make_email(999, spam=True), CONFIG, store)
+
+    assert result is not None and result.response == "no"
+
+
+async def test_learns_only_examples_saved_since(monkeypatch):
+    store = InMemoryStore()
+    for i in range(10):
+        await save(store, make_email(i, spam=i % 2 == 0), "no" if i % 2 == 0 else "email")
+    model = await get_triage_classifier(CONFIG, store)
+    assert model.n_examples == 10
+
+    learned = []
+    learn = model.learn
+    monkeypatch.setattr(model, "learn", lambda f, label: (learned.append(label), learn(f, label)))
+    await save(store, make_email(10, spam=False), "email")
+    model = await get_triage_classifier(CONFIG, store)
+
+    assert learned == ["email"]
+    assert model.n_examples == 11
+    # Nothing new to learn without a new version
+    await get_triage_classifier(CONFIG, store)
+    assert learned == ["email"]